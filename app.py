@@ -1,14 +1,20 @@
+import os
 import streamlit as st
 import time
+import uuid
+from board_component import RENDER_CACHE, build_replay_render, omok_board
+from cluster import ClusterServer, RoomNotFound
+from game_clock import TimeControl, time_left
+from game_logic import DENSE_MAX_SIZE
 from game_server import GameServer
-from streamlit_autorefresh import st_autorefresh
+from matchmaking import DEFAULT_RATING, MatchQueue
+from metrics import METRICS, SamplingProfiler, serve as serve_metrics
+from replay import Replay
+from threats import LEVEL_LABELS, encode_heat, levels
 
 st.set_page_config(page_title="Streamlit Omok", layout="centered") 
 
-# --- Custom CSS for Board ---
-# --- Custom CSS for Board ---
-# --- Custom CSS for Board ---
-# --- Custom CSS for Board ---
+# --- Custom CSS ---
 st.markdown("""
 <style>
     /* Center the board */
@@ -16,7 +22,13 @@ st.markdown("""
         align-items: center;
         background-color: #f0f2f6; /* Soft light gray app background */
     }
-    
+</style>
+""", unsafe_allow_html=True)
+
+# --- Custom CSS for the Classic Button Board ---
+# Only sent when the 15x15 button grid is rendered
+BOARD_CSS = """
+<style>
     /* Variable for Wood Color (Kaya) */
     :root {
         --board-color: #e3c086; 
@@ -101,102 +113,351 @@ st.markdown("""
         color: black !important;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
 
 # --- Global Server State ---
 @st.cache_resource
 def get_server():
-    return GameServer()
+    # Rooms survive restarts through the on-disk journal (set OMOK_JOURNAL="" to disable)
+    journal_path = os.environ.get("OMOK_JOURNAL", "omok.journal")
+    # Finished and abandoned games are appended to the archive (OMOK_ARCHIVE="" to disable)
+    archive_path = os.environ.get("OMOK_ARCHIVE", "omok.games")
+    cluster_dir = os.environ.get("OMOK_CLUSTER_DIR")
+    if cluster_dir:
+        # One of several workers sharing rooms through sockets in OMOK_CLUSTER_DIR;
+        # OMOK_WORKER_ID must stay the same across restarts for the journal to apply.
+        # They authenticate with OMOK_CLUSTER_KEY, or a key file made in the directory
+        worker_id = os.environ.get("OMOK_WORKER_ID") or f"w{os.getpid()}"
+        local = GameServer(journal_path=f"{journal_path}.{worker_id}" if journal_path else None,
+                           archive_path=f"{archive_path}.{worker_id}" if archive_path else None)
+        game_server = ClusterServer(cluster_dir, worker_id, local)
+    else:
+        game_server = GameServer(journal_path=journal_path, archive_path=archive_path)
+    # Closed tabs stop heartbeating; the reaper frees their seats and rooms
+    game_server.start_reaper()
+    # One thread for every game clock
+    game_server.start_clocks()
+    return game_server
 
 server = get_server()
 
+# Matched players may not be waiting on each other for long
+QUICK_MATCH_CLOCK = TimeControl(300, byoyomi=30, periods=3)
+
+@st.cache_resource
+def get_match_queue(_game_server):
+    # Quick-match queue; pairs are seated in rooms on this server (in a
+    # cluster, players are paired with others queued on the same worker)
+    match_queue = MatchQueue(_game_server, time_control=QUICK_MATCH_CLOCK)
+    match_queue.start()
+    return match_queue
+
+match_queue = get_match_queue(server)
+
+# --- Metrics ---
+@st.cache_resource
+def start_metrics(_game_server):
+    # OMOK_METRICS=1 serves Prometheus text on :OMOK_METRICS_PORT/metrics,
+    # on loopback unless OMOK_METRICS_HOST names another address (0.0.0.0
+    # for every interface); OMOK_PROFILE=<seconds> also samples stacks at
+    # that interval, on /profile
+    interval = float(os.environ.get("OMOK_PROFILE") or 0)
+    if not METRICS.enabled and not interval:
+        return None
+
+    def population():
+        rooms, players, spectators = _game_server.population()
+        for status, count in rooms.items():
+            yield "omok_rooms", {"status": status}, count
+        yield "omok_players", {}, players
+        yield "omok_spectators", {}, spectators
+        yield "omok_sessions", {}, len(METRICS.sessions)
+        yield "omok_render_cache_rooms", {}, len(RENDER_CACHE.entries)
+        yield "omok_render_cache_lookups", {"result": "hit"}, RENDER_CACHE.hits
+        yield "omok_render_cache_lookups", {"result": "miss"}, RENDER_CACHE.misses
+    METRICS.add_collector(population)
+
+    profiler = None
+    if interval:
+        profiler = SamplingProfiler(interval)
+        profiler.start()
+    return serve_metrics(int(os.environ.get("OMOK_METRICS_PORT", "9464")), profiler=profiler,
+                         host=os.environ.get("OMOK_METRICS_HOST") or "127.0.0.1")
+
+start_metrics(server)
+
+def rerun(trigger):
+    # st.rerun(), remembering what caused it for the rerun metrics
+    st.session_state.rerun_trigger = trigger
+    st.rerun()
+
+# --- Change Watcher ---
+# This fragment reruns on its own every second (cheap, no board) and blocks
+# briefly on the watched version. The whole page reruns only when the room or
+# lobby actually changed since it was rendered.
+SPECTATOR_REFRESH = 3  # Seconds; spectators cannot act, so they look less often
+
+def _check_for_changes(source, seen_version, nickname):
+    # Inside a full page run the page was just drawn at seen_version: check,
+    # but do not hold the run open waiting
+    timeout = 0 if st.session_state.pop("watch_inline", False) else 0.5
+    try:
+        # While the tab is open, this also keeps the player's room seat alive
+        if nickname:
+            source.heartbeat(nickname)
+        changed = source.wait_for_change(seen_version, timeout=timeout) != seen_version
+    except RoomNotFound:
+        changed = True  # Closed on another worker; the page run reports it
+    if changed:
+        METRICS.inc("omok_fragment_runs_total", outcome="changed")
+        rerun("change")
+    METRICS.inc("omok_fragment_runs_total", outcome="idle")
+
+@st.fragment(run_every=1)
+def _watch_fragment(source, seen_version, nickname=None):
+    _check_for_changes(source, seen_version, nickname)
+
+@st.fragment(run_every=SPECTATOR_REFRESH)
+def _watch_fragment_slow(source, seen_version, nickname=None):
+    _check_for_changes(source, seen_version, nickname)
+
+def watch_for_changes(source, seen_version, nickname=None, slow=False):
+    st.session_state.watch_inline = True
+    (_watch_fragment_slow if slow else _watch_fragment)(source, seen_version, nickname)
+
 # --- Session State ---
 if 'nickname' not in st.session_state:
     st.session_state.nickname = None
 if 'room_id' not in st.session_state:
     st.session_state.room_id = None
+if 'match_failure' not in st.session_state:
+    st.session_state.match_failure = None  # Why the last quick match fell through
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex[:8]
+    st.session_state.rerun_trigger = "load"
 
 # --- Pages ---
 
+LOBBY_PAGE_SIZE = 20
+# Board sizes offered for new rooms; None is unbounded (drawn around the stones)
+BOARD_SIZES = {"15×15": 15, "19×19": 19, "Infinite": None}
+
+# Clocks offered for new rooms
+TIME_CONTROLS = {
+    "No clock": None,
+    "5 min + 3×30s byo-yomi": QUICK_MATCH_CLOCK,
+    "10 min + 5s per move": TimeControl(600, increment=5),
+    "1 min + 5×10s byo-yomi": TimeControl(60, byoyomi=10, periods=5),
+}
+
+def board_label(size):
+    return "∞" if size is None else f"{size}×{size}"
+
+def format_clock(state, side, now):
+    main, periods, period = time_left(state, side, now)
+    if main > 0 or not periods:
+        text = f"{int(main // 60)}:{int(main % 60):02d}"
+        return text + f" + {periods}×{state.control.byoyomi:g}s" if periods else text
+    return f"{int(period)}s · {periods} period{'s' if periods > 1 else ''} left"
+
+@st.fragment(run_every=1)
+def clock_panel(state, players):
+    # Both clocks, ticking, from the snapshot's ClockState: a subtraction per
+    # run, the room itself is not touched (a timeout reruns the page anyway)
+    now = time.time()
+    for side, col in zip((1, 2), st.columns(2)):
+        icon = "⚫" if side == 1 else "⚪"
+        running = " ⏱" if state.turn == side else ""
+        col.markdown(f"{icon}{running} **{format_clock(state, side, now)}**")
+    if state.flagged:
+        st.error(f"⌛ {players[state.flagged] or 'The opponent'} ran out of time.")
+
 def login_page():
     st.title("⚫⚪ Streamlit Omok")
     name = st.text_input("Enter your nickname", key="login_name")
     if st.button("Start"):
         if name:
             st.session_state.nickname = name
-            st.rerun()
+            # Back into the room this nickname is still in (a refresh, a new tab)
+            where = server.find_player(name)
+            if where is not None:
+                st.session_state.room_id = where[0]
+            rerun("login")
         else:
             st.error("Please enter a nickname.")
 
 def lobby_page():
+    seen_version = server.version
+    watch = METRICS.stopwatch("omok_phase_seconds", page="lobby")
     st.title(f"Lobby")
     st.caption(f"Logged in as: {st.session_state.nickname}")
-    
-    with st.expander("Create a Room", expanded=True):
+
+    where = server.find_player(st.session_state.nickname)
+    if where is not None:
+        resume_banner(*where)
+    searching = quick_match() if where is None else None
+
+    with st.expander("Create a Room", expanded=searching is None):
         with st.form("create_room_form"):
             room_name = st.text_input("Room Name")
+            board_size = BOARD_SIZES[st.selectbox("Board", list(BOARD_SIZES), key="create_board")]
+            time_control = TIME_CONTROLS[st.selectbox("Clock", list(TIME_CONTROLS), key="create_clock")]
             submitted = st.form_submit_button("Create")
             if submitted and room_name:
-                room_id = server.create_room(room_name, st.session_state.nickname)
-                st.session_state.room_id = room_id
-                st.success(f"Created room: {room_name}")
-                st.rerun()
+                room_id = server.create_room(room_name, st.session_state.nickname, size=board_size,
+                                             time_control=time_control)
+                if room_id is None and server.find_player(st.session_state.nickname) is not None:
+                    st.error("You are already in a room; leave it first")
+                elif room_id is None:
+                    st.error("The server has no room to spare; try again when a game ends")
+                else:
+                    match_queue.cancel(st.session_state.nickname)
+                    st.session_state.room_id = room_id
+                    st.success(f"Created room: {room_name}")
+                    rerun("create_room")
 
     st.subheader("Available Rooms")
-    rooms = server.get_all_rooms()
+    status_labels = {"All": None, "Open seat": "open", "In progress": "playing", "Finished": "finished"}
+    col_filter, col_page = st.columns([3, 2])
+    with col_filter:
+        status_filter = status_labels[st.selectbox("Show", list(status_labels), key="lobby_filter")]
+    total = server.count_rooms(status_filter)
+    page_count = max(1, (total + LOBBY_PAGE_SIZE - 1) // LOBBY_PAGE_SIZE)
+    with col_page:
+        page = st.number_input("Page", min_value=1, max_value=page_count, value=1, key="lobby_page") - 1
+
+    rooms, total = server.list_rooms(status_filter, page=page, page_size=LOBBY_PAGE_SIZE)
+    watch.lap("query")
     if not rooms:
         st.info("No rooms available. Create one!")
     else:
-        for room in rooms:
+        st.caption(f"{total} room(s)")
+        for summary in rooms:
             cols = st.columns([4, 4, 2])
             with cols[0]:
-                st.write(f"**{room.name}**")
+                st.write(f"**{summary.name}**")
             with cols[1]:
-                p1 = room.players[1] if room.players[1] else "-"
-                p2 = room.players[2] if room.players[2] else "-"
-                st.caption(f"{p1} vs {p2}")
+                p1 = summary.black if summary.black else "-"
+                p2 = summary.white if summary.white else "-"
+                watching = f" · 👀 {summary.spectators}" if summary.spectators else ""
+                board = f" · {board_label(summary.size)}" if summary.size != 15 else ""
+                st.caption(f"{p1} vs {p2} · {summary.status}{watching}{board}")
             with cols[2]:
-                if st.button("Join", key=f"join_{room.id}"):
-                    success, msg = room.join(st.session_state.nickname)
+                if st.button("Join", key=f"join_{summary.id}"):
+                    success, msg = server.join_room(summary.id, st.session_state.nickname)
                     if success:
-                        st.session_state.room_id = room.id
-                        st.rerun()
+                        match_queue.cancel(st.session_state.nickname)
+                        st.session_state.room_id = summary.id
+                        rerun("join")
                     else:
                         st.error(msg)
     
+    watch.lap("rooms")
+
     if st.button("Refresh Lobby"):
-        st.rerun()
+        rerun("refresh")
         
-    # Auto-refresh lobby every 5 seconds
-    st_autorefresh(interval=5000, limit=None, key="lobby_refresh")
+    if searching is not None:
+        # Rerun when the queue changes (a match included); watching it also
+        # keeps the ticket alive
+        watch_for_changes(match_queue, searching, st.session_state.nickname)
+    else:
+        # Rerun when rooms are created, removed or change in the list (not on moves)
+        watch_for_changes(server, seen_version)
+
+ROLE_LABELS = {1: "Black", 2: "White", 0: "a spectator"}
+
+def resume_banner(room_id, role):
+    # The player is still in a room (left from another tab, or the page was
+    # reloaded): go back or leave it
+    nickname = st.session_state.nickname
+    room = server.get_room(room_id)
+    name = room.snapshot().name if room else room_id
+    st.info(f"You are in room **{name}** as {ROLE_LABELS[role]}.")
+    col_resume, col_leave = st.columns(2)
+    with col_resume:
+        if st.button("Resume", key="resume_room"):
+            st.session_state.room_id = room_id
+            rerun("resume")
+    with col_leave:
+        if st.button("Leave it", key="leave_other_room"):
+            server.leave_room(room_id, nickname)
+            rerun("leave")
+
+def quick_match():
+    # Quick-match controls. Returns the queue version seen while searching,
+    # None otherwise; a match moves the player to its room.
+    nickname = st.session_state.nickname
+    queue_version = match_queue.version
+    status = match_queue.status(nickname)
+    if status is not None and status.room_id is not None:
+        st.session_state.room_id = status.room_id
+        st.session_state.match_failure = None
+        rerun("match")
+    failure = match_queue.failure(nickname)
+    if failure is not None:
+        st.session_state.match_failure = failure
+
+    with st.expander("Quick Match", expanded=status is not None or failure is not None):
+        if st.session_state.match_failure:
+            st.warning(f"⚠️ {st.session_state.match_failure}")
+        if status is None:
+            col_rating, col_go = st.columns([3, 2])
+            with col_rating:
+                rating = st.number_input("Your rating", min_value=0, max_value=3000, value=DEFAULT_RATING,
+                                         step=50, key="match_rating")
+            with col_go:
+                if st.button("Find an opponent", key="match_start"):
+                    st.session_state.match_failure = None
+                    match_queue.enqueue(nickname, rating)
+                    rerun("match_queue")
+            return None
+
+        st.info(f"🔎 Searching for an opponent rated within ±{status.window:.0f} · "
+                f"{status.waited:.0f}s · {status.waiting} in the queue")
+        if st.button("Cancel search", key="match_cancel"):
+            match_queue.cancel(nickname)
+            rerun("match_cancel")
+    return queue_version
+
+def room_gone():
+    st.error("Room not found or expired.")
+    time.sleep(2)
+    st.session_state.room_id = None
+    rerun("room_gone")
 
 def game_page():
     room = server.get_room(st.session_state.room_id)
     if not room:
-        st.error("Room not found or expired.")
-        time.sleep(2)
-        st.session_state.room_id = None
-        st.rerun()
+        room_gone()
         return
 
-    game = room.game
+    watch = METRICS.stopwatch("omok_phase_seconds", page="game")
+    room.heartbeat(st.session_state.nickname)
+    # Render from an immutable snapshot; mutations below still go through the room
+    snap = room.snapshot()
+    watch.lap("snapshot")
+    seen_version = snap.version
+    game = snap.game
     
     # Identify Player
     my_role = None
-    if st.session_state.nickname == room.players[1]:
+    if st.session_state.nickname == snap.players[1]:
         my_role = 1 # Black
-    elif st.session_state.nickname == room.players[2]:
+    elif st.session_state.nickname == snap.players[2]:
         my_role = 2 # White
     else:
         my_role = 0 # Spectator
+        spectator_page(room, snap, watch)
+        return
 
     # Sidebar: Game Info & Controls
     with st.sidebar:
-        st.header(f"Room: {room.name}")
+        st.header(f"Room: {snap.name}")
         
         # Player Status
-        p1_name = room.players[1] if room.players[1] else "Waiting..."
-        p2_name = room.players[2] if room.players[2] else "Waiting..."
+        p1_name = snap.players[1] if snap.players[1] else "Waiting..."
+        p2_name = snap.players[2] if snap.players[2] else "Waiting..."
         
         st.markdown(f"**Unknown Player (Black)**: {p1_name}")
         st.markdown(f"**White Player (White)**: {p2_name}")
@@ -207,8 +468,8 @@ def game_page():
         
         # --- Ready & Game Status ---
         # Show Ready Status
-        r1 = "✅ Ready" if room.ready_state[1] else "❌ Not Ready"
-        r2 = "✅ Ready" if room.ready_state[2] else "❌ Not Ready"
+        r1 = "✅ Ready" if snap.ready_state[1] else "❌ Not Ready"
+        r2 = "✅ Ready" if snap.ready_state[2] else "❌ Not Ready"
         
         col_r1, col_r2 = st.columns(2)
         with col_r1:
@@ -216,6 +477,9 @@ def game_page():
         with col_r2:
             st.caption(f"White: {r2}")
 
+        if snap.clock:
+            clock_panel(snap.clock, snap.players)
+
         # Ready Button (Only if game not started or over)
         is_game_started = len(game.history) > 0
         if my_role in [1, 2] and not game.winner:
@@ -226,48 +490,46 @@ def game_page():
             # If game is running, you are effectively "Playing". 
             # We only show Ready button if game hasn't started or ended.
             if not is_game_started:
-                ready_label = "Cancel Ready" if room.ready_state[my_role] else "Ready to Start!"
-                if st.button(ready_label, key="toggle_ready", type="primary" if not room.ready_state[my_role] else "secondary"):
+                ready_label = "Cancel Ready" if snap.ready_state[my_role] else "Ready to Start!"
+                if st.button(ready_label, key="toggle_ready", type="primary" if not snap.ready_state[my_role] else "secondary"):
                     room.toggle_ready(my_role)
-                    st.rerun()
+                    rerun("ready")
 
         # Both Ready?
-        players_present = (room.players[1] is not None) and (room.players[2] is not None)
-        both_ready = room.ready_state[1] and room.ready_state[2]
+        players_present = (snap.players[1] is not None) and (snap.players[2] is not None)
+        both_ready = snap.ready_state[1] and snap.ready_state[2]
         
         ready_to_play = players_present and both_ready
         
         if not players_present:
              st.warning("Waiting for opponent to join...")
-             st_autorefresh(interval=2000, key="wait_join_refresh")
+             # The computer plays dense boards only
+             computer_board = game.size is not None and game.size <= DENSE_MAX_SIZE
+             if my_role in [1, 2] and computer_board and st.button("🤖 Play vs Computer", key="add_ai"):
+                 room.add_ai()
+                 rerun("add_ai")
         elif not both_ready:
              st.info("Waiting for both players to Ready...")
-             st_autorefresh(interval=2000, key="wait_ready_refresh")
-        elif room.game.winner:
-            winner_name = room.players[room.game.winner] if room.players[room.game.winner] else "Opponent (Left)"
+        elif game.winner:
+            winner_name = snap.players[game.winner] if snap.players[game.winner] else "Opponent (Left)"
             st.success(f"🏆 Game Over! Winner: {winner_name}")
             if st.button("New Game"): 
                 # Resetting requires logic. Usually just 'leave' or simple reset if owner.
                 # For now, swapping or re-joining resets. 
                 # Or we can add a specific Reset button if game over.
                 room.reset_game()
-                st.rerun()
+                rerun("new_game")
                 
-            if room.players[room.game.winner] is None:
+            if snap.players[game.winner] is None:
                 st.error("The opponent disconnected.")
         else:
             # Game is ON
-            turn_name = room.players[room.game.current_turn]
-            color_icon = "⚫" if room.game.current_turn == 1 else "⚪"
-            if room.game.current_turn == my_role:
+            turn_name = snap.players[game.current_turn]
+            color_icon = "⚫" if game.current_turn == 1 else "⚪"
+            if game.current_turn == my_role:
                 st.info(f"{color_icon} YOUR TURN")
             else:
                 st.markdown(f"{color_icon} {turn_name}'s turn")
-                st_autorefresh(interval=1000, key="wait_move_refresh")
-        
-        # Also refresh if there is a pending request for ME to handle
-        if room.pending_request and room.pending_request['requester'] != st.session_state.nickname:
-             st_autorefresh(interval=2000, key="request_refresh")
 
         st.divider()
         
@@ -276,7 +538,7 @@ def game_page():
         # --- Value-Added Features: Requests ---
         # 1. Check if there is a pending request targeting ME?
         #    Target is the 'other' player.
-        pending = room.pending_request
+        pending = snap.pending_request
         
         # Logic to determine if I am the resolver (the one receiving the request)
         i_am_resolver = False
@@ -292,17 +554,17 @@ def game_page():
             with col_res1:
                 if st.button("✅ Accept", key="accept_req"):
                     room.resolve_request(True)
-                    st.rerun()
+                    rerun("request")
             with col_res2:
                 if st.button("❌ Deny", key="deny_req"):
                     room.resolve_request(False)
-                    st.rerun()
+                    rerun("request")
         
         elif pending and pending['requester'] == st.session_state.nickname:
             st.info(f"⏳ Waiting for opponent to accept {pending['type']}...")
             if st.button("Cancel Request"):
                 room.cancel_request()
-                st.rerun()
+                rerun("request")
                 
         else:
             # Normal Controls
@@ -310,84 +572,194 @@ def game_page():
             col_act1, col_act2 = st.columns(2)
             with col_act1:
                 if st.button("🔄 Refresh", help="Refresh the board"):
-                    st.rerun()
+                    rerun("refresh")
             with col_act2:
                 # UNDO Request
                 if st.button("↩️ Undo", help="Request undo", disabled=not (my_role in [1, 2])):
                     room.make_request(st.session_state.nickname, 'UNDO')
-                    st.rerun()
+                    rerun("request")
             
             # SWAP Request (Only before game starts)
             swap_disabled = not (my_role in [1, 2]) or (len(game.history) > 0)
             if st.button("⇄ Swap Seats", help="Swap seats (Only before start)", disabled=swap_disabled):
                 room.make_request(st.session_state.nickname, 'SWAP')
-                st.rerun()
+                rerun("request")
             
             if st.button("🚪 Leave Room", type="primary", help="Exit the game"):
-                room.leave(st.session_state.nickname)
-                if room.is_empty():
-                     server.remove_room(room.id)
+                server.leave_room(room.id, st.session_state.nickname)
                 st.session_state.room_id = None
-                st.rerun()
+                rerun("leave")
+
+    watch.lap("sidebar")
 
     # Board Rendering
-    # Use a container to keep it tight
-    st.markdown('<div id="game_view_marker"></div>', unsafe_allow_html=True)
-    
+    with st.sidebar:
+        st.toggle("Classic button board", key="classic_board", help="Render the board as one button per cell instead of a single element")
+        st.toggle("Review moves", key="review_mode", help="Step through the game so far; the live board comes back when this is off")
+        st.toggle("Show threats", key="threat_overlay", help="Shade the cells where either side would make a five, four or open three (single-element board only)")
+
     # --- Main Area Alerts for Requests ---
-    if room.pending_request:
-        pr = room.pending_request
+    if snap.pending_request:
+        pr = snap.pending_request
         if pr['requester'] != st.session_state.nickname and my_role in [1, 2]:
              st.error(f"⚠️ **{pr['requester']}** requests: **{pr['type']}**. Please responding in Sidebar!")
         elif pr['requester'] == st.session_state.nickname:
              st.warning(f"⏳ Waiting for opponent to accept **{pr['type']}**...")
 
+    # Board cells for this room version, encoded once and shared by every viewer
+    render = RENDER_CACHE.get(snap)
+    # Only the side to move can act on a cell, and not while a request pauses the game
+    can_move = (my_role in [1, 2]) and ready_to_play and (game.current_turn == my_role) and (snap.pending_request is None)
+
+    if st.session_state.get("review_mode") and game.history:
+        review_board(snap)
+        clicked = None
+        watch.lap("board_review")
+    elif st.session_state.get("classic_board"):
+        clicked = render_button_board(render, can_move)
+        watch.lap("board_classic")
+    else:
+        heat = threat_heat(room) if st.session_state.get("threat_overlay") else None
+        clicked = omok_board(render, can_move, heat=heat)
+        watch.lap("board_canvas")
+
+    show_viewport(game)
+
+    # The click's value comes from the browser: act on it only when this
+    # player may move, and let the room check again against its live state
+    if clicked is not None and can_move:
+        room.place_stone(*clicked, player=st.session_state.nickname)
+        rerun("move")
+
+    # Moves, joins, ready toggles and requests all bump the room version
+    watch_for_changes(room, seen_version, st.session_state.nickname)
+
+def spectator_page(room, snap, watch):
+    # Read-only view: the shared cached board, no controls, slower refresh
+    game = snap.game
+    with st.sidebar:
+        st.header(f"Room: {snap.name}")
+        st.caption(f"👀 Spectating · {len(snap.spectators)} watching")
+        st.markdown(f"**Black**: {snap.players[1] or 'Waiting...'}")
+        st.markdown(f"**White**: {snap.players[2] or 'Waiting...'}")
+        if snap.clock:
+            clock_panel(snap.clock, snap.players)
+        st.divider()
+
+        if game.winner:
+            winner_name = snap.players[game.winner] or "Opponent (Left)"
+            st.success(f"🏆 Game Over! Winner: {winner_name}")
+        elif game.history:
+            color_icon = "⚫" if game.current_turn == 1 else "⚪"
+            st.markdown(f"{color_icon} {snap.players[game.current_turn]}'s turn · move {len(game.history) + 1}")
+        else:
+            st.info("Waiting for the game to start...")
+
+        st.divider()
+        if st.button("🚪 Leave Room", type="primary"):
+            server.leave_room(room.id, st.session_state.nickname)
+            st.session_state.room_id = None
+            rerun("leave")
+    watch.lap("sidebar")
+
+    with st.sidebar:
+        st.toggle("Review moves", key="review_mode", help="Step through the game so far")
+        st.toggle("Show threats", key="threat_overlay", help="Shade the cells where either side would make a five, four or open three")
+    if st.session_state.get("review_mode") and game.history:
+        review_board(snap)
+    else:
+        heat = threat_heat(room) if st.session_state.get("threat_overlay") else None
+        omok_board(RENDER_CACHE.get(snap), interactive=False, heat=heat)
+        show_viewport(game)
+    watch.lap("board_spectator")
+
+    watch_for_changes(room, snap.version, st.session_state.nickname, slow=True)
+
+def review_board(snap):
+    # Scrubber over every position of the game so far. The Replay is kept
+    # per session and room version, so dragging the slider only seeks.
+    game = snap.game
+    cached = st.session_state.get("replay")
+    if cached is None or cached[:2] != (snap.id, snap.version):
+        cached = (snap.id, snap.version, Replay(game.history, game.size))
+        st.session_state.replay = cached
+    replay = cached[2]
+
+    total = len(game.history)
+    # Start at the latest move; clamp when the game got shorter (undo, new game)
+    if st.session_state.get("review_move", total + 1) > total:
+        st.session_state.review_move = total
+    n = st.slider("Move", 0, total, key="review_move")
+
+    omok_board(build_replay_render(replay, n), interactive=False, key="review_board")
+    if n:
+        row, col, player = replay.moves[n - 1]
+        stone = "⚫" if player == 1 else "⚪"
+        st.caption(f"Move {n} of {total}: {stone} {snap.players[player] or '?'} at row {row}, column {col}")
+    else:
+        st.caption(f"Empty board · {total} moves played")
+
+def threat_heat(room):
+    # Overlay for omok_board, from the room's threat map (computed once per
+    # move, whoever asks), and a line on each side's strongest threat
+    threats = room.threats()
+    best = levels(threats).max(axis=(1, 2)).tolist()
+    summary = " · ".join(f"{stone} {LEVEL_LABELS[level] or 'nothing'}" for stone, level in zip("⚫⚪", best))
+    st.caption(f"Threats (red: Black, blue: White) · best next stone makes: {summary}")
+    return encode_heat(threats)
+
+def show_viewport(game):
+    # Sparse boards are drawn in part: say which part
+    side = len(game.board)
+    if game.size is not None and side == game.size:
+        return
+    top, left = game.origin
+    st.caption(f"{board_label(game.size)} board · rows {top} to {top + side - 1}, "
+               f"columns {left} to {left + side - 1} · the view follows the stones")
+
+def render_button_board(render, can_move):
+    # Classic renderer: one st.button per cell. Returns the clicked board
+    # (row, col) or None.
+    st.markdown(BOARD_CSS, unsafe_allow_html=True)
+    # Use a container to keep it tight
+    st.markdown('<div id="game_view_marker"></div>', unsafe_allow_html=True)
+
+    # Labels come straight from the shared render: stones, ✕ for cells
+    # forbidden to Black, blank otherwise
+    labels = {'b': "⚫", 'w': "⚪", 'x': "✕"}
+    top, left = render.origin
+    clicked = None
     with st.container():
-        for r in range(game.size):
+        for r in range(render.size):
             # Create columns with minimal gap
-            cols = st.columns(game.size) 
-            for c in range(game.size):
-                cell_value = game.board[r, c]
-                
-                # Visual logic
-                label = " "
-                if cell_value == 1:
-                    label = "⚫" # Black stone
-                elif cell_value == 2:
-                    label = "⚪" # White stone
-                
-                # Logic for disabled state
-                # 1. Spot occupied?
-                # 2. Not my turn?
-                # 3. Game finished?
-                # 4. Opponent missing?
-                # 5. Spectator?
-                is_occupied = (cell_value != 0)
-                is_game_over = (game.winner is not None)
-                is_my_turn = (game.current_turn == my_role)
-                is_player = (my_role in [1, 2])
-                
-                # But standard disable grey out is fine.
-                disabled = True
-                # Disable if there is ANY pending request (pause game)
-                game_paused = (room.pending_request is not None)
-                
-                if is_player and not is_occupied and not is_game_over and ready_to_play and is_my_turn and not game_paused:
-                    disabled = False
-                
+            cols = st.columns(render.size)
+            for c in range(render.size):
+                cell = render.cells[r * render.size + c]
+                disabled = not (can_move and cell == '+')
+
                 # We need unique keys for buttons
-                key = f"b_{r}_{c}"
-                
+                key = f"b_{top + r}_{left + c}"
+
                 # Button
-                if cols[c].button(label, key=key, disabled=disabled):
+                if cols[c].button(labels.get(cell, " "), key=key, disabled=disabled):
                     if not disabled:
-                        game.place_stone(r, c)
-                        st.rerun()
+                        clicked = (top + r, left + c)
+    return clicked
 
 # --- Main Logic ---
 if not st.session_state.nickname:
-    login_page()
+    page, render_page = "login", login_page
 elif not st.session_state.room_id:
-    lobby_page()
+    page, render_page = "lobby", lobby_page
 else:
-    game_page()
+    page, render_page = "game", game_page
+
+# Reruns without a recorded trigger came from a widget interaction
+METRICS.inc("omok_reruns_total", page=page, trigger=st.session_state.pop("rerun_trigger", "widget"))
+METRICS.session_rerun(st.session_state.session_id)
+with METRICS.time("omok_page_seconds", page=page):
+    try:
+        render_page()
+    except RoomNotFound:
+        # A room on another worker went away while this run was using it
+        room_gone()
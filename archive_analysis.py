@@ -0,0 +1,142 @@
+import argparse
+import os
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from game_logic import OmokGame, new_game
+from game_records import decode_record, iter_bodies
+
+# Offline analysis of a game archive (game_records.py): every record is
+# replayed through the rules, checking that each move was legal and that the
+# recorded winner and result are what the moves produce, and counting the
+# cells forbidden to Black along the way (dense boards: one whole-board mask
+# per Black move, then the reason for each forbidden cell).
+#
+# Records are read in chunks of raw bodies and handed to a process pool, at
+# most two chunks per worker in flight; each worker decodes and replays its
+# chunk and sends back a Counter. The parent only reads and merges, so memory
+# stays the same whatever the archive's size, and throughput grows with the
+# workers until the reader (a few microseconds per record) keeps up no more.
+
+MAX_ERRORS = 20  # Problems reported by record number; the rest are only counted
+
+
+def replay_record(record, stats, forbidden=True):
+    # Replays one GameRecord into `stats`; returns a problem description or None
+    game = new_game(record.size)
+    dense = forbidden and isinstance(game, OmokGame)
+    for n, (row, col) in enumerate(record.moves, 1):
+        if dense and game.current_turn == 1 and game.winner is None:
+            mask = game.forbidden_moves()
+            if mask.any():
+                stats['forbidden_positions'] += 1
+                for r, c in zip(*mask.nonzero()):
+                    stats['forbidden ' + game.engine.forbidden_reason(int(r), int(c))] += 1
+        ok, message = game.place_stone(row, col)
+        if not ok:
+            stats['illegal'] += 1
+            return f"move {n} ({row}, {col}): {message}"
+    stats['moves'] += len(record.moves)
+
+    if (game.winner is not None) != (record.result == 'five'):
+        stats['wrong_result'] += 1
+        return f"recorded as {record.result}, the moves give winner {game.winner}"
+    if record.result == 'five':
+        right = record.winner == game.winner
+    elif record.result in ('forfeit', 'timeout'):
+        right = record.winner in (1, 2)
+    else:
+        right = record.winner is None
+    if not right:
+        stats['wrong_winner'] += 1
+        return f"recorded winner {record.winner} ({record.result}), the moves give {game.winner}"
+    stats[record.result] += 1
+    if record.winner:
+        stats[('black', 'white')[record.winner - 1] + '_wins'] += 1
+    return None
+
+
+def analyze_chunk(first, bodies, forbidden=True):
+    # Worker side: decodes and replays records first, first + 1, ...
+    stats = Counter()
+    errors = []
+    for index, body in enumerate(bodies, first):
+        stats['games'] += 1
+        try:
+            problem = replay_record(decode_record(body), stats, forbidden)
+        except (ValueError, IndexError) as exc:
+            stats['corrupt'] += 1
+            problem = f"corrupt record: {exc}"
+        if problem and len(errors) < MAX_ERRORS:
+            errors.append((index, problem))
+    return stats, errors
+
+
+def _chunks(path, chunk):
+    first = 0
+    bodies = []
+    for body in iter_bodies(path):
+        bodies.append(body)
+        if len(bodies) == chunk:
+            yield first, bodies
+            first += chunk
+            bodies = []
+    if bodies:
+        yield first, bodies
+
+
+def analyze_archive(path, workers=None, chunk=512, forbidden=True):
+    # (Counter of totals, [(record number, problem), ...]) for an archive.
+    # workers=0 runs in this process.
+    stats = Counter()
+    errors = []
+
+    def merge(result):
+        chunk_stats, chunk_errors = result
+        stats.update(chunk_stats)
+        errors.extend(chunk_errors[:MAX_ERRORS - len(errors)])
+
+    if workers == 0:
+        for first, bodies in _chunks(path, chunk):
+            merge(analyze_chunk(first, bodies, forbidden))
+    else:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(workers) as pool:
+            pending = set()
+            for first, bodies in _chunks(path, chunk):
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        merge(future.result())
+                pending.add(pool.submit(analyze_chunk, first, bodies, forbidden))
+            for future in pending:
+                merge(future.result())
+    errors.sort()
+    return stats, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a game archive through the rules and report on it.")
+    parser.add_argument("path", help="archive file (GameServer archive_path, or export_records output)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU, 0: none)")
+    parser.add_argument("--chunk", type=int, default=512, help="records per task")
+    parser.add_argument("--no-forbidden", action="store_true", help="skip the forbidden-move statistics")
+    args = parser.parse_args()
+
+    stats, errors = analyze_archive(args.path, args.workers, args.chunk, not args.no_forbidden)
+    games = stats['games']
+    print(f"{games:,} games, {stats['moves']:,} moves")
+    print(f"  fives {stats['five']:,}, forfeits {stats['forfeit']:,}, timeouts {stats['timeout']:,}, "
+          f"unfinished {stats['unfinished']:,}")
+    print(f"  Black wins {stats['black_wins']:,}, White wins {stats['white_wins']:,}")
+    print(f"  illegal moves {stats['illegal']:,}, wrong results {stats['wrong_result']:,}, "
+          f"wrong winners {stats['wrong_winner']:,}, corrupt {stats['corrupt']:,}")
+    if not args.no_forbidden:
+        print(f"  Black moves with forbidden cells {stats['forbidden_positions']:,}: "
+              + ", ".join(f"{reason} {stats['forbidden ' + reason]:,}" for reason in ('3-3', '4-4', 'overline')))
+    for index, problem in errors:
+        print(f"  record {index}: {problem}")
+
+
+if __name__ == "__main__":
+    main()
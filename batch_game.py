@@ -0,0 +1,172 @@
+import numpy as np
+from game_logic import DIRECTIONS, OmokGame
+from renju import CENTER, FIVE, LINE_FOURS, LINE_KIND, OFF_BOARD, OVERLINE, THREE, WEIGHTS, WINDOW, window_codes
+
+# Many games at once: N boards in one (N, size, size) int8 array, one move per
+# game per step. Every rule check reads the 11-cell windows through the moves
+# being played in all four directions, for all games in one NumPy pass, and
+# gives the same answers as OmokGame with the same engine: 'renju' goes
+# through the same pattern tables as RenjuEngine, anything else follows the
+# classic rules (five or more wins, plain 0 1 1 1 0 threes for 3-3).
+
+# Status codes returned by BatchGame.play, in the order OmokGame.place_stone
+# checks them
+PLACED, FINISHED, INVALID, OCCUPIED, FORBIDDEN = range(5)
+
+PAD = CENTER  # Border around each board, so every window stays in the array
+
+# What a window makes, as 4-bit counters that can be summed over the four
+# directions: threes, fours, fives, overlines
+_LINE_COUNTS = ((LINE_KIND == THREE) | (LINE_FOURS.astype(np.int16) << 4)
+                | ((LINE_KIND == FIVE) << 8) | ((LINE_KIND == OVERLINE) << 12)).astype(np.int16)
+
+
+class BatchGame:
+    def __init__(self, n, size=15, engine='renju'):
+        self.n = n
+        self.size = size
+        self.renju = engine == 'renju'
+
+        side = size + 2 * PAD
+        self._area = side * side
+        self._cells = np.full((n, self._area), OFF_BOARD, dtype=np.int8)
+        # View of the playing area inside the border
+        self.boards = self._cells.reshape(n, side, side)[:, PAD:PAD + size, PAD:PAD + size]
+        self.boards[...] = 0
+
+        rows, cols = np.divmod(np.arange(size * size), size)
+        self._index = (rows + PAD) * side + cols + PAD  # Board cell -> padded cell
+        self._window = np.array([
+            [k * (dr * side + dc) for k in range(-CENTER, CENTER + 1)]
+            for dr, dc in DIRECTIONS
+        ])
+
+        self.current_turn = np.ones(n, dtype=np.int8)
+        self.winner = np.zeros(n, dtype=np.int8)  # 0 while the game is running
+        self.move_count = np.zeros(n, dtype=np.int32)
+        self.moves = np.full((n, size * size), -1, dtype=np.int16)  # Cells in play order
+
+    def _lines(self, games, cells):
+        # (len(games), 4, WINDOW) cell values along each direction through
+        # `cells`, which is at CENTER
+        start = games * self._area + self._index[cells]
+        return np.take(self._cells, start[:, None, None] + self._window)
+
+    def _codes(self, lines, players):
+        # Pattern-table codes of the windows as if `players` had just played
+        # the (empty) centre cell
+        return window_codes(lines, players[:, None]) + WEIGHTS[CENTER]
+
+    def _judge(self, games, cells, players):
+        # For moves onto empty cells: (forbidden, wins) as the engine's
+        # forbidden_reason (Black only) and check_winner would answer
+        lines = self._lines(games, cells)
+        black = players == 1
+        if self.renju:
+            counts = np.take(_LINE_COUNTS, self._codes(lines, players))
+            counts = counts[:, 0] + counts[:, 1] + counts[:, 2] + counts[:, 3]
+            threes, fours = counts & 0xF, (counts >> 4) & 0xF
+            five, overline = (counts & 0xF00) != 0, counts >= 0x1000
+            forbidden = black & ~five & (overline | (fours >= 2) | (threes >= 2))
+            return forbidden, five | (overline & ~black)
+
+        # Classic: five or more wins; 3-3 is exactly three in a row through
+        # the cell with both ends empty, in two directions
+        own = lines == players[:, None, None]
+        forward = np.cumprod(own[:, :, CENTER + 1:], axis=2).sum(axis=2)
+        backward = np.cumprod(own[:, :, CENTER - 1::-1], axis=2).sum(axis=2)
+        wins = (forward + backward >= 4).any(axis=1)
+        m = np.arange(len(games))[:, None]
+        k = np.arange(len(DIRECTIONS))[None, :]
+        end_f = lines[m, k, np.minimum(CENTER + 1 + forward, WINDOW - 1)]
+        end_b = lines[m, k, np.maximum(CENTER - 1 - backward, 0)]
+        open_three = (forward + backward == 2) & (end_f == 0) & (end_b == 0)
+        return black & (open_three.sum(axis=1) >= 2), wins
+
+    def forbidden(self, games, cells):
+        # Whether Black may not play each (empty) cell
+        games = np.asarray(games)
+        return self._judge(games, np.asarray(cells), np.ones(len(games), dtype=np.int8))[0]
+
+    def play(self, cells, games=None):
+        # Plays cells[i] (row * size + col) in games[i], every game by default;
+        # each game at most once per call. Returns a status per move.
+        games = np.arange(self.n) if games is None else np.asarray(games)
+        cells = np.asarray(cells)
+        status = np.full(len(games), PLACED, dtype=np.int8)
+
+        status[self.winner[games] != 0] = FINISHED
+        todo = status == PLACED
+        status[todo & ((cells < 0) | (cells >= self.size * self.size))] = INVALID
+        todo = status == PLACED
+        occupied = self._cells[games[todo], self._index[cells[todo]]] != 0
+        status[np.flatnonzero(todo)[occupied]] = OCCUPIED
+
+        todo = np.flatnonzero(status == PLACED)
+        games, cells = games[todo], cells[todo]
+        players = self.current_turn[games]
+        forbidden, won = self._judge(games, cells, players)
+        status[todo[forbidden]] = FORBIDDEN
+
+        ok = ~forbidden
+        games, cells, players, won = games[ok], cells[ok], players[ok], won[ok]
+        self._cells[games, self._index[cells]] = players
+        self.moves[games, self.move_count[games]] = cells
+        self.move_count[games] += 1
+
+        self.winner[games[won]] = players[won]
+        self.current_turn[games[~won]] = 3 - players[~won]
+        return status
+
+    def history(self, i):
+        # Game i as an OmokGame.history list
+        cells = self.moves[i, :self.move_count[i]].tolist()
+        return [(cell // self.size, cell % self.size, 1 if k % 2 == 0 else 2)
+                for k, cell in enumerate(cells)]
+
+    def to_game(self, i, engine='renju'):
+        # Replays game i through OmokGame.place_stone
+        game = OmokGame(self.size, engine=engine)
+        for row, col, _ in self.history(i):
+            game.place_stone(row, col)
+        return game
+
+
+def random_selfplay(n, size=15, engine='renju', seed=None, chunk=4096):
+    # Plays n games of random legal moves to the end. Games where the
+    # side to move has no legal cell left stop with winner 0 (a draw).
+    rng = np.random.default_rng(seed)
+    batch = BatchGame(n, size, engine)
+    total = size * size
+
+    # Each game walks its own random cell order; played cells are swapped to
+    # the front, so order[i, move_count[i]:] is always the empty cells
+    order = rng.permuted(np.tile(np.arange(total, dtype=np.int16), (n, 1)), axis=1)
+
+    # A chunk of games at a time keeps the boards being touched in cache
+    for lo in range(0, n, chunk):
+        active = np.arange(lo, min(n, lo + chunk))
+        while active.size:
+            blocked = []
+            searching = active
+            offset = np.zeros(len(active), dtype=np.int32)
+            while searching.size:
+                start = batch.move_count[searching]
+                slot = start + offset
+                status = batch.play(order[searching, slot], searching)
+
+                placed = status == PLACED
+                g, a, b = searching[placed], start[placed], slot[placed]
+                order[g, a], order[g, b] = order[g, b], order[g, a]
+
+                # Only Black's forbidden cells are ever refused: try the next one
+                searching = searching[~placed]
+                offset = offset[~placed] + 1
+                left = start[~placed] + offset < total
+                blocked.append(searching[~left])
+                searching, offset = searching[left], offset[left]
+
+            running = (batch.winner[active] == 0) & (batch.move_count[active] < total)
+            running &= ~np.isin(active, np.concatenate(blocked))
+            active = active[running]
+    return batch
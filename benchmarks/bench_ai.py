@@ -0,0 +1,63 @@
+"""Nodes-per-second benchmark for the computer opponent.
+
+Searches a few fixed positions for a fixed time, first in this process and
+then all at once through the shared process pool, and reports nodes/s.
+
+    python benchmarks/bench_ai.py --budget 1.0
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_logic import OmokGame
+from omok_ai import get_pool, search_move
+
+
+def make_position(moves, seed):
+    # Random but plausible position: each stone lands near an earlier one
+    rng = random.Random(seed)
+    game = OmokGame()
+    game.place_stone(7, 7)
+    while len(game.history) < moves:
+        row, col, _ = rng.choice(game.history)
+        game.place_stone(min(14, max(0, row + rng.randint(-2, 2))), min(14, max(0, col + rng.randint(-2, 2))))
+        if game.winner is not None:
+            game.undo_move()
+    return list(game.history)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds per search")
+    parser.add_argument("--positions", type=int, default=4)
+    args = parser.parse_args()
+
+    positions = [make_position(moves, seed) for seed, moves in enumerate([6, 12, 20, 30][:args.positions])]
+
+    print("in-process")
+    print(f"{'stones':>7} {'depth':>6} {'nodes':>9} {'nodes/s':>10}")
+    total_nodes = 0
+    total_time = 0
+    for history in positions:
+        _, _, depth, nodes, seconds = search_move(history, args.budget)
+        total_nodes += nodes
+        total_time += seconds
+        print(f"{len(history):>7} {depth:>6} {nodes:>9} {nodes / seconds:>10,.0f}")
+    print(f"{'all':>7} {'':>6} {total_nodes:>9} {total_nodes / total_time:>10,.0f}")
+
+    pool = get_pool()
+    # Warm the workers up so process start-up is not timed
+    list(pool.map(search_move, [positions[0]] * pool._max_workers, [0.01] * pool._max_workers))
+    start = time.perf_counter()
+    results = list(pool.map(search_move, positions, [args.budget] * len(positions)))
+    elapsed = time.perf_counter() - start
+    nodes = sum(result[3] for result in results)
+    print(f"\nprocess pool ({pool._max_workers} workers): {nodes} nodes in {elapsed:.2f}s = {nodes / elapsed:,.0f} nodes/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Game archive: record size, write/read throughput and the analysis pipeline.
+
+Writes --games random self-play games (batch_game) to an archive in chunks,
+then times streaming them back (raw and decoded) and analysing them
+(archive_analysis) with each --workers count, with and without the
+forbidden-move statistics. The parent's peak RSS is printed after each
+step: it should not grow with --games, since nothing holds more than a
+chunk of records.
+
+    python benchmarks/bench_archive.py --games 20000 --workers 1 2 4
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archive_analysis import analyze_archive
+from batch_game import random_selfplay
+from game_records import encode_record, iter_bodies, read_records, write_records
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def selfplay_records(games, size, seed, chunk=4096):
+    # Record bodies for `games` random games, generated a chunk at a time
+    done = 0
+    while done < games:
+        n = min(chunk, games - done)
+        batch = random_selfplay(n, size, seed=seed + done)
+        for i in range(n):
+            winner = int(batch.winner[i]) or None
+            yield encode_record(size, f"b{done + i}", f"w{done + i}", winner,
+                                'five' if winner else 'unfinished', batch.history(i), ended=0)
+        done += n
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=20000)
+    parser.add_argument("--size", type=int, default=15)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="analysis process counts (0: in process)")
+    parser.add_argument("--chunk", type=int, default=512, help="records per analysis task")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.games")
+    try:
+        (_, generate) = timed(lambda: sum(1 for _ in selfplay_records(args.games, args.size, args.seed)))
+        count, write = timed(lambda: write_records(path, selfplay_records(args.games, args.size, args.seed)))
+        write -= generate
+        size = os.path.getsize(path)
+        moves, read = timed(lambda: sum(len(record.moves) for record in read_records(path)))
+        _, raw = timed(lambda: sum(1 for _ in iter_bodies(path)))
+        print(f"{count:,} games, {moves:,} moves: {size / count:.1f} bytes/game, {size / moves:.2f} bytes/move")
+        print(f"  encode+write {count / write:>10,.0f} games/s")
+        print(f"  read raw     {count / raw:>10,.0f} games/s")
+        print(f"  read+decode  {count / read:>10,.0f} games/s   peak RSS {peak_rss_mb():.0f} MB")
+        print()
+
+        print(f"{'workers':>7} {'forbidden':>9} {'games/s':>9} {'moves/s':>10} {'problems':>9} {'peak RSS MB':>12}")
+        for forbidden in (False, True):
+            for workers in args.workers:
+                (stats, errors), elapsed = timed(lambda: analyze_archive(path, workers, args.chunk, forbidden))
+                assert stats['games'] == count and not errors, errors[:3]
+                problems = stats['illegal'] + stats['wrong_result'] + stats['wrong_winner'] + stats['corrupt']
+                print(f"{workers:>7} {'yes' if forbidden else 'no':>9} {count / elapsed:>9,.0f} "
+                      f"{stats['moves'] / elapsed:>10,.0f} {problems:>9} {peak_rss_mb():>12.0f}")
+        print()
+        print(f"forbidden cells: 3-3 {stats['forbidden 3-3']:,}, 4-4 {stats['forbidden 4-4']:,}, "
+              f"overline {stats['forbidden overline']:,} over {stats['forbidden_positions']:,} Black moves; "
+              f"Black wins {stats['black_wins']:,}, White wins {stats['white_wins']:,}")
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
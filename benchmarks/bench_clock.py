@@ -0,0 +1,127 @@
+"""Game clocks: one deadline heap against polling every room.
+
+For each --games count, seats that many timed games on a GameServer (both
+players ready, so Black's clock runs) and times:
+
+  idle tick   ClockScheduler.tick with nothing due: what the clock thread
+              pays per wake-up, which should not grow with the games
+  poll        checking every room's clock once, what a per-rerun (or
+              per-second) poll of the rooms would pay instead
+  move        Room.place_stone in a timed room against an untimed one
+              (charging the clock and pushing the new deadline), over the
+              first --moves of a random game in 100 rooms
+
+then lets every game run out of time (main times spread over --spread
+seconds) with the scheduler thread running, and reports how late the
+timeouts were declared and the CPU the process used meanwhile.
+
+    python benchmarks/bench_clock.py --games 100 1000 10000 --budget 5
+
+Fails (exit status 1) when an idle tick takes longer than --budget
+microseconds.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_game import random_selfplay
+from game_clock import TimeControl
+from game_server import GameServer
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))] if values else 0.0
+
+
+def seat_games(count, controls, clocks=False):
+    # GameServer with `count` games under way, their rooms and the deadlines
+    # of their clocks; controls(i) -> TimeControl or None. clocks: start the
+    # clock thread first, so early deadlines are not missed
+    server = GameServer(max_rooms=10 ** 6)
+    if clocks:
+        server.start_clocks()
+    rooms = []
+    deadlines = []
+    for i in range(count):
+        room = server.get_room(server.create_room(f"g{i}", f"b{i}", time_control=controls(i)))
+        room.join(f"w{i}")
+        room.toggle_ready(1)
+        with room.lock:
+            room.toggle_ready(2)
+            deadlines.append(room.clock.deadline() if room.clock else None)
+        rooms.append(room)
+    return server, rooms, deadlines
+
+
+def per_call(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls
+
+
+def move_cost(rooms, line):
+    # Mean seconds per place_stone: the same game line in each room
+    start = time.perf_counter()
+    for room in rooms:
+        for row, col, _ in line:
+            room.place_stone(row, col)
+    return (time.perf_counter() - start) / (len(rooms) * len(line))
+
+
+def run_out(count, spread, seed):
+    # Seconds late each timeout was declared, and process CPU seconds used
+    # (seating the games included)
+    rng = random.Random(seed)
+    cpu = time.process_time()
+    server, rooms, deadlines = seat_games(count, lambda i: TimeControl(0.2 + rng.random() * spread), clocks=True)
+    end = max(deadlines) + 2.0
+    while time.time() < end and any(room.game.winner is None for room in rooms):
+        time.sleep(0.05)
+    cpu = time.process_time() - cpu
+    server.close()
+    late = [room.last_activity - deadline for room, deadline in zip(rooms, deadlines) if room.game.winner]
+    return late, cpu, server.clocks.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--moves", type=int, default=40, help="moves timed in each of the first 100 games")
+    parser.add_argument("--spread", type=float, default=2.0, help="seconds the timeouts are spread over")
+    parser.add_argument("--budget", type=float, default=5.0, help="us allowed for an idle tick")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    batch = random_selfplay(64, seed=args.seed)
+    line = max((batch.history(i) for i in range(64)), key=len)[:args.moves]
+
+    print(f"{'games':>6} {'idle tick us':>13} {'poll us':>9} {'move us':>8} {'untimed':>8} "
+          f"{'timeouts':>9} {'late p50 ms':>12} {'p99':>6} {'CPU s':>6}")
+    over = False
+    for count in args.games:
+        server, rooms, _ = seat_games(count, lambda i: TimeControl(3600, byoyomi=30, periods=3))
+        now = time.time()
+        idle = statistics.median(per_call(lambda: server.clocks.tick(now), 10000) for _ in range(5))
+        poll = per_call(lambda: [room.check_clock(now) for room in rooms], 3)
+        timed = move_cost(rooms[:100], line)
+        _, untimed_rooms, _ = seat_games(min(count, 100), lambda i: None)
+        untimed = move_cost(untimed_rooms, line)
+        late, cpu, stats = run_out(count, args.spread, args.seed)
+        over |= idle * 1e6 > args.budget
+        print(f"{count:>6,} {idle * 1e6:>13.2f} {poll * 1e6:>9,.0f} {timed * 1e6:>8.1f} {untimed * 1e6:>8.1f} "
+              f"{stats['timeouts']:>9,} {percentile(late, 50) * 1e3:>12.1f} {percentile(late, 99) * 1e3:>6.1f} "
+              f"{cpu:>6.2f}")
+
+    if over:
+        print(f"idle tick over the {args.budget} us budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
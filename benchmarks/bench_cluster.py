@@ -0,0 +1,108 @@
+"""Cluster throughput: moves per second as the number of workers grows.
+
+Starts --workers worker processes sharing one cluster directory. Each
+creates --rooms rooms (so it owns them), then plays Black in its own rooms
+and White in the next worker's, placing random stones through the
+ClusterServer interface for --seconds: a snapshot to see whose turn it is,
+then a move. With more than one worker, half of every worker's seats are in
+rooms another process owns and go over the socket.
+
+    python benchmarks/bench_cluster.py --workers 1 2 4 --rooms 20 --seconds 5
+
+Throughput only scales while there are cores for the workers; the report
+shows how many this machine has.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cluster import ClusterServer
+
+
+def drive(cluster_dir, index, workers, rooms, seconds, barrier, results):
+    worker_id = f"w{index}"
+    server = ClusterServer(cluster_dir, worker_id)
+    rng = random.Random(index)
+    for i in range(rooms):
+        server.create_room(f"{worker_id}-{i}", f"{worker_id}-black-{i}")
+    barrier.wait()  # Every worker is up and has its rooms
+    server.ring(refresh=True)
+
+    partner = f"w{(index + 1) % workers}-"
+    lobby, _ = server.list_rooms(page_size=workers * rooms)
+    seats = [(server.get_room(summary.id), 1) for summary in lobby if summary.name.startswith(f"{worker_id}-")]
+    for summary in lobby:
+        if summary.name.startswith(partner):
+            room = server.get_room(summary.id)
+            room.join(f"{worker_id}-white-{summary.name}")
+            seats.append((room, 2))
+    remote = sum(room.id not in server.local.rooms for room, _ in seats)
+    barrier.wait()
+
+    moves = snapshots = 0
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        for room, role in seats:
+            snap = room.snapshot()
+            snapshots += 1
+            game = snap.game
+            if game.winner is not None or len(game.history) >= 60:
+                if role == 1:
+                    room.reset_game()
+                continue
+            if game.current_turn != role:
+                continue
+            success, _ = room.place_stone(rng.randint(3, 11), rng.randint(3, 11))
+            moves += success
+    elapsed = time.perf_counter() - start
+    barrier.wait()  # Keep serving until every worker has finished
+    server.close()
+    results.put((moves, snapshots, elapsed, remote, len(seats)))
+
+
+def run(workers, rooms, seconds):
+    context = multiprocessing.get_context("spawn")
+    cluster_dir = tempfile.mkdtemp(prefix="omok-cluster-")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=drive, args=(cluster_dir, i, workers, rooms, seconds, barrier, results))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    totals = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    shutil.rmtree(cluster_dir, ignore_errors=True)
+    moves = sum(total[0] for total in totals)
+    snapshots = sum(total[1] for total in totals)
+    elapsed = max(total[2] for total in totals)
+    remote = sum(total[3] for total in totals) / sum(total[4] for total in totals)
+    return moves / elapsed, snapshots / elapsed, remote
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--rooms", type=int, default=20, help="rooms each worker owns")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs")
+    print(f"{'workers':>7} {'moves/s':>9} {'snapshots/s':>12} {'remote seats':>13} {'scaling':>8}")
+    base = None
+    for workers in args.workers:
+        moves, snapshots, remote = run(workers, args.rooms, args.seconds)
+        base = base or moves
+        print(f"{workers:>7} {moves:>9,.0f} {snapshots:>12,.0f} {remote:>12.0%} {moves / base:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Multi-threaded contention benchmark for GameServer rooms.
+
+Worker threads hammer random rooms with joins, ready toggles, moves and
+snapshot reads, the way concurrent Streamlit sessions do. Afterwards every
+room's version and spectator list are checked against what the workers
+counted, so a lost update fails the run.
+
+    python benchmarks/bench_contention.py --rooms 200 --threads 1 2 4 8
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_server import GameServer
+
+
+def worker(server, room_ids, ops, seed, counts, errors):
+    rng = random.Random(seed)
+    for i in range(ops):
+        room = server.get_room(rng.choice(room_ids))
+        op = rng.random()
+        if op < 0.2:
+            room.join(f"spectator-{seed}-{i}")
+            counts[room.id]['spectators'] += 1
+            counts[room.id]['mutations'] += 1
+        elif op < 0.3:
+            room.toggle_ready(rng.choice([1, 2]))
+            counts[room.id]['mutations'] += 1
+        elif op < 0.6:
+            ok, _ = room.place_stone(rng.randrange(room.game.size), rng.randrange(room.game.size))
+            if ok:
+                counts[room.id]['mutations'] += 1
+        else:
+            snap = room.snapshot()
+            stones = int((snap.game.board != 0).sum())
+            if stones != len(snap.game.history):
+                errors.append(f"torn snapshot in {room.id}: {stones} stones, {len(snap.game.history)} moves")
+
+
+def run(room_count, thread_count, ops_per_thread):
+    server = GameServer(max_rooms=room_count)
+    room_ids = []
+    for i in range(room_count):
+        room_id = server.create_room(f"room-{i}", f"black-{i}")
+        server.get_room(room_id).join(f"white-{i}")
+        room_ids.append(room_id)
+    base_versions = {room_id: server.get_room(room_id).version for room_id in room_ids}
+
+    per_thread = [
+        {room_id: {'spectators': 0, 'mutations': 0} for room_id in room_ids}
+        for _ in range(thread_count)
+    ]
+    errors = []
+    threads = [
+        threading.Thread(target=worker, args=(server, room_ids, ops_per_thread, seed, per_thread[seed], errors))
+        for seed in range(thread_count)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    lost = 0
+    for room_id in room_ids:
+        room = server.get_room(room_id)
+        spectators = sum(counts[room_id]['spectators'] for counts in per_thread)
+        mutations = sum(counts[room_id]['mutations'] for counts in per_thread)
+        if len(room.spectators) != spectators or room.version - base_versions[room_id] != mutations:
+            lost += 1
+
+    total_ops = thread_count * ops_per_thread
+    return total_ops / elapsed, lost, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--ops", type=int, default=20000, help="operations per thread")
+    args = parser.parse_args()
+
+    print(f"{'threads':>8} {'ops/s':>12} {'lost rooms':>11} {'torn reads':>11}")
+    failed = False
+    for thread_count in args.threads:
+        throughput, lost, errors = run(args.rooms, thread_count, args.ops)
+        print(f"{thread_count:>8} {throughput:>12,.0f} {lost:>11} {len(errors):>11}")
+        failed = failed or lost or errors
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
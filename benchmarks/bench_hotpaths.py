@@ -0,0 +1,289 @@
+"""Micro-benchmarks for the game_logic and game_server hot paths.
+
+Times place_stone, undo_move, check_winner, check_forbidden_33 and
+legal_moves on an early and a crowded midgame position, Room.join/leave in
+a room with hundreds of spectators, GameServer.get_all_rooms/list_rooms
+on a full lobby and restoring a journal of midgame rooms (per room, from
+snapshots and from move events). Prints a table, optionally writes the results as JSON and
+compares them with a stored baseline, exiting 1 if any benchmark got slower
+than --threshold times its baseline.
+
+    python benchmarks/bench_hotpaths.py --baseline benchmarks/baseline.json
+    python benchmarks/bench_hotpaths.py --output benchmarks/baseline.json  # new baseline
+
+Baselines are machine-specific: record one on the box that runs the check.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_logic import OmokGame
+from game_server import GameServer, Room
+
+POSITIONS = {'early': 6, 'midgame': 80}
+SPECTATORS = 500
+ROOMS = 1000
+RESTORE_ROOMS = 300
+
+BENCHMARKS = []
+
+def benchmark(func):
+    BENCHMARKS.append(func)
+    return func
+
+
+def make_game(stones, seed, engine):
+    # Random but plausible position with no winner yet: each stone lands near
+    # an earlier one
+    rng = random.Random(seed)
+    game = OmokGame(engine=engine)
+    game.place_stone(7, 7)
+    while len(game.history) < stones:
+        row, col, _ = rng.choice(game.history)
+        game.place_stone(min(14, max(0, row + rng.randint(-2, 2))), min(14, max(0, col + rng.randint(-2, 2))))
+        if game.winner is not None:
+            game.undo_move()
+    return game
+
+def near_empty_cells(game):
+    # Empty cells within two of a stone: where real moves and checks happen
+    cells = set()
+    for row, col, _ in game.history:
+        for r in range(max(0, row - 2), min(game.size, row + 3)):
+            for c in range(max(0, col - 2), min(game.size, col + 3)):
+                if game.board[r, c] == 0:
+                    cells.add((r, c))
+    return sorted(cells)
+
+def playable_moves(game, count, seed):
+    # A legal, non-winning continuation of `count` moves (left unplayed)
+    rng = random.Random(seed)
+    moves = []
+    for _ in range(20 * count):
+        if len(moves) == count:
+            break
+        row, col = rng.choice(near_empty_cells(game))
+        success, _ = game.place_stone(row, col)
+        if not success:
+            continue
+        if game.winner is not None:
+            game.undo_move()
+            continue
+        moves.append((row, col))
+    for _ in moves:
+        game.undo_move()
+    return moves
+
+
+def calibrate(repeat):
+    # Seconds for a fixed pure-Python loop: how fast this box is right now
+    def run():
+        start = time.perf_counter()
+        total = 0
+        for i in range(200000):
+            total += i % 7
+        return time.perf_counter() - start, 1
+    return median_of(repeat, run)
+
+def median_of(repeat, run):
+    # run() returns (seconds, operations); median per-operation time of
+    # `repeat` runs (steadier than the best one on a shared box)
+    return statistics.median(seconds / ops for seconds, ops in (run() for _ in range(repeat)))
+
+def timed(func, items):
+    start = time.perf_counter()
+    for item in items:
+        func(*item)
+    return time.perf_counter() - start, len(items)
+
+
+@benchmark
+def game_logic(args):
+    results = {}
+    for name, stones in POSITIONS.items():
+        game = make_game(stones, seed=stones, engine=args.engine)
+        moves = playable_moves(game, 20, seed=stones)
+        cells = near_empty_cells(game)
+        last_row, last_col, _ = game.history[-1]
+
+        def place_and_undo():
+            place = timed(game.place_stone, moves)
+            undo = timed(game.undo_move, [()] * len(moves))
+            return place, undo
+
+        runs = [place_and_undo() for _ in range(args.repeat * 10)]
+        results[f'place_stone/{name}'] = statistics.median(s / n for (s, n), _ in runs)
+        results[f'undo_move/{name}'] = statistics.median(s / n for _, (s, n) in runs)
+        results[f'check_winner/{name}'] = median_of(args.repeat, lambda: timed(
+            game.check_winner, [(last_row, last_col)] * 1000))
+        results[f'check_forbidden_33/{name}'] = median_of(args.repeat, lambda: timed(
+            game.check_forbidden_33, cells * 10))
+
+        def legal_moves():
+            start = time.perf_counter()
+            for _ in range(100):
+                game._move_masks = None  # Time the computation, not the cache
+                game.legal_moves()
+            return time.perf_counter() - start, 100
+        results[f'legal_moves/{name}'] = median_of(args.repeat, legal_moves)
+    return results
+
+@benchmark
+def room(args):
+    # Join and leave in a room that already has SPECTATORS spectators
+    room = Room("bench", "black")
+    room.join("white")
+    for i in range(SPECTATORS):
+        room.join(f"spectator-{i}")
+    names = [(f"guest-{i}",) for i in range(100)]
+
+    def join_and_leave():
+        join = timed(room.join, names)
+        leave = timed(room.leave, names)
+        return join, leave
+
+    runs = [join_and_leave() for _ in range(args.repeat)]
+    return {
+        f'Room.join/{SPECTATORS}_spectators': statistics.median(s / n for (s, n), _ in runs),
+        f'Room.leave/{SPECTATORS}_spectators': statistics.median(s / n for _, (s, n) in runs),
+    }
+
+@benchmark
+def server(args):
+    server = GameServer(max_rooms=ROOMS)
+    for i in range(ROOMS):
+        server.create_room(f"room-{i}", f"player-{i}")
+    return {
+        f'GameServer.get_all_rooms/{ROOMS}_rooms': median_of(args.repeat, lambda: timed(
+            server.get_all_rooms, [()] * 100)),
+        f'GameServer.list_rooms/{ROOMS}_rooms': median_of(args.repeat, lambda: timed(
+            server.list_rooms, [(None, 10)] * 1000)),
+    }
+
+
+@benchmark
+def restore(args):
+    # GameServer start-up on a journal of RESTORE_ROOMS rooms with a midgame
+    # position each: once as written (move events to replay), once
+    # compacted (one snapshot per room)
+    folder = tempfile.mkdtemp()
+    written = os.path.join(folder, 'written.journal')
+    server = GameServer(max_rooms=RESTORE_ROOMS, journal_path=written)
+    for i in range(RESTORE_ROOMS):
+        room = server.get_room(server.create_room(f"room-{i}", f"black-{i}"))
+        room.join(f"white-{i}")
+        room.toggle_ready(1)
+        room.toggle_ready(2)
+        for row, col, _ in make_game(POSITIONS['midgame'], seed=i, engine='renju').history:
+            room.place_stone(row, col)
+    server.close()
+
+    def start(path):
+        def run():
+            copy = os.path.join(folder, 'copy.journal')
+            shutil.copy(path, copy)
+            started = time.perf_counter()
+            GameServer(max_rooms=RESTORE_ROOMS, journal_path=copy).close()
+            return time.perf_counter() - started, RESTORE_ROOMS
+        return run
+
+    try:
+        replay = median_of(args.repeat, start(written))
+        compacted = os.path.join(folder, 'compacted.journal')
+        shutil.copy(written, compacted)
+        GameServer(max_rooms=RESTORE_ROOMS, journal_path=compacted).close()
+        return {
+            f'GameServer.restore/{RESTORE_ROOMS}_rooms_replay': replay,
+            f'GameServer.restore/{RESTORE_ROOMS}_rooms_snapshot': median_of(args.repeat, start(compacted)),
+        }
+    finally:
+        shutil.rmtree(folder)
+
+
+def compare(results, baseline, threshold, scale):
+    # Names of benchmarks slower than threshold x baseline. Times are divided
+    # by `scale` (this run's calibration over the baseline's) so a box that is
+    # busier or slower overall does not read as a regression.
+    slower = []
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        ratio = seconds / scale / base
+        if ratio > threshold:
+            slower.append(name)
+        flag = "  SLOWER" if ratio > threshold else ""
+        print(f"{name:<42} {base * 1e6:>10.2f} -> {seconds * 1e6:>10.2f} us  x{ratio:.2f}{flag}")
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--engine", default="renju", help="OmokGame engine to time")
+    parser.add_argument("--rounds", type=int, default=5, help="passes over the whole suite")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark in each round")
+    parser.add_argument("--output", help="write results as JSON here")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=1.5,
+                        help="fail if a benchmark takes more than this times its baseline")
+    args = parser.parse_args()
+
+    # Whole rounds, interleaved, so a burst of load on the box hits one
+    # sample of every benchmark rather than every sample of one
+    samples = {}
+    calibrations = []
+    for _ in range(args.rounds):
+        calibrations.append(calibrate(args.repeat))
+        for func in BENCHMARKS:
+            for name, seconds in func(args).items():
+                samples.setdefault(name, []).append(seconds)
+    calibration = statistics.median(calibrations)
+    results = {name: statistics.median(values) for name, values in samples.items()}
+
+    print(f"{'benchmark':<42} {'us/op':>10}")
+    for name, seconds in results.items():
+        print(f"{name:<42} {seconds * 1e6:>10.2f}")
+
+    if args.output:
+        report = {
+            'meta': {
+                'engine': args.engine,
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'machine': platform.machine(),
+                'cpus': os.cpu_count(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'calibration': calibration,
+            },
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['meta'].get('engine') != args.engine:
+            sys.exit(f"baseline was recorded with engine {baseline['meta'].get('engine')!r}")
+        scale = calibration / baseline['meta']['calibration']
+        print(f"\ncompared with {args.baseline} (threshold x{args.threshold}, box speed x{1 / scale:.2f})")
+        slower = compare(results, baseline['results'], args.threshold, scale)
+        if slower:
+            print(f"\n{len(slower)} benchmark(s) slower than baseline: {', '.join(slower)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
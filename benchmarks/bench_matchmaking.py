@@ -0,0 +1,116 @@
+"""Quick-match queue: pairing throughput, wait times and rating gaps.
+
+Bulk: queues --bulk players at once (ratings ~ N(1500, 300)) and pairs
+them all, timing enqueue and pairing per player, and one player joining and
+cancelling while the whole queue waits (churn). Costs should grow with the
+log of the queue, not its length.
+
+Simulation: players arrive at --rate per second for --seconds of simulated
+time, the scheduler ticking every --tick seconds, and each pair is seated in
+a room on a GameServer. Reports wall time per player, how long players
+waited (simulated) and the rating gap they were matched across.
+
+    python benchmarks/bench_matchmaking.py --bulk 1000 10000 100000 --rate 20 200 --seconds 600
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_server import GameServer
+from matchmaking import MatchQueue
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))] if values else 0.0
+
+
+def bulk(count, seed):
+    rng = random.Random(seed)
+    queue = MatchQueue(server=None, max_window=10 ** 6)
+    ratings = [rng.gauss(1500, 300) for _ in range(count)]
+    start = time.perf_counter()
+    for i, rating in enumerate(ratings):
+        queue.enqueue(f"p{i}", rating, now=0.0)
+    enqueue = (time.perf_counter() - start) / count
+    churn = churn_cost(queue, rng)
+    start = time.perf_counter()
+    matched = 0
+    now = 0.0
+    while queue.order:
+        matched += 2 * len(queue.pair(now))
+        now += 1.0
+    pair = (time.perf_counter() - start) / max(matched, 1)
+    return enqueue, churn, pair, matched
+
+
+def churn_cost(queue, rng, rounds=2000):
+    # Seconds per enqueue + cancel with the queue full
+    ratings = [rng.gauss(1500, 300) for _ in range(rounds)]
+    start = time.perf_counter()
+    for i, rating in enumerate(ratings):
+        queue.enqueue("churn", rating, now=0.0)
+        queue.cancel("churn")
+    return (time.perf_counter() - start) / rounds
+
+
+def simulate(rate, seconds, tick, seed):
+    rng = random.Random(seed)
+    server = GameServer(max_rooms=10 ** 6)
+    queue = MatchQueue(server, ticket_ttl=10 ** 9)
+    ratings, joined, waits, gaps = {}, {}, [], []
+    peak = 0
+    count = 0
+    wall = 0.0
+    next_arrival = rng.expovariate(rate)
+    now = 0.0
+    while now < seconds:
+        now += tick
+        start = time.perf_counter()
+        while next_arrival <= now:
+            name = f"p{count}"
+            count += 1
+            ratings[name] = rng.gauss(1500, 300)
+            joined[name] = next_arrival
+            queue.enqueue(name, ratings[name], now=next_arrival)
+            next_arrival += rng.expovariate(rate)
+        peak = max(peak, len(queue.order))
+        pairs = queue.tick(now)
+        wall += time.perf_counter() - start
+        for black, white in pairs:
+            waits += [now - joined[black], now - joined[white]]
+            gaps.append(abs(ratings[black] - ratings[white]))
+    return count, wall, waits, gaps, peak, len(server.rooms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bulk", type=int, nargs="+", default=[1000, 10000, 100000], help="players queued at once")
+    parser.add_argument("--rate", type=float, nargs="+", default=[20, 200], help="arrivals per simulated second")
+    parser.add_argument("--seconds", type=float, default=600, help="simulated seconds")
+    parser.add_argument("--tick", type=float, default=0.5, help="scheduler interval, simulated seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'queued':>8} {'enqueue us':>11} {'churn us':>9} {'pair us/player':>15}")
+    for count in args.bulk:
+        enqueue, churn, pair, matched = bulk(count, args.seed)
+        print(f"{count:>8,} {enqueue * 1e6:>11.2f} {churn * 1e6:>9.2f} {pair * 1e6:>15.2f}")
+
+    print()
+    print(f"{'rate/s':>7} {'players':>8} {'peak queue':>11} {'rooms':>7} {'us/player':>10} "
+          f"{'wait p50':>9} {'p90':>6} {'p99':>6} {'gap p50':>8} {'p90':>5}")
+    for rate in args.rate:
+        count, wall, waits, gaps, peak, rooms = simulate(rate, args.seconds, args.tick, args.seed)
+        print(f"{rate:>7g} {count:>8,} {peak:>11,} {rooms:>7,} {wall / count * 1e6:>10.1f} "
+              f"{statistics.median(waits):>8.1f}s {percentile(waits, 90):>5.1f}s {percentile(waits, 99):>5.1f}s "
+              f"{statistics.median(gaps):>8.0f} {percentile(gaps, 90):>5.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Memory per room: how many rooms fit in a GB of one server process.
+
+Fills a GameServer with --rooms rooms in a few states and reports bytes per
+room and rooms per GB, from tracemalloc (Python allocations only, so it is
+steady from run to run) and from the process RSS (everything, NumPy and
+allocator overhead included). Each number comes from a fresh process, and
+RSS is taken without tracemalloc, whose bookkeeping would swamp it.
+
+    python benchmarks/bench_memory.py --rooms 5000 --moves 30
+
+States: 'idle' has just its creator, 'seated' a second player and a
+snapshot taken, 'played' also --moves random moves in.
+"""
+import argparse
+import gc
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_server import GameServer
+
+GB = 2 ** 30
+
+
+def rss_bytes():
+    # Current resident set size; peak RSS where /proc is missing
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def fill(server, state, rooms, moves, seed):
+    rng = random.Random(seed)
+    first = len(server.rooms)  # Players are in one room at a time: new names per call
+    for i in range(first, first + rooms):
+        room = server.get_room(server.create_room(f"{state}-{i}", f"black-{i}"))
+        if state == 'idle':
+            continue
+        room.join(f"white-{i}")
+        while len(room.game.history) < moves and state == 'played':
+            # Random stones near the centre; start over if someone wins
+            room.place_stone(rng.randint(3, 11), rng.randint(3, 11))
+            if room.game.winner is not None:
+                room.reset_game()
+        room.snapshot()
+
+
+def measure(traced, state, rooms, moves, seed):
+    # Bytes per room for a server holding `rooms` rooms, by tracemalloc or RSS
+    if traced:
+        tracemalloc.start()
+    used = (lambda: tracemalloc.get_traced_memory()[0]) if traced else rss_bytes
+    server = GameServer(max_rooms=rooms)
+    fill(server, state, 10, moves, seed)  # Per-size tables and caches load here, not below
+    gc.collect()
+    before = used()
+    fill(server, state, rooms, moves, seed)
+    gc.collect()
+    return (used() - before) / rooms
+
+def measure_apart(*args):
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(measure, *args).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=int, default=5000, help="rooms per state")
+    parser.add_argument("--moves", type=int, default=30, help="moves into each 'played' game")
+    parser.add_argument("--states", nargs="+", choices=['idle', 'seated', 'played'],
+                        default=['idle', 'seated', 'played'])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'state':<8} {'traced B/room':>14} {'rooms/GB':>10} {'rss B/room':>11} {'rooms/GB':>10}")
+    for state in args.states:
+        traced = measure_apart(True, state, args.rooms, args.moves, args.seed)
+        rss = measure_apart(False, state, args.rooms, args.moves, args.seed)
+        # RSS grows in whole pages, so it can read low (or zero) for small runs
+        rss_rooms = f"{GB / rss:>10,.0f}" if rss > 0 else f"{'n/a':>10}"
+        print(f"{state:<8} {traced:>14,.0f} {GB / traced:>10,.0f} {rss:>11,.0f} {rss_rooms}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Replay seek and streaming speed against rebuilding from move 0.
+
+Plays random games to the end, then times random seeks on a Replay (for a
+few keyframe intervals), rebuilding the same positions by replaying moves
+onto an empty board, and streaming every position with Replay.positions().
+
+    python benchmarks/bench_replay.py --games 20 --seeks 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_game import random_selfplay
+from replay import Replay
+
+
+def rebuild(history, n, size):
+    # What seeking cost before: a fresh board and n stone writes
+    board = np.zeros((size, size), dtype=np.int8)
+    for row, col, player in history[:n]:
+        board[row, col] = player
+    return board
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--size", type=int, default=15)
+    parser.add_argument("--seeks", type=int, default=2000, help="random seeks per game")
+    parser.add_argument("--every", type=int, nargs="+", default=[4, 16, 64], help="keyframe intervals")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    batch = random_selfplay(args.games, args.size, seed=args.seed)
+    histories = [batch.history(i) for i in range(args.games)]
+    rng = random.Random(args.seed)
+    targets = [[rng.randrange(len(history) + 1) for _ in range(args.seeks)] for history in histories]
+    moves = sum(len(history) for history in histories)
+    print(f"{args.games} games, {moves / args.games:.0f} moves on average")
+
+    start = time.perf_counter()
+    for history, seeks in zip(histories, targets):
+        for n in seeks:
+            rebuild(history, n, args.size)
+    base = (time.perf_counter() - start) / (args.games * args.seeks)
+    print(f"{'from move 0':<22} {base * 1e6:>8.2f} us/seek")
+
+    for every in args.every:
+        start = time.perf_counter()
+        replays = [Replay(history, args.size, every) for history in histories]
+        build = (time.perf_counter() - start) / args.games
+        start = time.perf_counter()
+        for replay, seeks in zip(replays, targets):
+            for n in seeks:
+                replay.seek(n)
+        seek = (time.perf_counter() - start) / (args.games * args.seeks)
+        start = time.perf_counter()
+        positions = sum(sum(1 for _ in replay.positions()) for replay in replays)
+        stream = (time.perf_counter() - start) / positions
+        print(f"{f'keyframes every {every}':<22} {seek * 1e6:>8.2f} us/seek  x{base / seek:.1f}  "
+              f"{stream * 1e6:.2f} us/position streamed  {build * 1e3:.2f} ms to build")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Random self-play throughput: batched NumPy simulator vs OmokGame.
+
+Plays --games random games with BatchGame, replays the first --verify of them
+through OmokGame.place_stone to check every move and result agrees, and
+reports games/s for both.
+
+    python benchmarks/bench_selfplay.py --games 100000 --verify 200
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_game import random_selfplay
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=100000)
+    parser.add_argument("--size", type=int, default=15)
+    parser.add_argument("--engine", default="renju", help="OmokGame engine whose rules to play by")
+    parser.add_argument("--verify", type=int, default=200, help="games to replay through OmokGame")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    batch = random_selfplay(args.games, args.size, args.engine, seed=args.seed)
+    elapsed = time.perf_counter() - start
+    results = np.bincount(batch.winner, minlength=3)
+    moves = int(batch.move_count.sum())
+    print(f"batched:  {args.games} games, {moves} moves in {elapsed:.2f}s "
+          f"= {args.games / elapsed:,.0f} games/s, {moves / elapsed:,.0f} moves/s")
+    print(f"          black {results[1]}, white {results[2]}, draws {results[0]}, "
+          f"{batch.move_count.mean():.1f} moves/game")
+
+    count = min(args.verify, args.games)
+    if not count:
+        return
+    start = time.perf_counter()
+    for i in range(count):
+        game = batch.to_game(i, args.engine)
+        if (len(game.history) != batch.move_count[i] or (game.winner or 0) != batch.winner[i]
+                or not (game.board == batch.boards[i]).all()):
+            sys.exit(f"game {i}: OmokGame disagrees with the batched result")
+        if not batch.winner[i] and len(game.history) < args.size ** 2 and game.legal_moves().any():
+            sys.exit(f"game {i}: stopped as a draw but OmokGame still has legal moves")
+    elapsed = time.perf_counter() - start
+    print(f"OmokGame: replayed {count} games in {elapsed:.2f}s = {count / elapsed:,.0f} games/s, all identical")
+
+
+if __name__ == "__main__":
+    main()
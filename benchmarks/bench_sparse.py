@@ -0,0 +1,106 @@
+"""Sparse vs dense boards: per-move cost and memory as the board grows.
+
+Plays the same --moves random moves near the centre on an OmokGame and a
+SparseGame for each board size, then reports place_stone + undo_move time,
+the viewport board and masks a snapshot builds (viewport + window), and the
+memory one game holds (tracemalloc, shared per-size tables excluded).
+
+    python benchmarks/bench_sparse.py --sizes 15 19 51 1001 inf --moves 40
+
+Dense games past --dense-max are skipped: their per-size tables alone take
+minutes and gigabytes to build.
+"""
+import argparse
+import gc
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_logic import OmokGame, SparseGame
+
+
+def play(game, moves, seed):
+    # Random stones within six of the centre; a won game is taken back a move
+    rng = random.Random(seed)
+    center = 0 if game.size is None else game.size // 2
+    while len(game.history) < moves:
+        game.place_stone(center + rng.randint(-6, 6), center + rng.randint(-6, 6))
+        if game.winner is not None:
+            game.undo_move()
+    return game
+
+def free_cells(game, count, seed):
+    rng = random.Random(seed)
+    center = 0 if game.size is None else game.size // 2
+    cells = []
+    while len(cells) < count:
+        row, col = center + rng.randint(-6, 6), center + rng.randint(-6, 6)
+        success, _ = game.place_stone(row, col)
+        if success:
+            game.undo_move()
+            cells.append((row, col))
+    return cells
+
+def time_moves(game, cells, repeat):
+    def run():
+        start = time.perf_counter()
+        for row, col in cells:
+            game.place_stone(row, col)
+            game.undo_move()
+        return (time.perf_counter() - start) / len(cells)
+    return statistics.median(run() for _ in range(repeat))
+
+def time_window(game, repeat):
+    def run():
+        start = time.perf_counter()
+        if isinstance(game, OmokGame):
+            game._move_masks = None  # Time the computation, not the cache
+        game.window(*game.viewport())
+        return time.perf_counter() - start
+    return statistics.median(run() for _ in range(repeat))
+
+def game_bytes(make, moves, seed, count=20):
+    make()  # Per-size tables load here, not below
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    games = [play(make(), moves, seed) for _ in range(count)]
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del games
+    return used / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=["15", "19", "51", "1001", "inf"],
+                        help="board sizes, 'inf' for unbounded")
+    parser.add_argument("--moves", type=int, default=40, help="stones on the board when timing")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--dense-max", type=int, default=51, help="largest size to time OmokGame on")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'size':>6} {'game':<11} {'move+undo us':>13} {'window ms':>10} {'KB/game':>9}")
+    for text in args.sizes:
+        size = None if text == "inf" else int(text)
+        kinds = [("SparseGame", lambda: SparseGame(size))]
+        if size is not None and size <= args.dense_max:
+            kinds.insert(0, ("OmokGame", lambda: OmokGame(size)))
+        for name, make in kinds:
+            game = play(make(), args.moves, args.seed)
+            cells = free_cells(game, 50, args.seed)
+            move = time_moves(game, cells, args.repeat)
+            window = time_window(game, args.repeat)
+            kb = game_bytes(make, args.moves, args.seed) / 1024
+            print(f"{text:>6} {name:<11} {move * 1e6:>13.1f} {window * 1e3:>10.2f} {kb:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Threat map speed: whole-board NumPy analysis against a cell-by-cell scan.
+
+Takes positions from random self-play games (--moves stones in), then times
+threats.analyze on each against a Python scan that reads every empty
+cell's four 11-cell windows for both sides and looks them up in the same
+pattern tables (and checks that both agree). Also times Room.threats on a
+repeat call, which is the cached path every rerun after the first takes.
+
+    python benchmarks/bench_threats.py --sizes 15 19 --positions 50 --budget 5
+
+Fails (exit status 1) when the full-board analysis takes longer than
+--budget milliseconds on average.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_game import random_selfplay
+from game_logic import DIRECTIONS, _renju_reason
+from game_server import Room
+from renju import CENTER, FIVE, FOUR, LINE_FOURS, LINE_KIND, OPEN_FOUR, OVERLINE, THREE, WEIGHTS, WINDOW
+from threats import analyze
+
+
+def scan(board):
+    # What analysis cost before: every empty cell, side and direction in Python
+    size = len(board)
+    counts = np.zeros((2, 4, size, size), dtype=np.int8)
+    for player in (1, 2):
+        for r in range(size):
+            for c in range(size):
+                if board[r][c]:
+                    continue
+                codes = []
+                for dr, dc in DIRECTIONS:
+                    code = WEIGHTS[CENTER]
+                    for i in range(WINDOW):
+                        if i == CENTER:
+                            continue
+                        row, col = r + (i - CENTER) * dr, c + (i - CENTER) * dc
+                        value = board[row][col] if 0 <= row < size and 0 <= col < size else 3
+                        code += (0 if value == 0 else 1 if value == player else 2) * WEIGHTS[i]
+                    codes.append(code)
+                if player == 1 and _renju_reason(codes):
+                    continue
+                kinds = [LINE_KIND[code] for code in codes]
+                counts[player - 1, :, r, c] = (
+                    sum(kind == FIVE or (kind == OVERLINE and player == 2) for kind in kinds),
+                    sum(kind == OPEN_FOUR for kind in kinds),
+                    sum(LINE_FOURS[code] for code, kind in zip(codes, kinds) if kind == FOUR),
+                    sum(kind == THREE for kind in kinds),
+                )
+    return counts
+
+
+def positions(size, count, moves, seed):
+    batch = random_selfplay(count, size, seed=seed)
+    boards = []
+    for i in range(count):
+        board = np.zeros((size, size), dtype=np.int8)
+        for row, col, player in batch.history(i)[:moves]:
+            board[row, col] = player
+        boards.append(board)
+    return boards
+
+
+def mean_time(fn, items, repeat):
+    def run():
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        return (time.perf_counter() - start) / len(items)
+    return statistics.median(run() for _ in range(repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[15, 19])
+    parser.add_argument("--positions", type=int, default=50)
+    parser.add_argument("--moves", type=int, default=40, help="stones on each board (fewer if the game ended)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=5.0, help="ms allowed for one full-board analysis")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'size':>4} {'scan ms':>9} {'analyze ms':>11} {'speedup':>8} {'cached us':>10}")
+    over = False
+    for size in args.sizes:
+        boards = positions(size, args.positions, args.moves, args.seed)
+        for board in boards:
+            assert np.array_equal(analyze(board).counts, scan(board.tolist())), "analyze and scan disagree"
+
+        base = mean_time(lambda board: scan(board.tolist()), boards, 1)
+        fast = mean_time(analyze, boards, args.repeat)
+
+        rooms = []
+        for board in boards:
+            room = Room("bench", "black", size=size)
+            room.game.load(board, [(int(r), int(c), int(board[r, c])) for r, c in zip(*board.nonzero())], None, 1)
+            room.threats()
+            rooms.append(room)
+        cached = mean_time(Room.threats, rooms, args.repeat)
+
+        over |= fast * 1e3 > args.budget
+        print(f"{size:>4} {base * 1e3:>9.2f} {fast * 1e3:>11.3f} {base / fast:>7.0f}x {cached * 1e6:>10.2f}")
+
+    if over:
+        print(f"analysis over the {args.budget} ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
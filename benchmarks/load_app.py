@@ -0,0 +1,218 @@
+"""Headless load test: many players and spectators driving app.py.
+
+Every simulated browser tab is a Streamlit AppTest session on the same
+process, so they share one GameServer. Each room has two players who log in,
+create and join the room through the lobby, toggle ready, ask for (and
+accept) swaps and undos, and play random legal moves until the game ends,
+then start another. Every change also reruns the other tabs in the room, as
+the change watcher would, and idle spectators keep polling.
+
+Rooms are added in stages; after each stage every room plays --ticks
+actions and the script reports rerun latency percentiles, CPU and memory.
+
+    python benchmarks/load_app.py --rooms 1 5 10 20 --spectators 2 --ticks 20
+
+Reruns are driven one at a time, so latency is per rerun on an otherwise
+busy process, not under true parallelism.
+"""
+import argparse
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("OMOK_JOURNAL", "")  # Load runs should not touch the real journal
+os.environ.setdefault("OMOK_ARCHIVE", "")  # or leave a game archive behind
+
+from streamlit.testing.v1 import AppTest
+
+from game_logic import OmokGame
+
+APP_PATH = os.path.join(ROOT, "app.py")
+
+
+def rss_mb():
+    # Current resident set size; peak RSS where /proc is missing
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+class Session:
+    # One browser tab
+    def __init__(self, name, latencies):
+        self.name = name
+        self.latencies = latencies
+        self.at = AppTest.from_file(APP_PATH, default_timeout=60)
+
+    def run(self, kind):
+        start = time.perf_counter()
+        self.at.run()
+        self.latencies.setdefault(kind, []).append(time.perf_counter() - start)
+        if self.at.exception:
+            raise RuntimeError(f"{self.name}: {self.at.exception[0].message}")
+
+    def click(self, kind, key=None, label=None):
+        buttons = [b for b in self.at.button if (key is None or b.key == key) and (label is None or b.label == label)]
+        if not buttons:
+            raise RuntimeError(f"{self.name}: no button key={key!r} label={label!r}")
+        buttons[0].click()
+        self.run(kind)
+
+    def has_button(self, key):
+        return any(b.key == key for b in self.at.button)
+
+    def login(self):
+        self.run("login")
+        self.at.text_input(key="login_name").input(self.name)
+        self.click("login", label="Start")
+
+    def create_room(self, room_name):
+        self.at.text_input[0].input(room_name)
+        self.click("lobby", label="Create")
+        return self.at.session_state["room_id"]
+
+    def join(self, room_id):
+        # Page through the lobby to the room's Join button
+        key = f"join_{room_id}"
+        page = 1
+        while not self.has_button(key):
+            page += 1
+            self.at.number_input(key="lobby_page").set_value(page)
+            self.run("lobby")
+        self.click("lobby", key=key)
+
+
+class RoomBot:
+    def __init__(self, index, spectators, board, latencies, rng):
+        self.rng = rng
+        self.board = board
+        self.players = [Session(f"p{index}-{seat}", latencies) for seat in "ab"]
+        self.spectators = [Session(f"s{index}-{i}", latencies) for i in range(spectators)]
+        self.black, self.white = self.players
+        self.game = OmokGame()  # Mirror of the room's game, to pick legal moves
+
+    @property
+    def sessions(self):
+        return self.players + self.spectators
+
+    def setup(self, swap_rate):
+        for session in self.sessions:
+            session.login()
+        room_id = self.black.create_room(f"load-{self.black.name}")
+        self.white.join(room_id)
+        for session in self.spectators:
+            session.join(room_id)
+        self.start_game(swap_rate)
+
+    def rerun_others(self, actor):
+        # What the change watcher does for every other tab in the room
+        for session in self.sessions:
+            if session is not actor:
+                session.run("watch")
+
+    def request(self, requester, label, other):
+        requester.click("action", label=label)
+        self.rerun_others(requester)
+        other.click("action", key="accept_req")
+        self.rerun_others(other)
+
+    def start_game(self, swap_rate):
+        if self.rng.random() < swap_rate:
+            self.request(self.black, "⇄ Swap Seats", self.white)
+            self.black, self.white = self.white, self.black
+        for session in (self.black, self.white):
+            session.click("action", key="toggle_ready")
+            self.rerun_others(session)
+
+    def move(self):
+        mover = self.black if self.game.current_turn == 1 else self.white
+        legal = self.game.legal_moves()
+        # Play near the existing stones, like people do
+        rows, cols = legal.nonzero()
+        if self.game.history:
+            last_r, last_c, _ = self.rng.choice(self.game.history)
+            near = [(r, c) for r, c in zip(rows, cols) if abs(r - last_r) <= 2 and abs(c - last_c) <= 2]
+        else:
+            near = [(self.game.size // 2, self.game.size // 2)]
+        row, col = map(int, self.rng.choice(near or list(zip(rows, cols))))
+
+        if self.board == "classic":
+            mover.click("move", key=f"b_{row}_{col}")
+        else:
+            # Exactly what the canvas component sends on a click
+            mover.at.session_state["omok_board"] = {
+                "row": row, "col": col, "move": len(self.game.history), "nonce": time.time() + self.rng.random()}
+            mover.run("move")
+        self.game.place_stone(row, col)
+        self.rerun_others(mover)
+        return mover
+
+    def tick(self, undo_rate, swap_rate):
+        if self.game.winner is not None:
+            self.black.click("action", label="New Game")
+            self.rerun_others(self.black)
+            self.game.reset()
+            self.start_game(swap_rate)
+            return
+        mover = self.move()
+        if self.game.winner is None and self.rng.random() < undo_rate:
+            other = self.white if mover is self.black else self.black
+            self.request(mover, "↩️ Undo", other)
+            self.game.undo_move()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=int, nargs="+", default=[1, 5, 10, 20], help="room counts to step through")
+    parser.add_argument("--spectators", type=int, default=2, help="idle spectators per room")
+    parser.add_argument("--ticks", type=int, default=20, help="actions per room at each stage")
+    parser.add_argument("--board", choices=["canvas", "classic"], default="canvas")
+    parser.add_argument("--undo-rate", type=float, default=0.05)
+    parser.add_argument("--swap-rate", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    bots = []
+    print(f"board={args.board} spectators/room={args.spectators} ticks={args.ticks}")
+    print(f"{'rooms':>5} {'tabs':>5} {'reruns':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'watch p95':>9} {'cpu %':>6} {'rss MB':>7}")
+    for target in args.rooms:
+        latencies = {}
+        wall, cpu = time.perf_counter(), time.process_time()
+        while len(bots) < target:
+            bot = RoomBot(len(bots), args.spectators, args.board, latencies, rng)
+            if args.board == "classic":
+                for session in bot.players:
+                    session.at.session_state["classic_board"] = True
+            bot.setup(args.swap_rate)
+            bots.append(bot)
+        for _ in range(args.ticks):
+            for bot in bots:
+                bot.tick(args.undo_rate, args.swap_rate)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+        values = [v for kind in latencies.values() for v in kind]
+        watch = latencies.get("watch", [0])
+        tabs = sum(len(bot.sessions) for bot in bots)
+        print(f"{target:>5} {tabs:>5} {len(values):>7} {percentile(values, 50) * 1e3:>8.1f} "
+              f"{percentile(values, 95) * 1e3:>8.1f} {percentile(values, 99) * 1e3:>8.1f} "
+              f"{percentile(watch, 95) * 1e3:>9.1f} {100 * cpu / wall:>6.0f} {rss_mb():>7.0f}")
+
+    print("\nmean ms by rerun kind (last stage): " + ", ".join(
+        f"{kind} {statistics.mean(values) * 1e3:.1f}" for kind, values in sorted(latencies.items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import os
+import threading
+from collections import OrderedDict, namedtuple
+import streamlit as st
+import streamlit.components.v1 as components
+
+# Static HTML/JS component: no build step, it speaks the component protocol directly
+_board_component = components.declare_component(
+    "omok_board",
+    path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "board_component"),
+)
+
+CELL_PX = 38
+
+# Everything a viewer needs to draw one room version, whoever is looking:
+# cells of the snapshot's viewport as encoded by encode_board (size across),
+# the last move's cell in it, the move number and the board cell at its
+# top-left corner
+BoardRender = namedtuple('BoardRender', ['size', 'cells', 'last', 'move', 'origin'])
+
+def encode_board(game, legal, forbidden):
+    # One character per cell, row-major:
+    # 'b'/'w' stones, '+' playable, 'x' forbidden to Black, '.' empty but not playable
+    chars = []
+    board = game.board.tolist()
+    legal = legal.tolist()
+    forbidden = forbidden.tolist()
+    side = len(board)
+    for r in range(side):
+        for c in range(side):
+            v = board[r][c]
+            if v == 1:
+                chars.append('b')
+            elif v == 2:
+                chars.append('w')
+            elif forbidden[r][c]:
+                chars.append('x')
+            elif legal[r][c]:
+                chars.append('+')
+            else:
+                chars.append('.')
+    return ''.join(chars)
+
+def build_render(game):
+    side = len(game.board)
+    top, left = game.origin
+    last = None
+    if game.history:
+        r, c, _ = game.history[-1]
+        if top <= r < top + side and left <= c < left + side:
+            last = (r - top) * side + (c - left)
+    return BoardRender(side, encode_board(game, game.legal, game.forbidden), last, len(game.history), game.origin)
+
+def build_replay_render(replay, n):
+    # Read-only BoardRender of position n of a Replay: stones only
+    top, left, side = replay.viewport(n)
+    cells = ''.join('.bw'[v] for v in replay.window(n, top, left, side).ravel().tolist())
+    last = None
+    if n:
+        r, c, _ = replay.moves[n - 1]
+        if top <= r < top + side and left <= c < left + side:
+            last = (r - top) * side + (c - left)
+    return BoardRender(side, cells, last, n, (top, left))
+
+
+class RenderCache:
+    # Latest BoardRender of each room, shared by every session that views it,
+    # so spectators and waiting players do not each re-encode the same board.
+    # Rooms not viewed for a while fall off past maxsize.
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # room id -> (room version, BoardRender)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, snap):
+        # BoardRender for a RoomSnapshot
+        with self.lock:
+            entry = self.entries.get(snap.id)
+            if entry is not None and entry[0] == snap.version:
+                self.entries.move_to_end(snap.id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        render = build_render(snap.game)
+        with self.lock:
+            current = self.entries.get(snap.id)
+            if current is None or current[0] < snap.version:
+                self.entries[snap.id] = (snap.version, render)
+            self.entries.move_to_end(snap.id)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return render
+
+RENDER_CACHE = RenderCache()
+
+
+def omok_board(render, interactive, key="omok_board", heat=None):
+    # Draws the board (its viewport) as one element, with threats.encode_heat
+    # levels shaded over the empty cells when `heat` is given. Returns the
+    # clicked board (row, col) once per click, or None.
+    move = render.move
+    click = _board_component(
+        size=render.size,
+        cells=render.cells,
+        last=render.last,
+        move=move,
+        heat=heat,
+        interactive=interactive,
+        cell_px=CELL_PX,
+        key=key,
+        default=None,
+    )
+
+    # The component keeps returning its last value on every rerun, so each click
+    # carries a nonce and the move number it was made on
+    if not click:
+        return None
+    seen_key = f"{key}_seen_click"
+    if st.session_state.get(seen_key) == click['nonce']:
+        return None
+    st.session_state[seen_key] = click['nonce']
+    if click['move'] != move:
+        return None
+    return render.origin[0] + click['row'], render.origin[1] + click['col']
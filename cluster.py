@@ -0,0 +1,482 @@
+import bisect
+import hashlib
+import os
+import secrets
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing.connection import Client, Listener
+from types import MappingProxyType
+
+from game_server import GameServer, new_room_id
+
+# Rooms spread over several server processes ("workers"), e.g. one per
+# Streamlit worker behind a load balancer, so two players of a room can be
+# served by different processes.
+#
+# Every worker keeps the rooms it owns in an ordinary in-memory GameServer and
+# serves them to the other workers over a Unix socket in a shared cluster
+# directory; the sockets there are the membership list. A room's owner is
+# found by consistent hashing of its id over the live workers, and rooms are
+# created with ids that hash to the creating worker. ClusterServer offers the
+# GameServer interface app.py uses on top of all that: local rooms are the
+# Room objects themselves, remote ones RemoteRoom proxies.
+#
+# Workers authenticate each other with a shared key: OMOK_CLUSTER_KEY, or
+# else a random one the first worker writes to the cluster directory,
+# readable by its owner only.
+
+REPLICAS = 64  # Points per worker on the hash ring
+MEMBERSHIP_TTL = 2.0  # Seconds a read of the cluster directory is trusted
+DOWN_TTL = 10.0  # Seconds a worker that refused a connection is skipped
+LOBBY_POLL = 0.1  # Seconds between checks of other workers' versions while waiting
+SNAPSHOT_CACHE = 1024  # Remote room snapshots kept, to skip resending unchanged ones
+KEY_FILE = "cluster.key"  # In the cluster directory, when OMOK_CLUSTER_KEY is not set
+
+# What other workers may call: on the GameServer (room id None) and on a Room
+SERVER_CALLS = {'create_room', 'count_rooms', 'lobby', 'leave_room', 'population', 'version',
+                'wait_for_change', 'has_room', 'find_player', 'join_room'}
+ROOM_CALLS = {'join', 'leave', 'heartbeat', 'snapshot_since', 'toggle_ready', 'place_stone', 'add_ai',
+              'reset_game', 'make_request', 'cancel_request', 'resolve_request', 'swap_players',
+              'wait_for_change', 'version', 'threats'}
+
+
+class RoomNotFound(KeyError):
+    # A room its worker no longer has: closed or reaped after it was looked
+    # up. app.py handles it as get_room() returning None.
+    pass
+
+
+def cluster_key(cluster_dir):
+    # The key workers authenticate each other with: OMOK_CLUSTER_KEY, else
+    # the cluster directory's key file, made by the first worker to start
+    key = os.environ.get("OMOK_CLUSTER_KEY")
+    if key:
+        return key.encode()
+    path = os.path.join(cluster_dir, KEY_FILE)
+    if not os.path.exists(path):
+        # Written aside (mkstemp makes it 0600) and linked into place, so no
+        # worker reads half a key; when two race, the first link wins
+        fd, temp = tempfile.mkstemp(dir=cluster_dir)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(secrets.token_hex(32))
+            try:
+                os.link(temp, path)
+            except FileExistsError:
+                pass
+        finally:
+            os.unlink(temp)
+    if os.stat(path).st_mode & 0o077:
+        raise PermissionError(f"{path} is readable by others; chmod 600 it or set OMOK_CLUSTER_KEY")
+    with open(path) as f:
+        return f.read().strip().encode()
+
+
+def _hash(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    # Consistent hashing: every worker owns the arcs ending at its points, so
+    # a worker joining or leaving moves only the rooms on its own arcs
+    def __init__(self, nodes=(), replicas=REPLICAS):
+        self.nodes = sorted(nodes)
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(replicas))
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, key):
+        if not self._points:
+            return None
+        return self._owners[bisect.bisect(self._points, _hash(key)) % len(self._points)]
+
+
+def _snapshot_to_wire(snap):
+    # RoomSnapshot with plain dicts: mapping proxies do not pickle
+    pending = dict(snap.pending_request) if snap.pending_request else None
+    return snap._replace(players=dict(snap.players), ready_state=dict(snap.ready_state), pending_request=pending)
+
+def _snapshot_from_wire(snap):
+    game = snap.game
+    for array in (game.board, game.legal, game.forbidden):
+        array.setflags(write=False)
+    pending = MappingProxyType(snap.pending_request) if snap.pending_request else None
+    return snap._replace(players=MappingProxyType(snap.players), ready_state=MappingProxyType(snap.ready_state),
+                         pending_request=pending)
+
+
+class ShardServer:
+    # Serves one worker's GameServer to the others: pickled (room id, method,
+    # args) calls over authenticated multiprocessing connections, one thread
+    # per connection. Callers' exceptions are sent back and raised there.
+    def __init__(self, server, address, authkey):
+        self.server = server
+        self.listener = Listener(address, family='AF_UNIX', authkey=authkey)
+        self.address = address
+        self._closed = False
+        threading.Thread(target=self._accept, name="shard-accept", daemon=True).start()
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                conn = self.listener.accept()
+            except Exception:
+                if self._closed:
+                    return
+                continue  # Failed handshake: drop that client only
+            threading.Thread(target=self._serve, args=(conn,), name="shard-conn", daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            while True:
+                try:
+                    room_id, method, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = (True, self._call(room_id, method, args, kwargs))
+                except Exception as exc:
+                    reply = (False, exc)
+                try:
+                    conn.send(reply)
+                except OSError:
+                    return
+
+    def _call(self, room_id, method, args, kwargs):
+        server = self.server
+        if room_id is None:
+            if method not in SERVER_CALLS:
+                raise AttributeError(f"GameServer.{method} is not served")
+            if method == 'lobby':
+                return server.list_rooms(args[0], 0, args[1])
+            if method == 'version':
+                return server.version
+            if method == 'has_room':
+                return server.get_room(args[0]) is not None
+            return getattr(server, method)(*args, **kwargs)
+
+        if method not in ROOM_CALLS:
+            raise AttributeError(f"Room.{method} is not served")
+        room = server.get_room(room_id)
+        if room is None:
+            raise RoomNotFound(room_id)
+        if method == 'snapshot_since':
+            snap = room.snapshot()
+            return None if snap.version == args[0] else _snapshot_to_wire(snap)
+        if method == 'version':
+            return room.version
+        return getattr(room, method)(*args, **kwargs)
+
+    def close(self):
+        self._closed = True
+        self.listener.close()
+
+
+class _Peer:
+    # Connections to one other worker, reused across calls; each carries one
+    # call at a time, so concurrent callers get connections of their own
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = authkey
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def call(self, room_id, method, *args, **kwargs):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = Client(self.address, family='AF_UNIX', authkey=self.authkey)
+        try:
+            conn.send((room_id, method, args, kwargs))
+            ok, result = conn.recv()
+        except BaseException:
+            conn.close()
+            raise
+        with self._lock:
+            self._idle.append(conn)
+        if not ok:
+            raise result
+        return result
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+def _remote(method):
+    def call(self, *args, **kwargs):
+        return self.peer.call(self.id, method, *args, **kwargs)
+    call.__name__ = method
+    return call
+
+
+class RemoteRoom:
+    # Stand-in for a Room owned by another worker: the same methods, run there
+    def __init__(self, cluster, peer, room_id):
+        self.cluster = cluster
+        self.peer = peer
+        self.id = room_id
+
+    join = _remote('join')
+    leave = _remote('leave')
+    heartbeat = _remote('heartbeat')
+    toggle_ready = _remote('toggle_ready')
+    place_stone = _remote('place_stone')
+    add_ai = _remote('add_ai')
+    reset_game = _remote('reset_game')
+    make_request = _remote('make_request')
+    cancel_request = _remote('cancel_request')
+    resolve_request = _remote('resolve_request')
+    swap_players = _remote('swap_players')
+    wait_for_change = _remote('wait_for_change')
+    threats = _remote('threats')
+
+    @property
+    def version(self):
+        return self.peer.call(self.id, 'version')
+
+    def snapshot(self):
+        # Only versions this worker has not seen cross the socket
+        cache = self.cluster._snapshots
+        with self.cluster._lock:
+            cached = cache.get(self.id)
+        try:
+            snap = self.peer.call(self.id, 'snapshot_since', cached.version if cached else None)
+        except RoomNotFound:
+            with self.cluster._lock:
+                cache.pop(self.id, None)
+            raise
+        if snap is None:
+            return cached
+        snap = _snapshot_from_wire(snap)
+        with self.cluster._lock:
+            cache[self.id] = snap
+            cache.move_to_end(self.id)
+            while len(cache) > SNAPSHOT_CACHE:
+                cache.popitem(last=False)
+        return snap
+
+
+class ClusterServer:
+    # The GameServer interface over every worker in `cluster_dir`. This
+    # worker's rooms live in `local`; lobby calls fan out to every worker.
+    def __init__(self, cluster_dir, worker_id, local=None, authkey=None):
+        self.cluster_dir = cluster_dir
+        self.worker_id = worker_id
+        os.makedirs(cluster_dir, exist_ok=True)
+        self.authkey = authkey if authkey is not None else cluster_key(cluster_dir)
+        self.local = local if local is not None else GameServer()
+        address = self._address(worker_id)
+        if os.path.exists(address):
+            os.unlink(address)  # Left behind by an earlier run of this worker
+        self.shard = ShardServer(self.local, address, self.authkey)
+
+        self._lock = threading.Lock()
+        self._peers = {}  # worker id -> _Peer
+        self._down = {}  # worker id -> when it last refused a connection
+        self._ring = HashRing([worker_id])
+        self._ring_read = 0.0
+        self._snapshots = OrderedDict()  # room id -> latest RoomSnapshot of a remote room
+        self._remote_version = ()  # (worker id, version) of the other workers
+        self._remote_version_read = -LOBBY_POLL  # When it was last asked for
+
+    def _address(self, worker_id):
+        return os.path.join(self.cluster_dir, f"{worker_id}.sock")
+
+    # --- Membership and routing ---
+
+    def ring(self, refresh=False):
+        # Hash ring of the live workers, from the cluster directory
+        now = time.monotonic()
+        with self._lock:
+            if not refresh and now - self._ring_read < MEMBERSHIP_TTL:
+                return self._ring
+            self._ring_read = now
+            workers = {name[:-len(".sock")] for name in os.listdir(self.cluster_dir) if name.endswith(".sock")}
+            workers = {worker for worker in workers
+                       if worker == self.worker_id or now - self._down.get(worker, -DOWN_TTL) >= DOWN_TTL}
+            workers.add(self.worker_id)
+            if set(self._ring.nodes) != workers:
+                self._ring = HashRing(workers)
+            return self._ring
+
+    def peers(self):
+        return [worker for worker in self.ring().nodes if worker != self.worker_id]
+
+    def _peer(self, worker_id):
+        with self._lock:
+            peer = self._peers.get(worker_id)
+            if peer is None:
+                peer = self._peers[worker_id] = _Peer(self._address(worker_id), self.authkey)
+            return peer
+
+    def _call(self, worker_id, room_id, method, *args, **kwargs):
+        # One call on another worker; a worker that cannot be reached is left
+        # out of the ring for DOWN_TTL
+        try:
+            return self._peer(worker_id).call(room_id, method, *args, **kwargs)
+        except (ConnectionError, FileNotFoundError, EOFError):
+            with self._lock:
+                self._down[worker_id] = time.monotonic()
+                self._ring_read = 0.0
+                peer = self._peers.pop(worker_id, None)
+            if peer is not None:
+                peer.close()
+            raise
+
+    def _fan_out(self, method, *args):
+        # (worker id, result) from every reachable worker, this one first
+        results = [(self.worker_id, self.shard._call(None, method, args, {}))]
+        for worker in self.peers():
+            try:
+                results.append((worker, self._call(worker, None, method, *args)))
+            except (ConnectionError, FileNotFoundError, EOFError):
+                continue
+        return results
+
+    def owner(self, room_id):
+        return self.ring().owner(room_id)
+
+    def _find(self, room_id):
+        # Worker holding the room: this one, its ring owner, or (after the
+        # ring changed) any other; a miss re-reads the membership once
+        if self.local.get_room(room_id) is not None:
+            return self.worker_id
+        for refresh in (False, True):
+            ring = self.ring(refresh)
+            owner = ring.owner(room_id)
+            for worker in [owner] + [node for node in ring.nodes if node != owner]:
+                if worker == self.worker_id:
+                    continue
+                try:
+                    if self._call(worker, None, 'has_room', room_id):
+                        return worker
+                except (ConnectionError, FileNotFoundError, EOFError):
+                    continue
+        return None
+
+    # --- GameServer interface ---
+
+    @property
+    def version(self):
+        # Sorted (worker id, version) pairs: differs whenever any worker's
+        # lobby changes, where a sum could have two changes cancel out. The
+        # others are asked at most once per LOBBY_POLL, however many sessions
+        # are waiting; until then their last versions stand.
+        now = time.monotonic()
+        with self._lock:
+            stale = now - self._remote_version_read >= LOBBY_POLL
+            if stale:
+                self._remote_version_read = now  # Concurrent readers keep the old versions meanwhile
+        if stale:
+            remote = []
+            for worker in self.peers():
+                try:
+                    remote.append((worker, self._call(worker, None, 'version')))
+                except (ConnectionError, FileNotFoundError, EOFError):
+                    continue
+            with self._lock:
+                self._remote_version = tuple(remote)
+        return tuple(sorted(((self.worker_id, self.local.version),) + self._remote_version))
+
+    def wait_for_change(self, version, timeout=None):
+        # Local changes wake the wait at once; other workers are polled
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            current = self.version
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if current != version or (remaining is not None and remaining <= 0):
+                return current
+            wait = LOBBY_POLL if remaining is None else min(LOBBY_POLL, remaining)
+            self.local.wait_for_change(self.local.version, timeout=wait)
+
+    def create_room(self, room_name, creator_name, size=15, time_control=None):
+        # Created here, under an id the ring assigns to this worker; None
+        # when the creator is in a room on any worker
+        if self.find_player(creator_name) is not None:
+            return None
+        ring = self.ring()
+        room_id = new_room_id()
+        for _ in range(REPLICAS * len(ring.nodes)):
+            if ring.owner(room_id) == self.worker_id:
+                break
+            room_id = new_room_id()
+        return self.local.create_room(room_name, creator_name, size=size, room_id=room_id, time_control=time_control)
+
+    def get_room(self, room_id):
+        room = self.local.get_room(room_id)
+        if room is not None:
+            return room
+        worker = self._find(room_id)
+        if worker is None:
+            return None
+        return RemoteRoom(self, self._peer(worker), room_id)
+
+    def find_player(self, player_name):
+        # The player's room on any worker: this one first
+        for worker, where in self._fan_out('find_player', player_name):
+            if where is not None:
+                return where
+        return None
+
+    def join_room(self, room_id, player_name):
+        # One room per player across the cluster. Each worker enforces it
+        # atomically for its own rooms; across workers the check below can
+        # race with a join elsewhere.
+        where = self.find_player(player_name)
+        if where is not None and where[0] != room_id:
+            return False, "You are already in another room; leave it first"
+        worker = self._find(room_id)
+        if worker == self.worker_id:
+            return self.local.join_room(room_id, player_name)
+        if worker is None:
+            return False, "Room no longer exists"
+        return self._call(worker, None, 'join_room', room_id, player_name)
+
+    def leave_room(self, room_id, player_name):
+        worker = self._find(room_id)
+        if worker == self.worker_id:
+            self.local.leave_room(room_id, player_name)
+        elif worker is not None:
+            self._call(worker, None, 'leave_room', room_id, player_name)
+
+    def count_rooms(self, status=None):
+        return sum(count for _, count in self._fan_out('count_rooms', status))
+
+    def list_rooms(self, status=None, page=0, page_size=20):
+        # Every worker's rooms, worker by worker (this one first). Only each
+        # worker's first `end` rooms can reach the page, so that is all any
+        # of them sends, with its count.
+        start = page * page_size
+        end = start + page_size
+        summaries = []
+        total = 0
+        for _, (rooms, count) in self._fan_out('lobby', status, end):
+            summaries.extend(rooms)
+            total += count
+        return summaries[start:end], total
+
+    def population(self):
+        # This worker's rooms only, so adding up the workers' gauges counts
+        # every room once
+        return self.local.population()
+
+    def start_reaper(self, interval=10):
+        self.local.start_reaper(interval)
+
+    def start_clocks(self):
+        self.local.start_clocks()
+
+    def close(self):
+        self.shard.close()
+        if os.path.exists(self.shard.address):
+            os.unlink(self.shard.address)
+        with self._lock:
+            peers, self._peers = list(self._peers.values()), {}
+        for peer in peers:
+            peer.close()
+        self.local.close()
@@ -0,0 +1,173 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import namedtuple
+
+# Game clocks: main time per side, then byo-yomi periods, with an optional
+# Fischer increment after every move. Times are in seconds.
+#
+# A room's GameClock only changes when the room does (a move, a pause, the
+# end of the game): it keeps what each side had when its turn began, so the
+# time left at any moment is one subtraction, and the moment the side to
+# move runs out is known in advance. Every running clock's deadline goes on
+# one ClockScheduler heap, checked by one thread that sleeps until the
+# earliest; moves push the new deadline and the old entry is skipped when it
+# comes up. Nothing polls the rooms: an idle tick is a look at the heap top,
+# whatever the number of games.
+
+# byoyomi: seconds per period once the main time is spent; a move within a
+# period keeps it, overrunning it uses it up, running out of periods loses
+TimeControl = namedtuple('TimeControl', ['main', 'byoyomi', 'periods', 'increment'], defaults=(0, 0, 0))
+
+# What renderers get (in RoomSnapshot.clock): main time and periods left for
+# (Black, White) when `turn`'s time started running at `started`; turn None
+# while stopped. flagged: the side that ran out of time, or None.
+ClockState = namedtuple('ClockState', ['control', 'main_left', 'periods_left', 'turn', 'started', 'flagged'])
+
+MAX_SLEEP = 1.0  # Seconds the scheduler thread sleeps at most, with no deadline due sooner
+
+
+def _spend(control, main, periods, elapsed):
+    # (main, periods, seconds left in the current period) after `elapsed`
+    if elapsed <= main:
+        return main - elapsed, periods, control.byoyomi
+    over = elapsed - main
+    if not control.byoyomi:
+        return 0.0, 0, 0.0
+    used = int(over // control.byoyomi)
+    if used >= periods:
+        return 0.0, 0, 0.0
+    return 0.0, periods - used, control.byoyomi - (over - used * control.byoyomi)
+
+
+def time_left(state, side, now=None):
+    # (main time, byo-yomi periods, seconds left in the current period) for
+    # side 1 or 2 at `now`, from a ClockState: no locks, nothing stored
+    main = state.main_left[side - 1]
+    periods = state.periods_left[side - 1]
+    if state.turn != side:
+        return main, periods, state.control.byoyomi
+    if now is None:
+        now = time.time()
+    return _spend(state.control, main, periods, now - state.started)
+
+
+class GameClock:
+    __slots__ = ('control', 'main_left', 'periods_left', 'turn', 'started', 'flagged')
+
+    def __init__(self, control):
+        self.control = control
+        self.main_left = [float(control.main), float(control.main)]  # Black, White
+        self.periods_left = [control.periods, control.periods]
+        self.turn = None  # Side whose time is running
+        self.started = 0.0
+        self.flagged = None
+
+    def deadline(self):
+        # When the running side runs out of time
+        side = self.turn - 1
+        return self.started + self.main_left[side] + self.control.byoyomi * self.periods_left[side]
+
+    def switch(self, side, now, moved=False):
+        # Charge the running side for its turn (plus the increment when it
+        # moved), then start `side`'s time (None: stop the clock)
+        if self.turn is not None:
+            mover = self.turn - 1
+            main, periods, _ = _spend(self.control, self.main_left[mover], self.periods_left[mover],
+                                      now - self.started)
+            self.main_left[mover] = main + (self.control.increment if moved else 0)
+            self.periods_left[mover] = periods
+        self.turn = side
+        self.started = now
+
+    def state(self):
+        return ClockState(self.control, tuple(self.main_left), tuple(self.periods_left),
+                          self.turn, self.started, self.flagged)
+
+
+class ClockScheduler:
+    # Deadlines of the running clocks of many rooms. Rooms report changes
+    # through schedule() (their lock held); tick() hands due rooms to
+    # Room.check_clock, which declares the timeout if it still stands.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._heap = []  # (deadline, seq, room)
+        self._due = {}  # room -> its current deadline; older heap entries are stale
+        self._seq = itertools.count()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {'scheduled': 0, 'stale': 0, 'timeouts': 0}
+
+    def schedule(self, room, deadline):
+        # Set or (deadline None) clear the room's deadline
+        with self.lock:
+            if deadline is None:
+                self._due.pop(room, None)
+                return
+            self._due[room] = deadline
+            heapq.heappush(self._heap, (deadline, next(self._seq), room))
+            self.stats['scheduled'] += 1
+            earliest = self._heap[0][0] == deadline
+            self._compact()
+        if earliest:
+            self._wake.set()
+
+    def _compact(self):
+        # Every move leaves a stale entry behind; rebuild the heap from the
+        # live deadlines once stale ones outnumber them
+        if len(self._heap) <= 2 * len(self._due) + 64:
+            return
+        self._heap = [(deadline, next(self._seq), room) for room, deadline in self._due.items()]
+        heapq.heapify(self._heap)
+
+    def next_deadline(self):
+        with self.lock:
+            return self._heap[0][0] if self._heap else None
+
+    def pending(self):
+        # Rooms with a running clock
+        return len(self._due)
+
+    def tick(self, now=None):
+        # Checks every room whose deadline has passed; returns how many timed out
+        if now is None:
+            now = time.time()
+        due = []
+        with self.lock:
+            heap = self._heap
+            while heap and heap[0][0] <= now:
+                deadline, _, room = heapq.heappop(heap)
+                if self._due.get(room) != deadline:
+                    self.stats['stale'] += 1
+                    continue
+                del self._due[room]
+                due.append(room)
+        flagged = sum(1 for room in due if room.check_clock(now))
+        self.stats['timeouts'] += flagged
+        return flagged
+
+    def start(self):
+        # Background daemon thread sleeping until the next deadline
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                deadline = self.next_deadline()
+                wait = MAX_SLEEP if deadline is None else min(MAX_SLEEP, max(0.0, deadline - time.time()))
+                self._wake.wait(wait)
+                self._wake.clear()
+                self.tick()
+
+        self._thread = threading.Thread(target=run, name="game-clocks", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,375 @@
+import mmap
+import os
+import struct
+import threading
+import numpy as np
+from game_clock import TimeControl
+from game_logic import DENSE_MAX_SIZE
+
+# Compact append-only journal of room events.
+#
+# Layout: MAGIC, then records of one opcode byte plus a payload. Records after
+# a SELECT apply to that room, so a move is two bytes (opcode + cell) unless
+# the room changes. Every `snapshot_every` events a room also gets a SNAPSHOT
+# record (2-bit packed board plus move list) so recovery never replays long
+# histories. On startup the journal is read through mmap and rewritten as one
+# CREATE + SNAPSHOT per live room.
+#
+# Board sizes are one byte, 0 for an unbounded board. Cells there are two
+# signed 16-bit coordinates, and snapshots of sparse games (larger than
+# DENSE_MAX_SIZE or unbounded) carry no packed board: it is rebuilt from the
+# moves.
+#
+# A timed room's TimeControl follows its CREATE, and timeouts are events like
+# moves. The time left on the clocks is not kept: after a restart, games in
+# progress start again from the full time.
+
+MAGIC = b'OMKJ\x01'
+
+EVENTS = ['create', 'select', 'remove', 'move', 'join', 'leave', 'ready',
+          'reset', 'swap', 'request', 'cancel', 'resolve', 'snapshot', 'ai', 'clock', 'timeout']
+OPS = {name: code for code, name in enumerate(EVENTS, 1)}
+REQUEST_TYPES = ['UNDO', 'SWAP']
+
+_U16 = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+_CELL_PAIR = struct.Struct('<hh')
+_NONE = 0xFFFF  # String length marker for None
+
+
+def _pack_str(value):
+    if value is None:
+        return _U16.pack(_NONE)
+    data = value.encode('utf-8')
+    return _U16.pack(len(data)) + data
+
+def _pack_time_control(control):
+    # u32 main time, byo-yomi (milliseconds), periods, increment (ms); all zero: untimed
+    main, byoyomi, periods, increment = control or TimeControl(0)
+    return b''.join(_U32.pack(value) for value in (round(main * 1000), round(byoyomi * 1000), periods,
+                                                      round(increment * 1000)))
+
+def _has_board(size):
+    return size is not None and size <= DENSE_MAX_SIZE
+
+def _pack_cell(row, col, size):
+    if size is None:
+        return _CELL_PAIR.pack(row, col)
+    cell = row * size + col
+    if size * size <= 256:
+        return bytes((cell,))
+    return _U16.pack(cell)
+
+def pack_board(board):
+    # Two bits per cell, four cells per byte
+    flat = np.asarray(board, dtype=np.uint8).ravel()
+    padded = np.zeros(-(-flat.size // 4) * 4, dtype=np.uint8)
+    padded[:flat.size] = flat
+    return (padded[0::4] | (padded[1::4] << 2) | (padded[2::4] << 4) | (padded[3::4] << 6)).tobytes()
+
+def unpack_board(data, size):
+    packed = np.frombuffer(data, dtype=np.uint8)
+    flat = np.empty(packed.size * 4, dtype=np.uint8)
+    for k in range(4):
+        flat[k::4] = (packed >> (2 * k)) & 3
+    return flat[:size * size].reshape(size, size)
+
+def encode_snapshot(room):
+    # Full room state; the caller holds room.lock
+    game = room.game
+    size = game.size
+    ready = (1 if room.ready_state[1] else 0) | (2 if room.ready_state[2] else 0)
+    out = bytearray((size or 0, game.winner or 0, game.current_turn, ready))
+    out += _pack_str(room.players[1])
+    out += _pack_str(room.players[2])
+    out += _U16.pack(len(room.spectators))
+    for name in room.spectators:
+        out += _pack_str(name)
+    pending = room.pending_request
+    if pending:
+        out.append(REQUEST_TYPES.index(pending['type']) + 1)
+        out += _pack_str(pending['requester'])
+    else:
+        out.append(0)
+    out += _U16.pack(len(game.history))
+    for row, col, _ in game.history:
+        out += _pack_cell(row, col, size)
+    if _has_board(size):
+        out += pack_board(game.board)
+    return bytes(out)
+
+
+class _Reader:
+    def __init__(self, data, offset):
+        self.data = data
+        self.offset = offset
+
+    def u8(self):
+        value = self.data[self.offset]
+        self.offset += 1
+        return value
+
+    def u16(self):
+        value = _U16.unpack_from(self.data, self.offset)[0]
+        self.offset += 2
+        return value
+
+    def u32(self):
+        value = _U32.unpack_from(self.data, self.offset)[0]
+        self.offset += 4
+        return value
+
+    def str(self):
+        length = self.u16()
+        if length == _NONE:
+            return None
+        end = self.offset + length
+        if end > len(self.data):
+            raise IndexError("truncated string")
+        value = bytes(self.data[self.offset:end]).decode('utf-8')
+        self.offset = end
+        return value
+
+    def cell(self, size):
+        if size is None:
+            row, col = _CELL_PAIR.unpack_from(self.data, self.offset)
+            self.offset += _CELL_PAIR.size
+            return row, col
+        cell = self.u8() if size * size <= 256 else self.u16()
+        return divmod(cell, size)
+
+    def raw(self, length):
+        end = self.offset + length
+        if end > len(self.data):
+            raise IndexError("truncated record")
+        value = bytes(self.data[self.offset:end])
+        self.offset = end
+        return value
+
+
+def _read_snapshot(reader):
+    size, winner, current_turn, ready = reader.u8() or None, reader.u8(), reader.u8(), reader.u8()
+    players = (reader.str(), reader.str())
+    spectators = [reader.str() for _ in range(reader.u16())]
+    req_type = reader.u8()
+    pending = None
+    if req_type:
+        pending = {'type': REQUEST_TYPES[req_type - 1], 'requester': reader.str()}
+    history = []
+    player = 1
+    for _ in range(reader.u16()):
+        row, col = reader.cell(size)
+        history.append((row, col, player))
+        player = 3 - player
+    board = unpack_board(reader.raw(-(-size * size // 4)), size) if _has_board(size) else None
+    return {
+        'players': players,
+        'spectators': spectators,
+        'ready_state': (bool(ready & 1), bool(ready & 2)),
+        'pending_request': pending,
+        'board': board,
+        'history': history,
+        'winner': winner or None,
+        'current_turn': current_turn,
+    }
+
+def read_journal(path):
+    # Yields (event, room_id, args) for every complete record. A torn record at
+    # the end (crash mid-write) ends the iteration.
+    if not os.path.exists(path) or os.path.getsize(path) <= len(MAGIC):
+        return
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a game journal")
+
+        reader = _Reader(data, len(MAGIC))
+        room_ids = {}  # handle -> room id
+        sizes = {}  # handle -> board size
+        current = None
+        end = len(data)
+        while reader.offset < end:
+            start = reader.offset
+            try:
+                event = EVENTS[reader.u8() - 1]
+                if event == 'create':
+                    handle = reader.u32()
+                    room_id, name, creator = reader.str(), reader.str(), reader.str()
+                    room_ids[handle] = room_id
+                    sizes[handle] = reader.u8() or None
+                    current = handle
+                    record = (event, room_id, (name, creator, sizes[handle]))
+                elif event == 'select':
+                    current = reader.u32()
+                    continue
+                elif event == 'move':
+                    record = (event, room_ids[current], reader.cell(sizes[current]))
+                elif event in ('join', 'leave'):
+                    record = (event, room_ids[current], (reader.str(),))
+                elif event in ('ready', 'ai', 'timeout'):
+                    record = (event, room_ids[current], (reader.u8(),))
+                elif event == 'clock':
+                    control = TimeControl(reader.u32() / 1000, reader.u32() / 1000, reader.u32(), reader.u32() / 1000)
+                    record = (event, room_ids[current], (control if control.main or control.byoyomi else None,))
+                elif event == 'request':
+                    req_type = REQUEST_TYPES[reader.u8() - 1]
+                    record = (event, room_ids[current], (reader.str(), req_type))
+                elif event == 'resolve':
+                    record = (event, room_ids[current], (bool(reader.u8()),))
+                elif event == 'snapshot':
+                    record = (event, room_ids[current], (_read_snapshot(reader),))
+                else:  # remove, reset, swap, cancel
+                    record = (event, room_ids[current], ())
+            except (IndexError, struct.error):
+                reader.offset = start
+                break
+            yield record
+
+
+class GameJournal:
+    def __init__(self, path, flush_interval=0.05, snapshot_every=64, fsync=False):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self._lock = threading.Lock()  # Guards the buffer and handle state
+        self._write_lock = threading.Lock()  # Keeps flushes in order
+        self._buffer = bytearray()
+        self._handles = {}  # room_id -> handle
+        self._sizes = {}  # handle -> board size
+        self._since_snapshot = {}  # handle -> events since the last snapshot
+        self._next_handle = 0
+        self._current = None
+        self._file = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def rewrite(self, rooms):
+        # Replace the journal with one CREATE + SNAPSHOT per room (compaction).
+        # Startup only, before the rooms are journaled or shared: it does not
+        # take room locks.
+        with self._write_lock, self._lock:
+            if self._file is not None:
+                self._file.close()
+            self._buffer = bytearray(MAGIC)
+            self._handles = {}
+            self._sizes = {}
+            self._since_snapshot = {}
+            self._next_handle = 0
+            self._current = None
+            for room in rooms:
+                self._encode(room, 'create', (room.players[1],))
+                self._encode(room, 'snapshot', ())
+
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(self._buffer)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._buffer = bytearray()
+            self._file = open(self.path, 'ab')
+
+    def record(self, room, event, args=()):
+        # Called from room mutators (room lock held): only encodes into memory,
+        # the writer thread does the I/O
+        with self._lock:
+            self._encode(room, event, args)
+            if len(self._buffer) >= 64 * 1024:
+                self._wake.set()
+
+    def _encode(self, room, event, args):
+        buf = self._buffer
+        if event == 'create':
+            handle = self._next_handle
+            self._next_handle += 1
+            self._handles[room.id] = handle
+            self._sizes[handle] = room.game.size
+            self._since_snapshot[handle] = 0
+            self._current = handle
+            buf.append(OPS['create'])
+            buf += _U32.pack(handle)
+            buf += _pack_str(room.id) + _pack_str(room.name) + _pack_str(args[0])
+            buf.append(room.game.size or 0)
+            if room.clock is not None:
+                # Created with a clock: set it before anything else replays
+                buf.append(OPS['clock'])
+                buf += _pack_time_control(room.clock.control)
+            return
+
+        handle = self._handles.get(room.id)
+        if handle is None:
+            return
+        if handle != self._current:
+            buf.append(OPS['select'])
+            buf += _U32.pack(handle)
+            self._current = handle
+
+        buf.append(OPS[event])
+        if event == 'move':
+            buf += _pack_cell(args[0], args[1], self._sizes[handle])
+        elif event in ('join', 'leave'):
+            buf += _pack_str(args[0])
+        elif event in ('ready', 'ai', 'timeout'):
+            buf.append(args[0])
+        elif event == 'clock':
+            buf += _pack_time_control(args[0])
+        elif event == 'request':
+            buf.append(REQUEST_TYPES.index(args[1]) + 1)
+            buf += _pack_str(args[0])
+        elif event == 'resolve':
+            buf.append(1 if args[0] else 0)
+        elif event == 'snapshot':
+            buf += encode_snapshot(room)
+            self._since_snapshot[handle] = 0
+            return
+
+        if event == 'remove':
+            del self._handles[room.id]
+            del self._since_snapshot[handle]
+            return
+
+        self._since_snapshot[handle] += 1
+        if self._since_snapshot[handle] >= self.snapshot_every:
+            buf.append(OPS['snapshot'])
+            buf += encode_snapshot(room)
+            self._since_snapshot[handle] = 0
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                data = self._buffer
+                self._buffer = bytearray()
+            if not data or self._file is None:
+                return
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def start(self):
+        # Background writer: flushes every flush_interval, or sooner on a full buffer
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                self.flush()
+
+        self._thread = threading.Thread(target=run, name="game-journal", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        with self._write_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
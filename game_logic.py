@@ -1,131 +1,1057 @@
+from array import array
+
 import numpy as np
+from renju import (CENTER, DIGITS, FIVE, LINE_FOURS, LINE_KIND, OFF_BOARD, OVERLINE, SIDE_WEIGHTS, THREE,
+                   WEIGHTS, WINDOW, window_codes)
 
-class OmokGame:
-    def __init__(self, size=15):
-        self.size = size
-        self.board = np.zeros((size, size), dtype=int)
-        self.history = []
-        self.winner = None
-        self.current_turn = 1  # 1: Black, 2: White
+DIRECTIONS = [
+    (0, 1),   # Horizontal
+    (1, 0),   # Vertical
+    (1, 1),   # Diagonal \
+    (1, -1)   # Diagonal /
+]
 
-    def place_stone(self, row, col):
-        if self.winner is not None:
-            return False, "Game already finished"
-        
-        if not (0 <= row < self.size and 0 <= col < self.size):
-            return False, "Invalid position"
-            
-        if self.board[row, col] != 0:
-            return False, "Position already taken"
-            
-        # Check 3-3 Forbidden Move for Black (Player 1)
-        if self.current_turn == 1:
-            if self.check_forbidden_33(row, col):
-                return False, "🚫 Forbidden Move (3-3)"
-            
-        self.board[row, col] = self.current_turn
-        self.history.append((row, col, self.current_turn))
-        
-        if self.check_winner(row, col):
-            self.winner = self.current_turn
-        else:
-            self.current_turn = 3 - self.current_turn  # Switch 1 <-> 2
-            
-        return True, "Stone placed"
+
+class RuleEngine:
+    # Base for the rule engines behind OmokGame. Engines that keep their own
+    # state override reset/place/remove; the defaults read game.board.
+    __slots__ = ('game',)
+
+    def __init__(self, game):
+        self.game = game
+
+    def reset(self):
+        pass
+
+    def place(self, row, col, player):
+        pass
+
+    def remove(self, row, col, player):
+        pass
+
+    def load(self):
+        # Rebuild from game.history after OmokGame.load; by
+        # default the stones are placed again one by one
+        self.reset()
+        for row, col, player in self.game.history:
+            self.place(row, col, player)
+
+    def forbidden_reason(self, row, col):
+        # Why Black may not play (row, col), or None
+        return '3-3' if self.check_forbidden_33(row, col) else None
+
+    def forbidden_mask(self):
+        # Black's forbidden empty cells for the whole board, in one batched pass
+        board = self.game.board
+        size = self.game.size
+        empty = board == 0
+
+        # Pad by 3 so every shifted view below stays in range; the padding
+        # is neither black nor empty, just like cells off the board
+        pad = 3
+        black = np.zeros((size + 2 * pad, size + 2 * pad), dtype=bool)
+        space = np.zeros_like(black)
+        black[pad:pad + size, pad:pad + size] = board == 1
+        space[pad:pad + size, pad:pad + size] = empty
+
+        three_count = np.zeros((size, size), dtype=np.int8)
+        for dr, dc in DIRECTIONS:
+            def at(grid, k):
+                r0 = pad + k * dr
+                c0 = pad + k * dc
+                return grid[r0:r0 + size, c0:c0 + size]
+
+            # The probe cell is stone 1, 2 or 3 of an exact 0 1 1 1 0
+            three = (at(space, -1) & at(black, 1) & at(black, 2) & at(space, 3))
+            three |= (at(space, -2) & at(black, -1) & at(black, 1) & at(space, 2))
+            three |= (at(space, -3) & at(black, -2) & at(black, -1) & at(space, 1))
+            three_count += three
+
+        return empty & (three_count >= 2)
+
+
+class ArrayEngine(RuleEngine):
+    # Rule checks that walk game.board cell by cell
+    __slots__ = ()
 
     def check_winner(self, last_r, last_c):
-        player = self.board[last_r, last_c]
-        directions = [
-            (0, 1),   # Horizontal
-            (1, 0),   # Vertical
-            (1, 1),   # Diagonal \
-            (1, -1)   # Diagonal /
-        ]
-        
-        for dr, dc in directions:
+        board = self.game.board
+        size = self.game.size
+        player = board[last_r, last_c]
+
+        for dr, dc in DIRECTIONS:
             count = 1
             # Check forward
             r, c = last_r + dr, last_c + dc
-            while 0 <= r < self.size and 0 <= c < self.size and self.board[r, c] == player:
+            while 0 <= r < size and 0 <= c < size and board[r, c] == player:
                 count += 1
                 r += dr
                 c += dc
-            
+
             # Check backward
             r, c = last_r - dr, last_c - dc
-            while 0 <= r < self.size and 0 <= c < self.size and self.board[r, c] == player:
+            while 0 <= r < size and 0 <= c < size and board[r, c] == player:
                 count += 1
                 r -= dr
                 c -= dc
-                
+
             if count >= 5:
                 return True
-                
+
         return False
-        
-    def undo_move(self):
-        if not self.history:
-            return False, "No moves to undo"
-            
-        last_row, last_col, player = self.history.pop()
-        self.board[last_row, last_col] = 0
-        self.current_turn = player # Revert turn to the player who made the move
-        self.winner = None # Reset winner state if we undo a winning move
-        return True, "Last move undone"
 
     def check_forbidden_33(self, row, col):
-        # Simulate placing the stone
-        self.board[row, col] = 1
+        # is_open_three never reads (row, col) itself, so the stone is
+        # simulated without writing it onto the shared board
         open_three_count = 0
-        
-        directions = [
-            (0, 1),   # Horizontal
-            (1, 0),   # Vertical
-            (1, 1),   # Diagonal \
-            (1, -1)   # Diagonal /
-        ]
-        
-        for dr, dc in directions:
+
+        for dr, dc in DIRECTIONS:
             if self.is_open_three(row, col, dr, dc):
                 open_three_count += 1
-                
-        # Undo simulation
-        self.board[row, col] = 0
-        
+
         return open_three_count >= 2
 
     def is_open_three(self, r, c, dr, dc):
         # Check for pattern 0 1 1 1 0 involving the new stone at (r,c)
         # We need to find the continuous line of stones including (r,c)
-        
+        board = self.game.board
+        size = self.game.size
+
         count = 1
         # Forward
         fr, fc = r + dr, c + dc
-        while 0 <= fr < self.size and 0 <= fc < self.size and self.board[fr, fc] == 1:
+        while 0 <= fr < size and 0 <= fc < size and board[fr, fc] == 1:
             count += 1
             fr += dr
             fc += dc
-            
+
         # Backward
         br, bc = r - dr, c - dc
-        while 0 <= br < self.size and 0 <= bc < self.size and self.board[br, bc] == 1:
+        while 0 <= br < size and 0 <= bc < size and board[br, bc] == 1:
             count += 1
             br -= dr
             bc -= dc
-            
+
         # Strictly open 3 means count == 3 AND both ends are empty (0)
         # Ends are at (fr, fc) and (br, bc)
         if count == 3:
             # Check bounds for ends
-            valid_f = (0 <= fr < self.size and 0 <= fc < self.size and self.board[fr, fc] == 0)
-            valid_b = (0 <= br < self.size and 0 <= bc < self.size and self.board[br, bc] == 0)
+            valid_f = (0 <= fr < size and 0 <= fc < size and board[fr, fc] == 0)
+            valid_b = (0 <= br < size and 0 <= bc < size and board[br, bc] == 0)
             if valid_f and valid_b:
                 return True
-                
+
+        return False
+
+
+_bitboard_tables = {}
+
+def _get_bitboard_tables(size):
+    # Shared per board size: shift amounts, on-board mask and, for every cell,
+    # the start bits of the 5-runs and 3-runs that could contain it.
+    if size in _bitboard_tables:
+        return _bitboard_tables[size]
+
+    stride = size + 1  # One empty sentinel column stops shifts from wrapping rows
+    shifts = [dr * stride + dc for dr, dc in DIRECTIONS]
+
+    full = 0
+    for r in range(size):
+        for c in range(size):
+            full |= 1 << (r * stride + c)
+
+    five_windows = []
+    three_windows = []
+    for pos in range(size * stride):
+        fives = []
+        threes = []
+        for shift in shifts:
+            fives.append(_window_mask(pos, shift, 5, full))
+            threes.append(_window_mask(pos, shift, 3, full))
+        five_windows.append(fives)
+        three_windows.append(threes)
+
+    tables = (stride, shifts, full, five_windows, three_windows)
+    _bitboard_tables[size] = tables
+    return tables
+
+def _window_mask(pos, shift, length, full):
+    mask = 0
+    for k in range(length):
+        start = pos - k * shift
+        if start >= 0:
+            mask |= 1 << start
+    return mask & full
+
+
+class BitboardEngine(RuleEngine):
+    # Each player's stones are kept as one Python int, bit r * (size + 1) + c.
+    # Runs are found with shift-and-mask instead of walking the board.
+    __slots__ = ('stride', 'shifts', 'full', 'five_windows', 'three_windows', 'stones')
+
+    def __init__(self, game):
+        super().__init__(game)
+        self.stride, self.shifts, self.full, self.five_windows, self.three_windows = \
+            _get_bitboard_tables(game.size)
+        self.reset()
+
+    def reset(self):
+        self.stones = {1: 0, 2: 0}
+
+    def place(self, row, col, player):
+        self.stones[player] |= 1 << (row * self.stride + col)
+
+    def remove(self, row, col, player):
+        self.stones[player] &= ~(1 << (row * self.stride + col))
+
+    def check_winner(self, last_r, last_c):
+        pos = last_r * self.stride + last_c
+        bit = 1 << pos
+        if self.stones[1] & bit:
+            b = self.stones[1]
+        elif self.stones[2] & bit:
+            b = self.stones[2]
+        else:
+            return False
+
+        windows = self.five_windows[pos]
+        for i, d in enumerate(self.shifts):
+            # Bit s survives when s, s+d, ..., s+4d are all set
+            fives = b & (b >> d) & (b >> 2 * d) & (b >> 3 * d) & (b >> 4 * d)
+            if fives & windows[i]:
+                return True
         return False
 
+    def check_forbidden_33(self, row, col):
+        pos = row * self.stride + col
+        bit = 1 << pos
+        black = self.stones[1] | bit
+        empty = self.full & ~(black | self.stones[2])
+
+        open_three_count = 0
+        windows = self.three_windows[pos]
+        for i, d in enumerate(self.shifts):
+            if self._open_threes(black, empty, d) & windows[i]:
+                open_three_count += 1
+        return open_three_count >= 2
+
+    def is_open_three(self, r, c, dr, dc):
+        pos = r * self.stride + c
+        black = self.stones[1] | (1 << pos)
+        empty = self.full & ~(black | self.stones[2])
+        i = DIRECTIONS.index((dr, dc))
+        return bool(self._open_threes(black, empty, self.shifts[i]) & self.three_windows[pos][i])
+
+    def _open_threes(self, black, empty, d):
+        # Start bits of 0 1 1 1 0: three stones at s..s+2d, empty at s-d and s+3d
+        return black & (black >> d) & (black >> 2 * d) & (empty << d) & (empty >> 3 * d)
+
+
+_empty_cells = {}
+
+def _get_empty_cells(size):
+    # One all-zero list per board size, read by every game without stones
+    if size not in _empty_cells:
+        _empty_cells[size] = [0] * (size * size)
+    return _empty_cells[size]
+
+
+_neighbor_tables = {}
+
+def _get_neighbor_tables(size):
+    # Flat index of the next/previous cell in each direction, -1 off the board
+    if size in _neighbor_tables:
+        return _neighbor_tables[size]
+
+    nxt = []
+    prv = []
+    for dr, dc in DIRECTIONS:
+        fwd = []
+        back = []
+        for r in range(size):
+            for c in range(size):
+                fr, fc = r + dr, c + dc
+                br, bc = r - dr, c - dc
+                fwd.append(fr * size + fc if 0 <= fr < size and 0 <= fc < size else -1)
+                back.append(br * size + bc if 0 <= br < size and 0 <= bc < size else -1)
+        nxt.append(fwd)
+        prv.append(back)
+
+    _neighbor_tables[size] = (nxt, prv)
+    return nxt, prv
+
+
+class LineIndexEngine(RuleEngine):
+    # Incremental per-line pattern index. For every stone and direction we keep
+    # the length of the run it belongs to and its offset from the run's start.
+    # place/remove patch one run per direction, and the rule checks read the
+    # neighbouring runs instead of rescanning the board. A fresh or reset game
+    # reads the shared empty-board lists and takes its own copies on the first
+    # stone, so idle games cost no per-cell state at all.
+    __slots__ = ('size', 'nxt', 'prv', 'cells', 'run_len', 'run_head', '_shared')
+
+    def __init__(self, game):
+        super().__init__(game)
+        self.size = game.size
+        self.nxt, self.prv = _get_neighbor_tables(game.size)
+        self.reset()
+
+    def reset(self):
+        # The shared lists are never written: place() unshares them first
+        zeros = _get_empty_cells(self.size)
+        self.cells = zeros
+        self.run_len = [zeros] * len(DIRECTIONS)
+        self.run_head = [zeros] * len(DIRECTIONS)
+        self._shared = True
+
+    def _unshare(self):
+        self.cells = list(self.cells)
+        self.run_len = [list(run_len) for run_len in self.run_len]
+        self.run_head = [list(run_head) for run_head in self.run_head]
+        self._shared = False
+
+    def place(self, row, col, player):
+        if self._shared:
+            self._unshare()
+        pos = row * self.size + col
+        cells = self.cells
+        cells[pos] = player
+
+        for k in range(len(DIRECTIONS)):
+            run_len = self.run_len[k]
+            run_head = self.run_head[k]
+            nxt = self.nxt[k]
+            prv = self.prv[k]
+
+            q = prv[pos]
+            left = run_len[q] if q >= 0 and cells[q] == player else 0
+            q = nxt[pos]
+            right = run_len[q] if q >= 0 and cells[q] == player else 0
+            length = left + 1 + right
+
+            # Walk back to the start of the merged run and relabel it
+            start = pos
+            for _ in range(left):
+                start = prv[start]
+            q = start
+            for i in range(length):
+                run_len[q] = length
+                run_head[q] = i
+                q = nxt[q]
+
+    def load(self):
+        # Every run labelled once from its first stone, rather than merged
+        # stone by stone
+        self.reset()
+        history = self.game.history
+        if not history:
+            return
+        area = self.size * self.size
+        cells = [0] * area
+        stones = []
+        for row, col, player in history:
+            pos = row * self.size + col
+            cells[pos] = player
+            stones.append(pos)
+        self.cells = cells
+        self.run_len = [[0] * area for _ in DIRECTIONS]
+        self.run_head = [[0] * area for _ in DIRECTIONS]
+        self._shared = False
+
+        for k in range(len(DIRECTIONS)):
+            run_len = self.run_len[k]
+            run_head = self.run_head[k]
+            nxt = self.nxt[k]
+            prv = self.prv[k]
+            for pos in stones:
+                player = cells[pos]
+                q = prv[pos]
+                if q >= 0 and cells[q] == player:
+                    continue  # Labelled from the run's first stone
+                length = 1
+                q = nxt[pos]
+                while q >= 0 and cells[q] == player:
+                    length += 1
+                    q = nxt[q]
+                q = pos
+                for i in range(length):
+                    run_len[q] = length
+                    run_head[q] = i
+                    q = nxt[q]
+
+    def remove(self, row, col, player):
+        pos = row * self.size + col
+        self.cells[pos] = 0
+
+        for k in range(len(DIRECTIONS)):
+            run_len = self.run_len[k]
+            run_head = self.run_head[k]
+            nxt = self.nxt[k]
+            prv = self.prv[k]
+
+            left = run_head[pos]
+            right = run_len[pos] - left - 1
+            run_len[pos] = 0
+            run_head[pos] = 0
+
+            # Split the run: the part before keeps its heads, the part after restarts at 0
+            q = prv[pos]
+            for _ in range(left):
+                run_len[q] = left
+                q = prv[q]
+            q = nxt[pos]
+            for i in range(right):
+                run_len[q] = right
+                run_head[q] = i
+                q = nxt[q]
+
+    def check_winner(self, last_r, last_c):
+        pos = last_r * self.size + last_c
+        if self.cells[pos] == 0:
+            return False
+        for run_len in self.run_len:
+            if run_len[pos] >= 5:
+                return True
+        return False
+
+    def check_forbidden_33(self, row, col):
+        open_three_count = 0
+        for k, (dr, dc) in enumerate(DIRECTIONS):
+            if self._is_open_three(row, col, k, dr, dc):
+                open_three_count += 1
+        return open_three_count >= 2
+
+    def is_open_three(self, r, c, dr, dc):
+        return self._is_open_three(r, c, DIRECTIONS.index((dr, dc)), dr, dc)
+
+    def _is_open_three(self, r, c, k, dr, dc):
+        # Black run through (r, c) as if a black stone stood there
+        pos = r * self.size + c
+        cells = self.cells
+        run_len = self.run_len[k]
+
+        if cells[pos] == 1:
+            left = self.run_head[k][pos]
+            right = run_len[pos] - left - 1
+        else:
+            q = self.prv[k][pos]
+            left = run_len[q] if q >= 0 and cells[q] == 1 else 0
+            q = self.nxt[k][pos]
+            right = run_len[q] if q >= 0 and cells[q] == 1 else 0
+
+        if left + 1 + right != 3:
+            return False
+
+        # Both ends must be on the board and empty
+        size = self.size
+        br, bc = r - (left + 1) * dr, c - (left + 1) * dc
+        fr, fc = r + (right + 1) * dr, c + (right + 1) * dc
+        valid_b = (0 <= br < size and 0 <= bc < size and cells[br * size + bc] == 0)
+        valid_f = (0 <= fr < size and 0 <= fc < size and cells[fr * size + fc] == 0)
+        return valid_b and valid_f
+
+
+_pattern_tables = {}
+
+def _get_pattern_tables(size):
+    # For every cell q and direction k: (cell, own digit * weight, opponent
+    # digit * weight) for each cell whose 11-cell window contains q, and for
+    # every cell the code its window starts from (off-board cells blocked)
+    if size in _pattern_tables:
+        return _pattern_tables[size]
+
+    own, other, off = DIGITS[0][1], DIGITS[0][2], DIGITS[0][OFF_BOARD]
+
+    affected = [[[] for _ in DIRECTIONS] for _ in range(size * size)]
+    base = []
+    for k, (dr, dc) in enumerate(DIRECTIONS):
+        codes = []
+        for r in range(size):
+            for c in range(size):
+                code = 0
+                for i in range(WINDOW):
+                    qr = r + (i - CENTER) * dr
+                    qc = c + (i - CENTER) * dc
+                    if 0 <= qr < size and 0 <= qc < size:
+                        affected[qr * size + qc][k].append((r * size + c, own * WEIGHTS[i], other * WEIGHTS[i]))
+                    else:
+                        code += off * WEIGHTS[i]
+                codes.append(code)
+        base.append(codes)
+
+    _pattern_tables[size] = (affected, base)
+    return affected, base
+
+
+# Python lists: indexing them with ints is much cheaper than NumPy scalars
+_LINE_KIND = LINE_KIND.tolist()
+_LINE_FOURS = LINE_FOURS.tolist()
+_CENTER_WEIGHT = WEIGHTS[CENTER]
+
+_window_cells = {}
+
+def _get_window_cells(size):
+    # Board cell at each window position, for every direction and cell:
+    # (directions * cells, WINDOW) indexes, size * size for off the board
+    if size not in _window_cells:
+        offsets = np.arange(WINDOW) - CENTER
+        rows, cols = np.divmod(np.arange(size * size), size)
+        index = []
+        for dr, dc in DIRECTIONS:
+            r = rows[:, None] + offsets * dr
+            c = cols[:, None] + offsets * dc
+            index.append(np.where((r >= 0) & (r < size) & (c >= 0) & (c < size), r * size + c, size * size))
+        _window_cells[size] = np.concatenate(index)
+    return _window_cells[size]
+
+def _board_codes(cells, size):
+    # RenjuEngine.codes for a board of flat cell values, in one pass: (2,
+    # directions, cells) window codes from Black's and from White's view
+    windows = np.append(cells, OFF_BOARD)[_get_window_cells(size)]
+    return window_codes(windows, [[1], [2]]).reshape(2, len(DIRECTIONS), len(cells))
+
+
+def _renju_reason(codes):
+    # Why a black stone with these four window codes is forbidden, or None
+    kinds = []
+    fours = 0
+    for code in codes:
+        kinds.append(_LINE_KIND[code])
+        fours += _LINE_FOURS[code]
+    if FIVE in kinds:
+        return None  # Making five wins, whatever else it makes
+    if OVERLINE in kinds:
+        return 'overline'
+    if fours >= 2:
+        return '4-4'
+    if kinds.count(THREE) >= 2:
+        return '3-3'
+    return None
+
+
+class RenjuEngine(LineIndexEngine):
+    # Full Renju rules from precomputed line-pattern tables (renju.py).
+    # Every cell keeps the base-3 code of its 11-cell window in each direction,
+    # once from Black's view and once from White's, patched on place/remove.
+    # Black wins with exactly five and may not play overlines, 4-4 or 3-3
+    # (broken threes included); White wins with five or more.
+    __slots__ = ('affected', 'base_codes', 'codes')
+
+    def __init__(self, game):
+        self.affected, self.base_codes = _get_pattern_tables(game.size)
+        super().__init__(game)
+
+    def reset(self):
+        super().reset()
+        # codes[player][k][cell]: window code with `player` as the own colour.
+        # Shared base codes until the first stone, like the runs.
+        self.codes = {1: self.base_codes, 2: self.base_codes}
+
+    def _unshare(self):
+        super()._unshare()
+        self.codes = {
+            1: [list(codes) for codes in self.base_codes],
+            2: [list(codes) for codes in self.base_codes],
+        }
+
+    def place(self, row, col, player):
+        super().place(row, col, player)
+        self._update(row * self.size + col, player, 1)
+
+    def remove(self, row, col, player):
+        super().remove(row, col, player)
+        self._update(row * self.size + col, player, -1)
+
+    def load(self):
+        super().load()
+        if not self._shared:
+            black, white = _board_codes(np.array(self.cells, dtype=np.int8), self.size).tolist()
+            self.codes = {1: black, 2: white}
+
+    def _update(self, pos, player, sign):
+        # Digit 1 in the player's codes, 2 in the opponent's; the weights are
+        # precomputed and the loops split by sign, this being the hot path
+        for own_k, other_k, cells in zip(self.codes[player], self.codes[3 - player], self.affected[pos]):
+            if sign > 0:
+                for p, weight, double in cells:
+                    own_k[p] += weight
+                    other_k[p] += double
+            else:
+                for p, weight, double in cells:
+                    own_k[p] -= weight
+                    other_k[p] -= double
+
+    def check_winner(self, last_r, last_c):
+        pos = last_r * self.size + last_c
+        player = self.cells[pos]
+        if player == 0:
+            return False
+        for codes in self.codes[player]:
+            kind = _LINE_KIND[codes[pos]]
+            if kind == FIVE or (kind == OVERLINE and player == 2):
+                return True
+        return False
+
+    def _black_lines(self, row, col):
+        # Codes for a black stone at (row, col), whether or not it is there yet
+        pos = row * self.size + col
+        extra = _CENTER_WEIGHT if self.cells[pos] == 0 else 0
+        return [codes[pos] + extra for codes in self.codes[1]]
+
+    def forbidden_reason(self, row, col):
+        return _renju_reason(self._black_lines(row, col))
+
+    def check_forbidden_33(self, row, col):
+        kinds = [_LINE_KIND[code] for code in self._black_lines(row, col)]
+        return FIVE not in kinds and kinds.count(THREE) >= 2
+
+    def is_open_three(self, r, c, dr, dc):
+        code = self._black_lines(r, c)[DIRECTIONS.index((dr, dc))]
+        return _LINE_KIND[code] == THREE
+
+    def forbidden_mask(self):
+        size = self.size
+        empty = np.array(self.cells, dtype=np.int8) == 0
+        codes = np.array(self.codes[1], dtype=np.int32)
+        codes = np.where(empty, codes + _CENTER_WEIGHT, 0)
+        kinds = LINE_KIND[codes]
+        fours = LINE_FOURS[codes].sum(axis=0)
+        threes = (kinds == THREE).sum(axis=0)
+        five = (kinds == FIVE).any(axis=0)
+        overline = (kinds == OVERLINE).any(axis=0)
+        forbidden = empty & ~five & (overline | (fours >= 2) | (threes >= 2))
+        return forbidden.reshape(size, size)
+
+
+ENGINES = {
+    'array': ArrayEngine,
+    'bitboard': BitboardEngine,
+    'index': LineIndexEngine,
+    'renju': RenjuEngine,
+}
+
+
+def _pack_move(row, col, player):
+    return row << 16 | col << 2 | player
+
+def _unpack_move(move):
+    return move >> 16, move >> 2 & 0x3FFF, move & 3
+
+
+class MoveHistory:
+    # The moves of a game as (row, col, player) tuples, packed into one uint32
+    # each (four bytes a move instead of a tuple). Reads like the list of
+    # tuples it replaces: len, indexing, slicing, iteration, append, pop.
+    __slots__ = ('_moves',)
+
+    def __init__(self, moves=()):
+        self._moves = array('I', [_pack_move(*move) for move in moves])
+
+    def __len__(self):
+        return len(self._moves)
+
+    def __iter__(self):
+        return map(_unpack_move, self._moves)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [_unpack_move(move) for move in self._moves[index]]
+        return _unpack_move(self._moves[index])
+
+    def __eq__(self, other):
+        if isinstance(other, MoveHistory):
+            return self._moves == other._moves
+        if isinstance(other, (list, tuple)):
+            return list(self) == [tuple(move) for move in other]
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"MoveHistory({list(self)!r})"
+
+    def append(self, move):
+        self._moves.append(_pack_move(*move))
+
+    def pop(self):
+        return _unpack_move(self._moves.pop())
+
+    def copy(self):
+        history = MoveHistory()
+        history._moves = self._moves[:]
+        return history
+
+
+class OmokGame:
+    __slots__ = ('size', 'board', 'history', 'winner', 'current_turn', '_engine', '_engine_stale', '_move_masks')
+
+    def __init__(self, size=15, engine='renju'):
+        self.size = size
+        self.board = np.zeros((size, size), dtype=np.int8)
+        self.history = MoveHistory()
+        self.winner = None
+        self.current_turn = 1  # 1: Black, 2: White
+        self._engine = ENGINES[engine](self)
+        self._engine_stale = False  # Set by load() until the engine is rebuilt
+        self._move_masks = None  # (move number, winner, legal, forbidden)
+
+    @property
+    def engine(self):
+        # The rule engine, rebuilt from the board on first use after load():
+        # restoring many rooms costs nothing for the ones nobody plays in
+        if self._engine_stale:
+            self._engine_stale = False
+            self._engine.load()
+        return self._engine
+
+    def place_stone(self, row, col):
+        if self.winner is not None:
+            return False, "Game already finished"
+
+        if not (0 <= row < self.size and 0 <= col < self.size):
+            return False, "Invalid position"
+
+        if self.board[row, col] != 0:
+            return False, "Position already taken"
+
+        engine = self.engine  # Rebuilt after load() before the history changes
+
+        # Check Forbidden Moves for Black (Player 1)
+        if self.current_turn == 1:
+            reason = engine.forbidden_reason(row, col)
+            if reason:
+                return False, f"🚫 Forbidden Move ({reason})"
+
+        self.board[row, col] = self.current_turn
+        self.history.append((row, col, self.current_turn))
+        engine.place(row, col, self.current_turn)
+
+        if self.check_winner(row, col):
+            self.winner = self.current_turn
+        else:
+            self.current_turn = 3 - self.current_turn  # Switch 1 <-> 2
+
+        return True, "Stone placed"
+
+    def check_winner(self, last_r, last_c):
+        return self.engine.check_winner(last_r, last_c)
+
+    def undo_move(self):
+        if not self.history:
+            return False, "No moves to undo"
+
+        engine = self.engine
+        last_row, last_col, player = self.history.pop()
+        self.board[last_row, last_col] = 0
+        engine.remove(last_row, last_col, player)
+        self.current_turn = player # Revert turn to the player who made the move
+        self.winner = None # Reset winner state if we undo a winning move
+        self._move_masks = None # Same move number, different position
+        return True, "Last move undone"
+
+    def check_forbidden_33(self, row, col):
+        return self.engine.check_forbidden_33(row, col)
+
+    def is_open_three(self, r, c, dr, dc):
+        return self.engine.is_open_three(r, c, dr, dc)
+
+    def legal_moves(self):
+        # Boolean mask of cells the side to move may play
+        return self._get_move_masks()[0]
+
+    def forbidden_moves(self):
+        # Boolean mask of empty cells forbidden to Black (all False on White's turn)
+        return self._get_move_masks()[1]
+
+    def _get_move_masks(self):
+        key = (len(self.history), self.winner)
+        if self._move_masks is None or self._move_masks[:2] != key:
+            legal, forbidden = self._compute_move_masks()
+            self._move_masks = key + (legal, forbidden)
+        return self._move_masks[2], self._move_masks[3]
+
+    def _compute_move_masks(self):
+        size = self.size
+        empty = self.board == 0
+
+        forbidden = np.zeros((size, size), dtype=bool)
+        if self.winner is None and self.current_turn == 1:
+            forbidden = self.engine.forbidden_mask()
+
+        if self.winner is not None:
+            legal = np.zeros((size, size), dtype=bool)
+        else:
+            legal = empty & ~forbidden
+        return legal, forbidden
+
+    def viewport(self):
+        # (top, left, side) of the square renderers draw: the whole board
+        return 0, 0, self.size
+
+    def window(self, top, left, side):
+        # Board, legal and forbidden masks for a side x side square
+        rows = slice(top, top + side)
+        cols = slice(left, left + side)
+        legal, forbidden = self._get_move_masks()
+        return self.board[rows, cols], legal[rows, cols], forbidden[rows, cols]
+
+    def load(self, board, history, winner, current_turn):
+        # Restore a saved position without re-running the rule checks
+        self.board = np.array(board, dtype=np.int8).reshape(self.size, self.size)
+        self.history = MoveHistory(history)
+        self.winner = winner
+        self.current_turn = current_turn
+        self._engine_stale = True
+        self._move_masks = None
+
     def reset(self):
-        self.board = np.zeros((self.size, self.size), dtype=int)
+        self.board = np.zeros((self.size, self.size), dtype=np.int8)
+        self.history = MoveHistory()
+        self.winner = None
+        self.current_turn = 1
+        self._engine_stale = False
+        self._engine.reset()
+        self._move_masks = None
+
+
+DENSE_MAX_SIZE = 19  # Larger boards, and unbounded ones, are played on a SparseGame
+COORD_LIMIT = 2 ** 15 - 1  # Unbounded boards still stop here (the journal stores int16)
+VIEW_SIZE = 15  # Cells across the drawn part of a sparse board, at least...
+MAX_VIEW_SIZE = 21  # ...and at most, once the stones spread out
+VIEW_MARGIN = 2  # Empty cells kept around the stones when they all fit
+
+
+def sparse_viewport(size, bounds, last):
+    # (top, left, side) of the square drawn of a sparse board, given the
+    # stones' bounds and the last move: every stone plus a margin when that
+    # fits in MAX_VIEW_SIZE, else the area around the last move. Depends only
+    # on the position, so every viewer of a room version sees the same square.
+    if bounds is None:
+        center_r = center_c = 0 if size is None else size // 2
+        side = VIEW_SIZE
+    else:
+        top, left, bottom, right = bounds
+        span = max(bottom - top, right - left) + 1 + 2 * VIEW_MARGIN
+        if span <= MAX_VIEW_SIZE:
+            side = max(VIEW_SIZE, span | 1)  # Odd, so there is a middle cell
+            center_r = (top + bottom) // 2
+            center_c = (left + right) // 2
+        else:
+            side = MAX_VIEW_SIZE
+            center_r, center_c = last[0], last[1]
+    top = center_r - side // 2
+    left = center_c - side // 2
+    if size is not None:
+        side = min(side, size)
+        top = min(max(top, 0), size - side)
+        left = min(max(left, 0), size - side)
+    return top, left, side
+
+
+def new_game(size=15):
+    # OmokGame up to DENSE_MAX_SIZE, SparseGame for larger or unbounded (None) boards
+    if size is None or size > DENSE_MAX_SIZE:
+        return SparseGame(size)
+    return OmokGame(size)
+
+
+class SparseGame:
+    # Renju on a board too large to hold densely, or with no edge at all
+    # (size None). Only occupied cells are stored, in a dict, next to per-line
+    # run indexes like LineIndexEngine's keyed by cell. Wins read the run
+    # through the last stone and forbidden moves the 11-cell windows around one
+    # point, so both cost what the nearby stones cost, never the board's area.
+    # Dense boards and move masks exist only for the viewport being drawn.
+    __slots__ = ('size', 'stones', 'run_len', 'run_head', 'history', 'winner', 'current_turn')
+
+    def __init__(self, size=None):
+        self.size = size
+        self.reset()
+
+    def reset(self):
+        self.stones = {}  # (row, col) -> player
+        self.run_len = [{} for _ in DIRECTIONS]  # (row, col) -> length of its run
+        self.run_head = [{} for _ in DIRECTIONS]  # (row, col) -> offset from the run's first stone
         self.history = []
         self.winner = None
         self.current_turn = 1
+
+    def on_board(self, row, col):
+        if self.size is None:
+            return -COORD_LIMIT <= row <= COORD_LIMIT and -COORD_LIMIT <= col <= COORD_LIMIT
+        return 0 <= row < self.size and 0 <= col < self.size
+
+    def place_stone(self, row, col):
+        if self.winner is not None:
+            return False, "Game already finished"
+
+        if not self.on_board(row, col):
+            return False, "Invalid position"
+
+        if (row, col) in self.stones:
+            return False, "Position already taken"
+
+        if self.current_turn == 1:
+            reason = self.forbidden_reason(row, col)
+            if reason:
+                return False, f"🚫 Forbidden Move ({reason})"
+
+        self.history.append((row, col, self.current_turn))
+        self._place(row, col, self.current_turn)
+
+        if self.check_winner(row, col):
+            self.winner = self.current_turn
+        else:
+            self.current_turn = 3 - self.current_turn
+
+        return True, "Stone placed"
+
+    def _place(self, row, col, player):
+        stones = self.stones
+        stones[(row, col)] = player
+
+        for k, (dr, dc) in enumerate(DIRECTIONS):
+            run_len = self.run_len[k]
+            run_head = self.run_head[k]
+
+            back = (row - dr, col - dc)
+            left = run_len[back] if stones.get(back) == player else 0
+            fwd = (row + dr, col + dc)
+            right = run_len[fwd] if stones.get(fwd) == player else 0
+            length = left + 1 + right
+
+            # Relabel the merged run from its first stone
+            r, c = row - left * dr, col - left * dc
+            for i in range(length):
+                run_len[(r, c)] = length
+                run_head[(r, c)] = i
+                r += dr
+                c += dc
+
+    def _remove(self, row, col):
+        key = (row, col)
+        del self.stones[key]
+
+        for k, (dr, dc) in enumerate(DIRECTIONS):
+            run_len = self.run_len[k]
+            run_head = self.run_head[k]
+
+            left = run_head.pop(key)
+            right = run_len.pop(key) - left - 1
+
+            # Split the run: the part before keeps its heads, the part after restarts at 0
+            r, c = row - dr, col - dc
+            for _ in range(left):
+                run_len[(r, c)] = left
+                r -= dr
+                c -= dc
+            r, c = row + dr, col + dc
+            for i in range(right):
+                run_len[(r, c)] = right
+                run_head[(r, c)] = i
+                r += dr
+                c += dc
+
+    def check_winner(self, last_r, last_c):
+        # Black needs exactly five, White five or more
+        player = self.stones.get((last_r, last_c))
+        if player is None:
+            return False
+        key = (last_r, last_c)
+        for run_len in self.run_len:
+            length = run_len[key]
+            if length == 5 or (length > 5 and player == 2):
+                return True
+        return False
+
+    def undo_move(self):
+        if not self.history:
+            return False, "No moves to undo"
+
+        last_row, last_col, player = self.history.pop()
+        self._remove(last_row, last_col)
+        self.current_turn = player
+        self.winner = None
+        return True, "Last move undone"
+
+    def _black_lines(self, row, col):
+        # Window codes (renju.py) for a black stone at (row, col), read from
+        # the stones around it
+        stones = self.stones
+        # Cells off the board only need checking near an edge
+        inside = self.on_board(row - CENTER, col - CENTER) and self.on_board(row + CENTER, col + CENTER)
+        digits = DIGITS[0]
+        codes = []
+        for dr, dc in DIRECTIONS:
+            code = _CENTER_WEIGHT
+            for i, weight in SIDE_WEIGHTS:
+                r = row + i * dr
+                c = col + i * dc
+                value = stones.get((r, c), 0)
+                if not value and not inside and not self.on_board(r, c):
+                    value = OFF_BOARD
+                code += digits[value] * weight
+            codes.append(code)
+        return codes
+
+    def forbidden_reason(self, row, col):
+        return _renju_reason(self._black_lines(row, col))
+
+    def bounds(self):
+        # (top, left, bottom, right) of the stones, or None on an empty board
+        if not self.stones:
+            return None
+        rows = [row for row, _ in self.stones]
+        cols = [col for _, col in self.stones]
+        return min(rows), min(cols), max(rows), max(cols)
+
+    def viewport(self):
+        last = self.history[-1] if self.history else None
+        return sparse_viewport(self.size, self.bounds(), last)
+
+    def cells(self, top, left, side):
+        # Board of a side x side square, and which of its cells are on the board
+        board = np.zeros((side, side), dtype=np.int8)
+        for (row, col), player in self.stones.items():
+            if top <= row < top + side and left <= col < left + side:
+                board[row - top, col - left] = player
+
+        rows = np.arange(top, top + side)
+        cols = np.arange(left, left + side)
+        if self.size is None:
+            on_board = np.outer(np.abs(rows) <= COORD_LIMIT, np.abs(cols) <= COORD_LIMIT)
+        else:
+            on_board = np.outer((rows >= 0) & (rows < self.size), (cols >= 0) & (cols < self.size))
+        return board, on_board
+
+    def window(self, top, left, side):
+        # Board, legal and forbidden masks for a side x side square, built
+        # from the stones inside it and the empty cells near black stones
+        board, on_board = self.cells(top, left, side)
+
+        forbidden = np.zeros((side, side), dtype=bool)
+        if self.winner is None and self.current_turn == 1:
+            # Only cells with a black stone in one of their windows can be forbidden
+            near = np.zeros((side, side), dtype=bool)
+            for (row, col), player in self.stones.items():
+                r, c = row - top, col - left
+                if player == 1 and -CENTER <= r < side + CENTER and -CENTER <= c < side + CENTER:
+                    near[max(r - CENTER, 0):r + CENTER + 1, max(c - CENTER, 0):c + CENTER + 1] = True
+            for r, c in zip(*(near & (board == 0) & on_board).nonzero()):
+                forbidden[r, c] = self.forbidden_reason(top + int(r), left + int(c)) is not None
+
+        if self.winner is not None:
+            legal = np.zeros((side, side), dtype=bool)
+        else:
+            legal = (board == 0) & on_board & ~forbidden
+        return board, legal, forbidden
+
+    def load(self, board, history, winner, current_turn):
+        # Restore a saved position without re-running the rule checks; the
+        # board is rebuilt from the moves (`board` is unused, None is fine)
+        self.reset()
+        for row, col, player in history:
+            self.history.append((row, col, player))
+            self._place(row, col, player)
+        self.winner = winner
+        self.current_turn = current_turn
@@ -0,0 +1,181 @@
+import os
+import struct
+import threading
+import time
+from array import array
+from collections import namedtuple
+
+from game_journal import _pack_str, _Reader
+
+# Archive of played games, one compact record per game.
+#
+# Layout: MAGIC, then records of a u32 body length and a body: board size
+# (u16, 0 for unbounded), winner (0 none), result (RESULTS), end time (u32
+# Unix seconds), Black's and White's names (as strings in the journal), the
+# move count (u32) and the cells in play order. Players alternate from Black,
+# so they are not stored. Cells take one byte on boards up to 16x16, two up
+# to 256x256 and a pair of signed 16-bit coordinates beyond (and on
+# unbounded boards).
+#
+# Readers stream: a record is read, yielded and dropped, so memory stays flat
+# however large the archive. A torn record at the end (crash mid-write) ends
+# the iteration, and RecordWriter cuts it off before appending.
+
+MAGIC = b'OMKR\x01'
+RESULTS = ['unfinished', 'five', 'forfeit', 'timeout']
+
+_HEADER = struct.Struct('<HBBI')  # size, winner, result, ended
+_LENGTH = struct.Struct('<I')
+
+GameRecord = namedtuple('GameRecord', ['size', 'black', 'white', 'winner', 'result', 'ended', 'moves'])
+
+
+def _cell_kind(size):
+    # array typecode the cells are stored with; 'h' is (row, col) pairs
+    if size is None or size > 256:
+        return 'h'
+    return 'B' if size * size <= 256 else 'H'
+
+
+def game_result(game):
+    # 'five' when the last move won, 'forfeit' for a winner without one
+    # (the other player left), 'unfinished' otherwise
+    if game.winner is None:
+        return 'unfinished'
+    if game.history:
+        row, col, player = game.history[-1]
+        if player == game.winner and game.check_winner(row, col):
+            return 'five'
+    return 'forfeit'
+
+
+def encode_record(size, black, white, winner, result, moves, ended=None):
+    # Record body; moves are (row, col, ...) in play order
+    kind = _cell_kind(size)
+    if kind == 'h':
+        cells = array('h', [coord for move in moves for coord in move[:2]])
+        count = len(cells) // 2
+    else:
+        cells = array(kind, [row * size + col for row, col, *_ in moves])
+        count = len(cells)
+    ended = int(time.time()) if ended is None else ended
+    out = bytearray(_HEADER.pack(size or 0, winner or 0, RESULTS.index(result), ended))
+    out += _pack_str(black)
+    out += _pack_str(white)
+    out += _LENGTH.pack(count)
+    out += cells.tobytes()
+    return bytes(out)
+
+def encode_game(game, black, white, ended=None, result=None):
+    # Record body for an OmokGame or SparseGame; the caller holds its room's
+    # lock. result: what ended the game when the game cannot tell (a timeout)
+    return encode_record(game.size, black, white, game.winner, result or game_result(game), game.history, ended)
+
+
+def decode_record(body):
+    size, winner, result, ended = _HEADER.unpack_from(body, 0)
+    size = size or None
+    reader = _Reader(body, _HEADER.size)
+    black, white = reader.str(), reader.str()
+    count = reader.u32()
+    kind = _cell_kind(size)
+    cells = array(kind)
+    cells.frombytes(body[reader.offset:])
+    if kind == 'h':
+        moves = list(zip(cells[0:2 * count:2], cells[1:2 * count:2]))
+    else:
+        moves = [divmod(cell, size) for cell in cells[:count]]
+    if len(moves) != count:
+        raise ValueError("truncated move list")
+    return GameRecord(size, black, white, winner or None, RESULTS[result], ended, moves)
+
+
+def iter_bodies(path):
+    # Yields the raw body of every complete record, in file order
+    with open(path, 'rb', buffering=1 << 20) as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a game archive")
+        while True:
+            head = f.read(_LENGTH.size)
+            if len(head) < _LENGTH.size:
+                return
+            length = _LENGTH.unpack(head)[0]
+            body = f.read(length)
+            if len(body) < length:
+                return
+            yield body
+
+def read_records(path):
+    # Yields a GameRecord per complete record
+    for body in iter_bodies(path):
+        yield decode_record(body)
+
+
+def _complete_length(path):
+    # Bytes up to the end of the last complete record (header lengths only)
+    end = len(MAGIC)
+    total = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a game archive")
+        while end + _LENGTH.size <= total:
+            f.seek(end)
+            length = _LENGTH.unpack(f.read(_LENGTH.size))[0]
+            if end + _LENGTH.size + length > total:
+                break
+            end += _LENGTH.size + length
+    return end
+
+
+def write_records(path, bodies):
+    # Writes a new archive from an iterable of record bodies, consumed as it
+    # goes; returns how many were written
+    count = 0
+    with open(path, 'wb', buffering=1 << 16) as f:
+        f.write(MAGIC)
+        for body in bodies:
+            f.write(_LENGTH.pack(len(body)))
+            f.write(body)
+            count += 1
+    return count
+
+
+class RecordWriter:
+    # Appends records to an archive file, from any thread. Each record goes
+    # to the file as it is written (one game at a time is rare enough), so a
+    # crash or redeploy loses none; flush=False leaves it in the buffer.
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.count = 0
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            end = _complete_length(path)
+            if end < os.path.getsize(path):
+                os.truncate(path, end)
+            self._file = open(path, 'ab', buffering=1 << 16)
+        else:
+            self._file = open(path, 'wb', buffering=1 << 16)
+            self._file.write(MAGIC)
+            self._file.flush()
+
+    def write(self, body, flush=True):
+        with self._lock:
+            self._file.write(_LENGTH.pack(len(body)))
+            self._file.write(body)
+            self.count += 1
+            if flush:
+                self._file.flush()
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
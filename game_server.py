@@ -1,29 +1,356 @@
+import functools
+import logging
+import threading
+import time
 import uuid
-from game_logic import OmokGame
+from collections import namedtuple
+from types import MappingProxyType
+from game_clock import ClockScheduler, GameClock
+from game_journal import GameJournal, read_journal
+from game_records import RecordWriter, encode_game, write_records
+from game_logic import DENSE_MAX_SIZE, SparseGame, new_game
+from metrics import instrument
+from omok_ai import AI_PLAYER_NAME, DEFAULT_TIME_BUDGET, fallback_move, request_move
+from threats import game_threats
 
-class Room:
-    def __init__(self, room_name, creator_name):
-        self.id = str(uuid.uuid4())
+logger = logging.getLogger(__name__)
+
+ROOM_STATUSES = ('open', 'playing', 'finished')
+AI_RETRIES = 1  # Failed computer move searches run again before a fallback move
+
+# Lightweight lobby record, so the lobby never touches Room or its board
+RoomSummary = namedtuple('RoomSummary', ['id', 'name', 'black', 'white', 'status', 'spectators', 'size'])
+
+# Immutable views handed to renderers, so drawing never holds a room lock.
+# board, legal and forbidden cover the game's viewport, whose top-left cell
+# is origin: the whole board except on sparse (large or unbounded) games.
+GameSnapshot = namedtuple('GameSnapshot', ['size', 'board', 'history', 'winner', 'current_turn', 'legal', 'forbidden',
+                                           'origin'])
+RoomSnapshot = namedtuple('RoomSnapshot', ['id', 'name', 'version', 'players', 'spectators', 'ready_state', 'pending_request', 'game',
+                                           'clock'])
+
+def _read_only(array):
+    array = array.copy()
+    array.setflags(write=False)
+    return array
+
+def locked(method):
+    # Run a Room method while holding the room's lock
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def new_room_id():
+    # 48 random bits as 12 hex digits: plenty for a few thousand live rooms,
+    # and a third the size of a full uuid4 string
+    return uuid.uuid4().hex[:12]
+
+class Versioned:
+    # Monotonic change counter. Every mutation bumps it, and readers can block
+    # until it moves past the version they last rendered. The condition they
+    # block on is made by the first reader that waits, as most rooms never
+    # have one and a Condition costs more than the rest of an idle room.
+    __slots__ = ('version', '_version_lock', '_changed')
+
+    def __init__(self):
+        self.version = 0
+        self._version_lock = threading.Lock()
+        self._changed = None
+
+    def bump_version(self):
+        with self._version_lock:
+            self.version += 1
+            if self._changed is not None:
+                self._changed.notify_all()
+
+    def wait_for_change(self, version, timeout=None):
+        # Returns the current version, which equals `version` on timeout
+        with self._version_lock:
+            if self._changed is None:
+                self._changed = threading.Condition(self._version_lock)
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+
+class Room(Versioned):
+    __slots__ = ('lock', '_snapshot', '_threats', 'on_change', 'on_event', 'on_member', 'on_archive', 'on_clock', 'clock', 'ai_enabled', 'ai_time_budget', '_ai_search',
+                 '_ai_failures',
+                 'id', 'name', 'game', 'players', 'spectators', 'pending_request', 'ready_state',
+                 'last_activity', 'heartbeats')
+
+    def __init__(self, room_name, creator_name, on_change=None, size=15, time_control=None):
+        super().__init__()
+        # Guards every mutation of this room and its game. Re-entrant because
+        # GameServer.leave_room and the reaper call leave with the lock held.
+        self.lock = threading.RLock()
+        self._snapshot = None
+        self._threats = None  # (position key, Threats)
+        self.on_change = on_change  # Called with the room (lock held) after every mutation
+        self.on_event = None  # Called with (room, event, args), lock held, for the journal
+        # Called with (room, name, role), lock held, whenever a person takes a
+        # seat (role 1 or 2), starts spectating (0) or leaves (None)
+        self.on_member = None
+        # Called with the room before a game with moves is cleared (reset,
+        # swap; lock held) and when the room is removed, for the game archive
+        self.on_archive = None
+        # Called with the room, lock held, whenever its clock starts, stops or
+        # changes hands, for the clock scheduler
+        self.on_clock = None
+        self.clock = GameClock(time_control) if time_control else None  # None: untimed
+        # Computer seats act on their own only while enabled (off during journal replay)
+        self.ai_enabled = True
+        self.ai_time_budget = DEFAULT_TIME_BUDGET
+        self._ai_search = None  # Position key of the search in flight
+        self._ai_failures = 0  # Failed searches for that position so far
+        self.id = new_room_id()
         self.name = room_name
-        self.game = OmokGame()
+        self.game = new_game(size)  # size None: unbounded board
         self.players = {
             1: creator_name, # Black
             2: None          # White
         }
-        self.spectators = []
+        self.spectators = {}  # name -> None, in joining order
         # request format: {'type': 'UNDO'|'SWAP', 'requester': nickname}
         self.pending_request = None
         
         # Ready state: {1: False, 2: False}
         self.ready_state = {1: False, 2: False}
 
+        # Activity tracking for the idle reaper
+        self.last_activity = time.time()
+        self.heartbeats = {creator_name: self.last_activity} # nickname -> last seen
+
+    def _touch(self):
+        self.last_activity = time.time()
+        self._run_clock()
+        self.bump_version()
+        if self.on_change:
+            self.on_change(self)
+        self._ai_step()
+
+    def _reset_clock(self):
+        # Full time again for a new game, stopped until it starts
+        if self.clock is not None:
+            self.clock = GameClock(self.clock.control)
+            if self.on_clock:
+                self.on_clock(self)
+
+    def _archive(self):
+        if self.on_archive and self.game.history:
+            self.on_archive(self)
+
+    def _log(self, event, *args):
+        # Public mutators log their own call once, so replaying the log through
+        # the same methods rebuilds the room. Log after the change is applied:
+        # the journal may write a snapshot of the room along with the event.
+        if self.on_event:
+            self.on_event(self, event, args)
+
+    @instrument()
+    @locked
     def toggle_ready(self, role):
         if role in [1, 2]:
             self.ready_state[role] = not self.ready_state[role]
+            self._log('ready', role)
+            self._touch()
             return self.ready_state[role]
         return False
+
+    @instrument()
+    @locked
+    def place_stone(self, row, col, player=None):
+        # player: name of the person moving. When given, the move is refused
+        # unless they hold the seat to move and the game is on (both ready,
+        # no request pending); replay and the computer leave it out
+        if player is not None:
+            if self.players.get(self.game.current_turn) != player:
+                return False, "Not your turn"
+            if not (self.ready_state[1] and self.ready_state[2]):
+                return False, "Game has not started"
+            if self.pending_request is not None:
+                return False, "Answer the pending request first"
+        success, msg = self.game.place_stone(row, col)
+        if success:
+            self._log('move', row, col)
+            self._run_clock(moved=True)
+            self._touch()
+        return success, msg
+
+    # --- Clock ---
+
+    def _run_clock(self, moved=False):
+        # Lock held: the side to move's time runs while the game is on (both
+        # seats taken and ready, no winner); hand the clock over when that changed
+        clock = self.clock
+        if clock is None:
+            return
+        game = self.game
+        running = None
+        if (game.winner is None and None not in (self.players[1], self.players[2])
+                and self.ready_state[1] and self.ready_state[2]):
+            running = game.current_turn
+        if running == clock.turn and not moved:
+            return
+        clock.switch(running, time.time(), moved)
+        if self.on_clock:
+            self.on_clock(self)
+
+    @locked
+    def set_time_control(self, control):
+        # New clock (TimeControl, or None for none); the current game's
+        # time starts over
+        self.clock = GameClock(control) if control else None
+        self._log('clock', control)
+        if self.on_clock:
+            self.on_clock(self)
+        self._touch()
+
+    @locked
+    def check_clock(self, now=None):
+        # Clock scheduler: the side to move loses if its time is up
+        clock = self.clock
+        if clock is None or clock.turn is None:
+            return False
+        if now is None:
+            now = time.time()
+        if now < clock.deadline():
+            if self.on_clock:
+                self.on_clock(self)
+            return False
+        self.time_out(clock.turn)
+        return True
+
+    @locked
+    def time_out(self, role):
+        # `role` ran out of time: the other side wins, as when a player leaves
+        if self.game.winner is not None:
+            return
+        self.game.winner = 3 - role
+        if self.clock is not None:
+            self.clock.flagged = role
+        self._log('timeout', role)
+        self._touch()
     
+    def heartbeat(self, player_name):
+        # Liveness only: does not count as room activity or bump the version
+        self.heartbeats[player_name] = time.time()
+
+    def participants(self):
+        # Human participants only; computer seats never heartbeat
+        names = [name for name in (self.players[1], self.players[2])
+                 if name is not None and name != AI_PLAYER_NAME]
+        return names + list(self.spectators)
+
+    def members(self):
+        # (name, role) of every human participant: 1 Black, 2 White, 0 spectator
+        seated = [(self.players[role], role) for role in (1, 2)
+                  if self.players[role] is not None and self.players[role] != AI_PLAYER_NAME]
+        # Spectators copied in one step: remove_room reads this without the room lock
+        return seated + [(name, 0) for name in list(self.spectators)]
+
+    def _member(self, name, role):
+        if self.on_member and name is not None and name != AI_PLAYER_NAME:
+            self.on_member(self, name, role)
+
+    def ai_roles(self):
+        return [role for role in (1, 2) if self.players[role] == AI_PLAYER_NAME]
+
+    @locked
+    def add_ai(self, role=None):
+        # Seat the computer in an empty seat (White by default)
+        if isinstance(self.game, SparseGame):
+            return False, f"The computer only plays on boards up to {DENSE_MAX_SIZE}x{DENSE_MAX_SIZE}"
+        if role is None:
+            role = 2 if self.players[2] is None else 1
+        if self.players[role] is not None:
+            return False, "Seat is taken"
+        self.players[role] = AI_PLAYER_NAME
+        self.ready_state[role] = True
+        self._log('ai', role)
+        self._touch()
+        return True, "Computer joined"
+
+    def enable_ai(self):
+        with self.lock:
+            self.ai_enabled = True
+            self._ai_step()
+
+    def _ai_step(self):
+        # Let computer seats react to the mutation that just happened (lock held):
+        # stay ready, accept requests, and start a search on their turn
+        if not self.ai_enabled:
+            return
+        ai_roles = self.ai_roles()
+        if not ai_roles:
+            return
+
+        for role in ai_roles:
+            if not self.ready_state[role]:
+                self.toggle_ready(role)
+                return  # toggle_ready re-enters _ai_step
+
+        if self.pending_request and self.pending_request['requester'] != AI_PLAYER_NAME:
+            self.resolve_request(True)
+            return
+
+        game = self.game
+        if (game.winner is not None or game.current_turn not in ai_roles
+                or None in (self.players[1], self.players[2])
+                or not (self.ready_state[1] and self.ready_state[2])):
+            return
+
+        key = (len(game.history), game.history[-1] if game.history else None)
+        if self._ai_search == key:
+            return
+        self._ai_search = key
+        self._ai_failures = 0
+        self._ai_request(key)
+
+    def _ai_request(self, key):
+        future = request_move(self.game.history, self.ai_time_budget, self.game.size)
+        future.add_done_callback(lambda f: self._apply_ai_move(key, f))
+
+    def _apply_ai_move(self, key, future):
+        # Runs on the pool's callback thread; drop results for a stale position.
+        # A failed search is tried again AI_RETRIES times, then the computer
+        # plays fallback_move rather than stall the game.
+        if future.cancelled():
+            error = "cancelled"
+        else:
+            error = future.exception()
+        if error is not None:
+            logger.warning("Computer move search failed in room %s: %r", self.id, error)
+        with self.lock:
+            game = self.game
+            if self._ai_search != key:
+                return
+            if key != (len(game.history), game.history[-1] if game.history else None):
+                self._ai_search = None
+                self._ai_step()
+                return
+            if error is None:
+                row, col, _, _, _ = future.result()
+            else:
+                self._ai_failures += 1
+                if self._ai_failures <= AI_RETRIES:
+                    try:
+                        self._ai_request(key)
+                        return
+                    except Exception:
+                        logger.exception("Could not resubmit the computer move search in room %s", self.id)
+                row, col = fallback_move(game)
+            self._ai_search = None
+            if row is not None:
+                self.place_stone(row, col)
+
+    @instrument()
+    @locked
     def join(self, player_name):
+        if player_name == AI_PLAYER_NAME:
+            return False, "That name is reserved"
+        self.heartbeat(player_name)
         # Check if already in the room (Reconnect/Refresh)
         if self.players[1] == player_name:
             return True, "Reconnected as Black"
@@ -35,11 +362,19 @@ class Room:
         # New Joiner
         if self.players[2] is None:
             self.players[2] = player_name
+            self._log('join', player_name)
+            self._member(player_name, 2)
+            self._touch()
             return True, "Joined as White"
         else:
-            self.spectators.append(player_name)
+            self.spectators[player_name] = None
+            self._log('join', player_name)
+            self._member(player_name, 0)
+            self._touch()
             return True, "Joined as Spectator"
             
+    @instrument()
+    @locked
     def leave(self, player_name):
         winner = None
         if self.players[1] == player_name:
@@ -55,16 +390,92 @@ class Room:
                 if self.players[1]:
                     self.game.winner = 1
         elif player_name in self.spectators:
-            self.spectators.remove(player_name)
+            del self.spectators[player_name]
+        else:
+            return
+        self._log('leave', player_name)
+        self._member(player_name, None)
+        self.heartbeats.pop(player_name, None)
+        self._touch()
             
     def is_empty(self):
-        return self.players[1] is None and self.players[2] is None and not self.spectators
+        # A room with only a computer seat left counts as empty
+        if self.spectators:
+            return False
+        return all(name is None or name == AI_PLAYER_NAME for name in (self.players[1], self.players[2]))
+
+    def status(self):
+        if self.game.winner is not None:
+            return 'finished'
+        if self.players[1] is None or self.players[2] is None:
+            return 'open'
+        return 'playing'
+
+    def summary(self):
+        return RoomSummary(self.id, self.name, self.players[1], self.players[2],
+                           self.status(), len(self.spectators), self.game.size)
+
+    @instrument()
+    def snapshot(self):
+        # Consistent, read-only view of the room, built once per version and
+        # shared by every reader
+        snap = self._snapshot
+        if snap is not None and snap.version == self.version:
+            return snap
+        with self.lock:
+            snap = self._snapshot
+            if snap is not None and snap.version == self.version:
+                return snap
+            game = self.game
+            top, left, side = game.viewport()
+            board, legal, forbidden = game.window(top, left, side)
+            game_snap = GameSnapshot(
+                game.size,
+                _read_only(board),
+                game.history.copy(),
+                game.winner,
+                game.current_turn,
+                _read_only(legal),
+                _read_only(forbidden),
+                (top, left),
+            )
+            pending = self.pending_request
+            snap = RoomSnapshot(
+                self.id,
+                self.name,
+                self.version,
+                MappingProxyType(dict(self.players)),
+                tuple(self.spectators),
+                MappingProxyType(dict(self.ready_state)),
+                MappingProxyType(dict(pending)) if pending else None,
+                game_snap,
+                self.clock.state() if self.clock else None,
+            )
+            self._snapshot = snap
+            return snap
             
+    @locked
+    def threats(self):
+        # Threat map of the drawn viewport (threats.py), computed once per position
+        game = self.game
+        key = (len(game.history), game.history[-1] if game.history else None)
+        if self._threats is None or self._threats[0] != key:
+            self._threats = (key, game_threats(game))
+        return self._threats[1]
+
+    @instrument()
+    @locked
     def reset_game(self):
+        self._archive()
         self.game.reset()
+        self._reset_clock()
         self.pending_request = None
         self.ready_state = {1: False, 2: False}
+        self._log('reset')
+        self._touch()
 
+    @instrument()
+    @locked
     def make_request(self, requester, req_type):
         # req_type: 'UNDO' or 'SWAP'
         if self.pending_request:
@@ -79,59 +490,470 @@ class Room:
             # Check if opponent is missing
             opponent_missing = (self.players[1] is None) or (self.players[2] is None)
             if opponent_missing:
-                self.swap_players()
+                self._swap_players()
+                self._log('request', requester, req_type)
+                self._touch()
                 return True, "Swapped immediately (Single Player)"
 
         self.pending_request = {'type': req_type, 'requester': requester}
+        self._log('request', requester, req_type)
+        self._touch()
         return True, "Request sent"
 
+    @locked
     def cancel_request(self):
         self.pending_request = None
+        self._log('cancel')
+        self._touch()
 
+    @instrument()
+    @locked
     def resolve_request(self, approved):
         if not self.pending_request:
             return False, "No pending request"
         
         req = self.pending_request
         self.pending_request = None
-        
-        if not approved:
-            return True, "Request rejected"
-            
-        # Execute Action
-        if req['type'] == 'UNDO':
+
+        # Execute Action, then log and notify once: a journal snapshot taken
+        # on this event must already hold its outcome
+        result = True, "Request rejected"
+        if approved and req['type'] == 'UNDO':
             self.game.undo_move()
-            return True, "Undo executed"
-        elif req['type'] == 'SWAP':
-            self.swap_players()
-            return True, "Players swapped"
-            
-        return False, "Unknown request type"
+            # Against the computer, take back its reply too so the requester is to move
+            requester_role = 1 if self.players[1] == req['requester'] else 2
+            if self.ai_roles() and self.game.history and self.game.current_turn != requester_role:
+                self.game.undo_move()
+            result = True, "Undo executed"
+        elif approved and req['type'] == 'SWAP':
+            self._swap_players()
+            result = True, "Players swapped"
+        elif approved:
+            result = False, "Unknown request type"
+        self._log('resolve', approved)
+        self._touch()
+        return result
 
+    @locked
     def swap_players(self):
+        self._swap_players()
+        self._log('swap')
+        self._touch()
+
+    def _swap_players(self):
+        # The swap itself; callers log it and _touch
+        self._archive()
         p1 = self.players[1]
         p2 = self.players[2]
         self.players[1] = p2
         self.players[2] = p1
+        self._member(p2, 1)
+        self._member(p1, 2)
         self.game.reset() # Reset game on swap usually makes sense
+        self._reset_clock()
         self.ready_state = {1: False, 2: False}
 
+    @locked
+    def restore_state(self, players, spectators, ready_state, pending_request,
+                      board, history, winner, current_turn):
+        # Load a saved room state wholesale (journal recovery)
+        for name, _ in self.members():
+            self._member(name, None)
+        self.players = {1: players[0], 2: players[1]}
+        self.spectators = dict.fromkeys(spectators)
+        for name, role in self.members():
+            self._member(name, role)
+        now = time.time()
+        self.heartbeats = {name: now for name in self.participants()}
+        self.ready_state = {1: ready_state[0], 2: ready_state[1]}
+        self.pending_request = pending_request
+        self.game.load(board, history, winner, current_turn)
+        self._reset_clock()
+        self._touch()
 
-class GameServer:
-    def __init__(self):
+
+class GameServer(Versioned):
+    def __init__(self, seat_ttl=60, room_ttl=2 * 60 * 60, max_rooms=1000, journal_path=None, archive_path=None):
+        super().__init__()
+        # Reaper settings (seconds): participants without a heartbeat for seat_ttl
+        # are removed through Room.leave, rooms without activity for room_ttl are
+        # evicted, and at most max_rooms rooms are kept: past that the least
+        # recently active empty or finished rooms go, and no room is created
+        # while none of those is left (games in progress are never evicted)
+        self.seat_ttl = seat_ttl
+        self.room_ttl = room_ttl
+        self.max_rooms = max_rooms
+        self.reaper_stats = {
+            'runs': 0,
+            'seats_dropped': 0,
+            'spectators_dropped': 0,
+            'games_forfeited': 0,
+            'rooms_evicted': 0,
+        }
+        self._reaper_thread = None
+        self._reaper_stop = threading.Event()
+        # Guards rooms and the lobby indexes. Lock order is room.lock -> server
+        # lock (room callbacks update the indexes), never the other way round.
+        self.lock = threading.RLock()
         self.rooms = {} # room_id -> Room
+        # Secondary indexes: status -> {room_id: None}, insertion ordered
+        self.room_index = {status: {} for status in ROOM_STATUSES}
+        self.summaries = {} # room_id -> RoomSummary
+        self.player_index = {} # nickname -> (room_id, role) of the one room they are in
+        self.room_status = {} # room_id -> status
+        # Ordered id lists per status, rebuilt only when index membership changes
+        self.index_version = 0
+        self._lobby_snapshot = None # (index_version, {status or None: [room_id, ...]})
+
+        # Deadlines of every running game clock (game_clock.py), one thread for all
+        self.clocks = ClockScheduler()
 
-    def create_room(self, room_name, creator_name):
-        new_room = Room(room_name, creator_name)
-        self.rooms[new_room.id] = new_room
+        # Optional archive (game_records.py) every played game is appended to
+        # when it is cleared, before the journal replay so restored rooms get it
+        self.archive = RecordWriter(archive_path) if archive_path else None
+
+        # Optional append-only journal: rooms are restored from it on startup
+        self.journal = None
+        if journal_path:
+            self._open_journal(journal_path)
+
+    @instrument()
+    def create_room(self, room_name, creator_name, size=15, room_id=None, time_control=None):
+        # room_id: use this id unless it is taken (cluster workers pick ids they own).
+        # time_control: TimeControl for the room's games, None for untimed.
+        # Returns None when the creator is already in a room (one room per
+        # player), or when max_rooms are open and none can be evicted.
+        new_room = Room(room_name, creator_name, on_change=self._room_changed, size=size, time_control=time_control)
+        if room_id is not None:
+            new_room.id = room_id
+        with self.lock:
+            if creator_name in self.player_index:
+                return None
+            if not self._enforce_room_cap(limit=self.max_rooms - 1):
+                return None
+            while new_room.id in self.rooms:
+                new_room.id = new_room_id()
+            if self.journal:
+                self.journal.record(new_room, 'create', (creator_name,))
+                new_room.on_event = self.journal.record
+            self._add_room(new_room)
+        self.bump_version()
         return new_room.id
 
+    def _add_room(self, room):
+        with self.lock:
+            self.rooms[room.id] = room
+            self._index_room(room)
+            for name, role in room.members():
+                self.player_index[name] = (room.id, role)
+            room.on_member = self._member_changed
+            if self.archive:
+                room.on_archive = self._archive_game
+            room.on_clock = self._clock_changed
+            if room.clock is not None and room.clock.turn is not None:
+                self._clock_changed(room)  # Restored from the journal mid-game
+            self._enforce_room_cap(keep=room.id)
+
+    def _member_changed(self, room, name, role):
+        # Room.on_member: keep player_index in step with the room's seats
+        with self.lock:
+            if room.id not in self.rooms:
+                return
+            if role is not None:
+                self.player_index[name] = (room.id, role)
+            elif self.player_index.get(name, (None,))[0] == room.id:
+                del self.player_index[name]
+
+    def find_player(self, player_name):
+        # (room_id, role) of the room a player is in (role 1 Black, 2 White,
+        # 0 spectator), or None
+        return self.player_index.get(player_name)
+
+    @instrument()
+    def join_room(self, room_id, player_name):
+        # Room.join, refused while the player is in another room
+        room = self.get_room(room_id)
+        if room is None:
+            return False, "Room no longer exists"
+        with room.lock, self.lock:
+            where = self.player_index.get(player_name)
+            if where is not None and where[0] != room_id:
+                other = self.rooms.get(where[0])
+                return False, f"You are already in room '{other.name if other else where[0]}'; leave it first"
+            return room.join(player_name)
+
+    def _room_changed(self, room):
+        # The server version is the lobby's: a room mutation bumps it only
+        # when the room's RoomSummary changed, so moves leave lobbies idle
+        with self.lock:
+            changed = room.id in self.rooms and self._index_room(room)
+        if changed:
+            self.bump_version()
+
+    def _index_room(self, room):
+        # Returns whether the room's summary changed
+        summary = room.summary()
+        if self.summaries.get(room.id) == summary:
+            return False
+        self.summaries[room.id] = summary
+        old_status = self.room_status.get(room.id)
+        if old_status != summary.status:
+            if old_status is not None:
+                del self.room_index[old_status][room.id]
+            self.room_index[summary.status][room.id] = None
+            self.room_status[room.id] = summary.status
+            self.index_version += 1
+        return True
+
     def get_room(self, room_id):
         return self.rooms.get(room_id)
         
+    @instrument()
     def remove_room(self, room_id):
-        if room_id in self.rooms:
-            del self.rooms[room_id]
+        with self.lock:
+            if room_id not in self.rooms:
+                return
+            room = self.rooms.pop(room_id)
+            del self.room_index[self.room_status.pop(room_id)][room_id]
+            del self.summaries[room_id]
+            for name, _ in room.members():
+                if self.player_index.get(name, (None,))[0] == room_id:
+                    del self.player_index[name]
+            room.on_member = None
+            room.on_clock = None
+            self.clocks.schedule(room, None)
+            self.index_version += 1
+        if room.on_archive:
+            # Evicted rooms come here without their lock (the cap runs under
+            # the server lock); their games have gone quiet by then
+            room._archive()
+            room.on_archive = None
+        if self.journal:
+            room.on_event = None
+            self.journal.record(room, 'remove')
+        self.bump_version()
+
+    @instrument()
+    def leave_room(self, room_id, player_name):
+        # Leave and drop the room if it is now empty, atomically w.r.t. joiners
+        room = self.get_room(room_id)
+        if room is None:
+            return
+        with room.lock:
+            room.leave(player_name)
+            if room.is_empty():
+                self.remove_room(room_id)
 
+    @instrument()
     def get_all_rooms(self):
-        return list(self.rooms.values())
+        with self.lock:
+            return list(self.rooms.values())
+
+    @instrument()
+    def count_rooms(self, status=None):
+        with self.lock:
+            if status is None:
+                return len(self.rooms)
+            return len(self.room_index[status])
+
+    @instrument()
+    def list_rooms(self, status=None, page=0, page_size=20):
+        # One page of RoomSummary records (status None = all rooms, in creation order).
+        # Returns (summaries, total matching rooms).
+        with self.lock:
+            snapshot = self._lobby_snapshot
+            if snapshot is None or snapshot[0] != self.index_version:
+                ids = {None: list(self.rooms)}
+                for name, index in self.room_index.items():
+                    ids[name] = list(index)
+                snapshot = (self.index_version, ids)
+                self._lobby_snapshot = snapshot
+
+            ids = snapshot[1][status]
+            start = page * page_size
+            summaries = [self.summaries[room_id] for room_id in ids[start:start + page_size]]
+            return summaries, len(ids)
+
+    def population(self):
+        # (rooms by status, seated players, spectators), from the lobby index
+        with self.lock:
+            rooms = {status: len(index) for status, index in self.room_index.items()}
+            players = spectators = 0
+            for summary in self.summaries.values():
+                players += (summary.black is not None) + (summary.white is not None)
+                spectators += summary.spectators
+        return rooms, players, spectators
+
+    # --- Journal ---
+
+    # Journal event -> Room method that replays it
+    REPLAY_METHODS = {
+        'move': 'place_stone',
+        'join': 'join',
+        'leave': 'leave',
+        'ready': 'toggle_ready',
+        'reset': 'reset_game',
+        'swap': 'swap_players',
+        'request': 'make_request',
+        'cancel': 'cancel_request',
+        'resolve': 'resolve_request',
+        'ai': 'add_ai',
+        'clock': 'set_time_control',
+        'timeout': 'time_out',
+    }
+
+    def _open_journal(self, path):
+        # Each room's events are held until the end: a snapshot supersedes
+        # everything before it but the time control, which snapshots do not
+        # carry, so only what follows a room's last snapshot is replayed
+        pending = {}  # room id -> [create args, clock args, snapshot, events after it]
+        for event, room_id, args in read_journal(path):
+            if event == 'create':
+                pending[room_id] = [args, None, None, []]
+                continue
+            entry = pending.get(room_id)
+            if entry is None:
+                continue
+            if event == 'remove':
+                del pending[room_id]
+            elif event == 'snapshot':
+                for earlier, earlier_args in entry[3]:
+                    if earlier == 'clock':
+                        entry[1] = earlier_args
+                entry[2] = args[0]
+                entry[3] = []
+            else:
+                entry[3].append((event, args))
+
+        rooms = {}
+        for room_id, (args, clock, snapshot, events) in pending.items():
+            room = Room(args[0], args[1], size=args[2])
+            room.id = room_id
+            room.ai_enabled = False  # Computer moves are in the journal already
+            if clock is not None:
+                room.set_time_control(*clock)
+            if snapshot is not None:
+                room.restore_state(**snapshot)
+            for event, event_args in events:
+                getattr(room, self.REPLAY_METHODS[event])(*event_args)
+            rooms[room_id] = room
+
+        # Compact to one snapshot per live room, then keep appending
+        journal = GameJournal(path)
+        journal.rewrite(rooms.values())
+        for room in rooms.values():
+            room.on_change = self._room_changed
+            room.on_event = journal.record
+            self._add_room(room)
+        journal.start()
+        self.journal = journal
+        for room in rooms.values():
+            room.enable_ai()
+
+    # --- Game clocks ---
+
+    def _clock_changed(self, room):
+        # Room.on_clock: (re)schedule the deadline of the room's running clock
+        clock = room.clock
+        self.clocks.schedule(room, clock.deadline() if clock is not None and clock.turn is not None else None)
+
+    def start_clocks(self):
+        self.clocks.start()
+
+    # --- Game archive ---
+
+    def _archive_game(self, room):
+        # Room.on_archive
+        result = 'timeout' if room.clock is not None and room.clock.flagged else None
+        self.archive.write(encode_game(room.game, room.players[1], room.players[2], result=result))
+
+    def iter_records(self):
+        # Archive record bodies for the games in play (those with moves), one
+        # room at a time under its lock
+        for room in self.get_all_rooms():
+            with room.lock:
+                if not room.game.history:
+                    continue
+                body = encode_game(room.game, room.players[1], room.players[2])
+            yield body
+
+    def export_records(self, path):
+        # Writes the games in play to a new archive file; returns how many
+        return write_records(path, self.iter_records())
+
+    def close(self):
+        self.stop_reaper()
+        self.clocks.stop()
+        if self.journal:
+            self.journal.close()
+        if self.archive:
+            self.archive.close()
+
+    # --- Idle reaper ---
+
+    @instrument()
+    def reap(self, now=None):
+        # One sweep: drop stale participants (forfeiting abandoned games through
+        # Room.leave), then evict empty and idle rooms, then enforce the room cap
+        if now is None:
+            now = time.time()
+        stats = self.reaper_stats
+        stats['runs'] += 1
+
+        for room in self.get_all_rooms():
+            with room.lock:
+                for name in room.participants():
+                    if now - room.heartbeats.get(name, 0) <= self.seat_ttl:
+                        continue
+                    was_seated = name in (room.players[1], room.players[2])
+                    had_winner = room.game.winner is not None
+                    room.leave(name)
+                    if was_seated:
+                        stats['seats_dropped'] += 1
+                        if not had_winner and room.game.winner is not None:
+                            stats['games_forfeited'] += 1
+                    else:
+                        stats['spectators_dropped'] += 1
+
+                if room.is_empty() or now - room.last_activity > self.room_ttl:
+                    self.remove_room(room.id)
+                    stats['rooms_evicted'] += 1
+
+        with self.lock:
+            self._enforce_room_cap()
+        return stats
+
+    def _enforce_room_cap(self, keep=None, limit=None):
+        # Caller holds the server lock. Evicts the least recently active empty
+        # or finished rooms down to `limit` rooms (max_rooms by default); rooms
+        # with a game on or someone waiting stay. Returns whether it got there.
+        limit = self.max_rooms if limit is None else limit
+        excess = len(self.rooms) - limit
+        if excess <= 0:
+            return True
+        candidates = [room for room in self.rooms.values()
+                      if room.id != keep and (self.room_status[room.id] == 'finished' or room.is_empty())]
+        candidates.sort(key=lambda room: room.last_activity)
+        for room in candidates[:excess]:
+            self.remove_room(room.id)
+            self.reaper_stats['rooms_evicted'] += 1
+        return len(candidates) >= excess
+
+    def start_reaper(self, interval=10):
+        # Background daemon thread calling reap() every `interval` seconds
+        if self._reaper_thread is not None and self._reaper_thread.is_alive():
+            return
+        self._reaper_stop.clear()
+
+        def run():
+            while not self._reaper_stop.wait(interval):
+                self.reap()
+
+        self._reaper_thread = threading.Thread(target=run, name="room-reaper", daemon=True)
+        self._reaper_thread.start()
+
+    def stop_reaper(self):
+        self._reaper_stop.set()
+        if self._reaper_thread is not None:
+            self._reaper_thread.join()
+            self._reaper_thread = None
@@ -0,0 +1,364 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import namedtuple
+
+from game_server import Versioned
+
+# Quick match: players queue with a rating and are paired with someone close
+# to it, straight into a new room with both seats taken.
+#
+# A player accepts opponents within `window` rating points, widening by
+# `widen` points per second of waiting up to `max_window`. Tickets are kept
+# sorted by rating, so the closest candidates are always neighbours, and
+# each neighbouring pair goes on a heap keyed by when both players' windows
+# will cover their gap. Pairing pops ready pairs off the heap; pairs made
+# stale by an earlier match or a cancel are skipped when they come up.
+#
+# The sorted tickets are a skip list (_TicketOrder): finding a new ticket's
+# place takes O(log n) expected steps, and unlinking a ticket or reaching
+# its neighbours a few pointers. So joining, leaving and matching each
+# cost O(log n), plus a few heap pushes (O(log n) too; the heap is rebuilt
+# once stale pairs outnumber live ones four to one). A sorted Python list
+# would find the place by bisect but pay an O(n) memmove on every insert
+# and delete, which dominates from about 10^5 queued players
+# (benchmarks/bench_matchmaking.py, churn column).
+#
+# Pairs are seated through the server's create_room and join_room, which
+# keep every player in one room at most. When a player turns out to be in a
+# room already, the match fails: the other player goes back into the queue
+# with their place and waiting time, and both are told why (failure()).
+
+DEFAULT_RATING = 1500
+
+# What status() tells a queued player: the room they were matched into (None
+# while waiting), seconds waited, current window and players in the queue
+QueueStatus = namedtuple('QueueStatus', ['room_id', 'waited', 'window', 'waiting'])
+
+
+class _Node:
+    __slots__ = ('key', 'next', 'prev')
+
+    def __init__(self, key, level):
+        self.key = key
+        self.next = [None] * level  # Successor at each level
+        self.prev = [None] * level  # Predecessor at each level (the head for the first)
+
+
+class _TicketOrder:
+    # Skip list of ticket keys (rating, seq, name), ascending: O(log n)
+    # expected insert, O(1) expected remove (it is linked both ways at every
+    # level) and O(1) neighbours
+    MAX_LEVEL = 32
+
+    def __init__(self, seed=0):
+        self._head = _Node(None, self.MAX_LEVEL)
+        self._level = 1
+        self._nodes = {}  # key -> node
+        self._random = random.Random(seed)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, key):
+        return key in self._nodes
+
+    def __iter__(self):
+        node = self._head.next[0]
+        while node is not None:
+            yield node.key
+            node = node.next[0]
+
+    def _path(self, key):
+        # Last node before `key` at every level in use
+        path = [self._head] * self._level
+        node = self._head
+        for level in range(self._level - 1, -1, -1):
+            following = node.next[level]
+            while following is not None and following.key < key:
+                node = following
+                following = node.next[level]
+            path[level] = node
+        return path
+
+    def insert(self, key):
+        level = 1
+        while level < self.MAX_LEVEL and self._random.random() < 0.25:
+            level += 1
+        self._level = max(self._level, level)
+        path = self._path(key)
+        node = _Node(key, level)
+        for i in range(level):
+            prev = path[i]
+            following = node.next[i] = prev.next[i]
+            prev.next[i] = node
+            node.prev[i] = prev
+            if following is not None:
+                following.prev[i] = node
+        self._nodes[key] = node
+
+    def remove(self, key):
+        node = self._nodes.pop(key)
+        for i in range(len(node.next)):
+            prev, following = node.prev[i], node.next[i]
+            prev.next[i] = following
+            if following is not None:
+                following.prev[i] = prev
+
+    def before(self, key):
+        # Key just below `key` (which is in the list), or None
+        prev = self._nodes[key].prev[0]
+        return None if prev is self._head else prev.key
+
+    def after(self, key):
+        following = self._nodes[key].next[0]
+        return None if following is None else following.key
+
+
+class MatchQueue(Versioned):
+    def __init__(self, server, window=100, widen=10, max_window=400, ticket_ttl=60, size=15, time_control=None):
+        super().__init__()
+        self.server = server  # GameServer (or ClusterServer) the rooms go to
+        self.window = window
+        self.widen = widen
+        self.max_window = max_window
+        self.ticket_ttl = ticket_ttl  # Tickets not seen for this long are dropped
+        self.size = size
+        self.time_control = time_control  # Clock for matched games (game_clock.TimeControl)
+        self.lock = threading.Lock()
+        self.order = _TicketOrder()  # (rating, seq, name) for every queued player, sorted
+        self.tickets = {}  # name -> ((rating, seq, name), joined)
+        self.last_seen = {}  # name -> time of the last status() or heartbeat
+        self.matches = {}  # name -> (room id, when), until status() hands it over
+        self.failures = {}  # name -> (message, when), until failure() hands it over
+        self._pairs = []  # Heap of (ready time, left key, right key)
+        self._seq = itertools.count()
+        self._last_sweep = 0.0
+        self.stats = {'queued': 0, 'matched': 0, 'expired': 0, 'failed': 0}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def window_after(self, waited):
+        # Rating difference accepted after `waited` seconds in the queue
+        return min(self.max_window, self.window + self.widen * waited)
+
+    # --- Queue (caller holds self.lock) ---
+
+    def _push_pair(self, left, right):
+        # Schedule neighbours `left` and `right` (keys, left rated lower)
+        gap = right[0] - left[0]
+        if gap > self.max_window:
+            return
+        if gap <= self.window:
+            delay = 0
+        elif self.widen:
+            delay = (gap - self.window) / self.widen
+        else:
+            return
+        joined = max(self.tickets[left[2]][1], self.tickets[right[2]][1])
+        heapq.heappush(self._pairs, (joined + delay, left, right))
+
+    def _insert(self, key, joined, now):
+        # Queue ticket `key` (rating, seq, name), waiting since `joined`
+        order = self.order
+        order.insert(key)
+        self.tickets[key[2]] = (key, joined)
+        self.last_seen[key[2]] = now
+        before, after = order.before(key), order.after(key)
+        if before is not None:
+            self._push_pair(before, key)
+        if after is not None:
+            self._push_pair(key, after)
+
+    def _take(self, *keys):
+        # Remove neighbouring keys (in order); their old neighbours now meet.
+        # Returns the removed tickets.
+        order = self.order
+        before, after = order.before(keys[0]), order.after(keys[-1])
+        taken = []
+        for key in keys:
+            order.remove(key)
+            taken.append(self.tickets.pop(key[2]))
+            self.last_seen.pop(key[2], None)
+        if before is not None and after is not None:
+            self._push_pair(before, after)
+        return taken
+
+    def _compact(self):
+        # Stale pairs pile up on the heap under churn; rebuild it from the
+        # current neighbours once they outnumber the live ones
+        if len(self._pairs) <= 4 * len(self.order) + 64:
+            return
+        self._pairs = []
+        keys = list(self.order)
+        for left, right in zip(keys, keys[1:]):
+            self._push_pair(left, right)
+
+    # --- Players ---
+
+    def enqueue(self, name, rating=DEFAULT_RATING, now=None):
+        if now is None:
+            now = time.time()
+        with self.lock:
+            if name in self.tickets:
+                return False, "Already searching"
+            self.matches.pop(name, None)
+            self.failures.pop(name, None)
+            self._insert((rating, next(self._seq), name), now, now)
+            self.stats['queued'] += 1
+        self.bump_version()
+        return True, "Searching for an opponent"
+
+    def cancel(self, name):
+        with self.lock:
+            ticket = self.tickets.get(name)
+            if ticket is None:
+                return False
+            self._take(ticket[0])
+        self.bump_version()
+        return True
+
+    def heartbeat(self, name, now=None):
+        # Keeps a ticket alive while the player's lobby is open
+        with self.lock:
+            if name in self.tickets:
+                self.last_seen[name] = time.time() if now is None else now
+
+    def status(self, name, now=None):
+        # QueueStatus for a player, or None when they are neither queued nor
+        # matched. A match is reported once.
+        if now is None:
+            now = time.time()
+        with self.lock:
+            match = self.matches.pop(name, None)
+            if match is not None:
+                return QueueStatus(match[0], 0, 0, len(self.order))
+            ticket = self.tickets.get(name)
+            if ticket is None:
+                return None
+            self.last_seen[name] = now
+            waited = now - ticket[1]
+            return QueueStatus(None, waited, self.window_after(waited), len(self.order))
+
+    def failure(self, name):
+        # Why the player's last match could not be seated, or None. Reported
+        # once.
+        with self.lock:
+            failure = self.failures.pop(name, None)
+        return failure[0] if failure else None
+
+    # --- Pairing ---
+
+    def pair(self, now=None):
+        # Takes every pair whose windows now cover each other out of the
+        # queue. Returns [(lower rated name, higher rated name), ...].
+        return [(left[0][2], right[0][2]) for left, right in self._pair(now)]
+
+    def _pair(self, now=None):
+        # pair(), returning the tickets taken: [(lower, higher), ...]
+        if now is None:
+            now = time.time()
+        pairs = []
+        with self.lock:
+            order = self.order
+            heap = self._pairs
+            while heap and heap[0][0] <= now:
+                _, left, right = heapq.heappop(heap)
+                if left not in order or order.after(left) != right:
+                    continue  # One of them was matched or left, or someone queued in between
+                pairs.append(tuple(self._take(left, right)))
+            self._compact()
+        return pairs
+
+    def expire(self, now=None):
+        # Drops tickets not seen for ticket_ttl, and matches nobody collected
+        if now is None:
+            now = time.time()
+        with self.lock:
+            stale = [name for name, seen in self.last_seen.items() if now - seen > self.ticket_ttl]
+            for name in stale:
+                self._take(self.tickets[name][0])
+            self.matches = {name: match for name, match in self.matches.items() if now - match[1] <= self.ticket_ttl}
+            self.failures = {name: failure for name, failure in self.failures.items()
+                             if now - failure[1] <= self.ticket_ttl}
+            self.stats['expired'] += len(stale)
+        if stale:
+            self.bump_version()
+        return len(stale)
+
+    def tick(self, now=None):
+        # One scheduler step: pair whoever can be paired and seat each pair
+        # in a new room, the lower rated player on Black (who moves first)
+        if now is None:
+            now = time.time()
+        if now - self._last_sweep >= self.ticket_ttl / 4:
+            self._last_sweep = now
+            self.expire(now)
+        pairs = self._pair(now)
+        for black, white in pairs:
+            self._seat(black, white, now)
+        if pairs:
+            self.bump_version()
+        return [(black[0][2], white[0][2]) for black, white in pairs]
+
+    def _seat(self, black, white, now):
+        # New room for a pair of tickets; on failure the player who could
+        # not be seated is dropped and the other queued again
+        black_name, white_name = black[0][2], white[0][2]
+        room_id = self.server.create_room(f"Quick match: {black_name} vs {white_name}", black_name,
+                                          size=self.size, time_control=self.time_control)
+        if room_id is None and self.server.find_player(black_name) is None:
+            self._requeue([black, white], "No room is free on the server right now; still searching", now)
+            return
+        if room_id is None:
+            self._fail(black_name, "You are already in a room; leave it to play a quick match", white, now)
+            return
+        joined, message = self.server.join_room(room_id, white_name)
+        if not joined:
+            self.server.leave_room(room_id, black_name)
+            self._fail(white_name, message, black, now)
+            return
+        with self.lock:
+            self.matches[black_name] = self.matches[white_name] = (room_id, now)
+            self.stats['matched'] += 2
+
+    def _fail(self, name, message, other, now):
+        # `name` could not be seated: tell both, and queue the other player
+        # (`other`, their ticket) again with their place and waiting time
+        other_name = other[0][2]
+        with self.lock:
+            self.failures[name] = (f"Match with {other_name} failed: {message}", now)
+            self.failures[other_name] = (f"{name} could not join the match; still searching", now)
+            if other_name not in self.tickets:
+                self._insert(other[0], other[1], now)
+            self.stats['failed'] += 1
+
+    def _requeue(self, tickets, message, now):
+        # Neither player is at fault (the server is full): both go back in
+        with self.lock:
+            for key, joined in tickets:
+                self.failures[key[2]] = (message, now)
+                if key[2] not in self.tickets:
+                    self._insert(key, joined, now)
+            self.stats['failed'] += 1
+
+    def start(self, interval=0.5):
+        # Background daemon thread calling tick() every `interval` seconds
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                self.tick()
+
+        self._thread = threading.Thread(target=run, name="match-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,297 @@
+import collections
+import functools
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# In-process metrics: counters, duration histograms and gauges, rendered in
+# the Prometheus text format. Switched on with OMOK_METRICS=1 at startup;
+# when off, instrument() leaves functions undecorated and time()/stopwatch()
+# hand back shared do-nothing objects, so the hot paths pay one attribute
+# check at most.
+
+ENABLED = os.environ.get("OMOK_METRICS", "") not in ("", "0")
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+MAX_SESSIONS = 1000  # Per-session series kept, most recently active first
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Timer:
+    __slots__ = ('registry', 'name', 'key', 'start')
+
+    def __init__(self, registry, name, key):
+        self.registry = registry
+        self.name = name
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        # Also records when the block is left by an exception (st.rerun() is one)
+        self.registry._observe(self.name, self.key, time.perf_counter() - self.start)
+        return False
+
+
+class _Stopwatch:
+    # Splits one timed block into phases: lap(phase) records the time since
+    # the previous lap under the phase label
+    __slots__ = ('registry', 'name', 'labels', 'last')
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+        self.last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.registry.observe(self.name, now - self.last, phase=phase, **self.labels)
+        self.last = now
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def lap(self, phase):
+        pass
+
+_NULL_TIMER = _NullTimer()
+
+
+class Registry:
+    def __init__(self, enabled=ENABLED):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.help = {}  # name -> (type, help text)
+        self.counters = collections.defaultdict(float)  # (name, label key) -> value
+        self.histograms = {}  # (name, label key) -> [bucket counts..., sum, count]
+        self.sessions = collections.OrderedDict()  # session id -> reruns
+        self.collectors = []  # Callables yielding (name, labels dict, value) gauges
+
+    def describe(self, name, kind, text):
+        self.help[name] = (kind, text)
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.counters[key] += value
+
+    def observe(self, name, seconds, **labels):
+        if self.enabled:
+            self._observe(name, _label_key(labels), seconds)
+
+    def _observe(self, name, key, seconds):
+        with self.lock:
+            values = self.histograms.get((name, key))
+            if values is None:
+                values = self.histograms[(name, key)] = [0] * (len(BUCKETS) + 2)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    values[i] += 1
+                    break
+            values[-2] += seconds
+            values[-1] += 1
+
+    def time(self, name, **labels):
+        # Context manager observing the block's duration
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, _label_key(labels))
+
+    def stopwatch(self, name, **labels):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Stopwatch(self, name, labels)
+
+    def instrument(self, name, **labels):
+        # Decorator timing every call; a no-op when metrics are off at import
+        def decorate(func):
+            if not self.enabled:
+                return func
+            key = _label_key(labels or {'op': func.__qualname__})
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self._observe(name, key, time.perf_counter() - start)
+            return wrapper
+        return decorate
+
+    def session_rerun(self, session):
+        # Per-session rerun count, bounded to the MAX_SESSIONS latest sessions
+        if not self.enabled:
+            return
+        with self.lock:
+            self.sessions[session] = self.sessions.pop(session, 0) + 1
+            if len(self.sessions) > MAX_SESSIONS:
+                self.sessions.popitem(last=False)
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        # Prometheus text exposition format
+        lines = []
+
+        def header(name, kind):
+            text = self.help.get(name, (kind, ""))[1]
+            if text:
+                lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, list(values)) for key, values in self.histograms.items())
+            sessions = list(self.sessions.items())
+
+        gauges = []
+        for collector in self.collectors:
+            gauges.extend(collector())
+
+        seen = set()
+        for (name, key), value in counters:
+            if name not in seen:
+                header(name, "counter")
+                seen.add(name)
+            lines.append(f"{name}{_format_labels(key)} {value:g}")
+
+        if sessions:
+            header("omok_session_reruns_total", "counter")
+            for session, count in sessions:
+                lines.append(f'omok_session_reruns_total{{session="{session}"}} {count}')
+
+        for (name, key), values in histograms:
+            if name not in seen:
+                header(name, "histogram")
+                seen.add(name)
+            cumulative = 0
+            for bound, count in zip(BUCKETS, values):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(key, [('le', f'{bound:g}')])} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {values[-1]}")
+            lines.append(f"{name}_sum{_format_labels(key)} {values[-2]:.6f}")
+            lines.append(f"{name}_count{_format_labels(key)} {values[-1]}")
+
+        for name, labels, value in gauges:
+            if name not in seen:
+                header(name, "gauge")
+                seen.add(name)
+            lines.append(f"{name}{_format_labels(_label_key(labels))} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Registry()
+METRICS.describe("omok_reruns_total", "counter", "Script reruns by page and trigger")
+METRICS.describe("omok_session_reruns_total", "counter", "Script reruns per browser session")
+METRICS.describe("omok_fragment_runs_total", "counter", "Change-watcher fragment runs by outcome")
+METRICS.describe("omok_page_seconds", "histogram", "Whole-page script run time")
+METRICS.describe("omok_phase_seconds", "histogram", "Time per phase of a page")
+METRICS.describe("omok_server_op_seconds", "histogram", "Room and GameServer operation time, lock waits included")
+
+instrument = functools.partial(METRICS.instrument, "omok_server_op_seconds")
+
+
+class SamplingProfiler:
+    # Statistical profiler: every `interval` seconds a background thread
+    # records the Python stack of every other thread. render() gives the
+    # counts in collapsed-stack format (root first, ';'-separated), ready
+    # for flamegraph tools.
+    def __init__(self, interval=0.01, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.counts = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        own = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.counts[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(self.interval):
+                self._sample()
+
+        self._thread = threading.Thread(target=run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def render(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+def serve(port, registry=METRICS, profiler=None, host="127.0.0.1"):
+    # Serves /metrics (and /profile with a profiler) from a daemon thread.
+    # Loopback only unless the caller names another host: /profile shows
+    # the server's stacks, so a scraper elsewhere has to be opted into.
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] == "/metrics":
+                body = registry.render()
+                content_type = "text/plain; version=0.0.4"
+            elif self.path.split("?")[0] == "/profile" and profiler is not None:
+                body = profiler.render()
+                content_type = "text/plain"
+            else:
+                self.send_error(404)
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass  # Scrapes are not worth a log line each
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=httpd.serve_forever, name="metrics-http", daemon=True).start()
+    return httpd
@@ -0,0 +1,312 @@
+import concurrent.futures
+import multiprocessing
+import os
+import random
+import threading
+import time
+from game_logic import DIRECTIONS, OmokGame
+
+# Computer opponent: iterative-deepening alpha-beta (negamax) over OmokGame,
+# searching only cells near existing stones, with an incrementally updated
+# Zobrist hash and a bounded transposition table. Searches run in a process
+# pool so they never block Streamlit script threads.
+
+AI_PLAYER_NAME = "🤖 Computer"
+DEFAULT_TIME_BUDGET = 1.0  # Seconds per move
+
+WIN_SCORE = 1000000
+INF = 10 * WIN_SCORE
+MATE_PLIES = 1000  # Scores this close to +-WIN_SCORE are wins or losses, less the plies to reach them
+
+# Run value by (length, open ends)
+RUN_SCORES = {
+    (4, 2): 100000, (4, 1): 10000,
+    (3, 2): 5000, (3, 1): 500,
+    (2, 2): 200, (2, 1): 20,
+    (1, 2): 5, (1, 1): 1,
+}
+
+# Transposition table flags
+EXACT, LOWER, UPPER = 0, 1, 2
+
+_zobrist_tables = {}
+
+def _get_zobrist(size):
+    # Fixed seed: every worker process must hash positions identically
+    if size not in _zobrist_tables:
+        rng = random.Random(0x0A1)
+        _zobrist_tables[size] = [(0, rng.getrandbits(64), rng.getrandbits(64)) for _ in range(size * size)]
+    return _zobrist_tables[size]
+
+
+def _score_to_tt(score, ply):
+    # Wins are scored by their distance from the root; the table keeps them
+    # by distance from the stored position, which holds at any ply
+    if score >= WIN_SCORE - MATE_PLIES:
+        return score + ply
+    if score <= MATE_PLIES - WIN_SCORE:
+        return score - ply
+    return score
+
+def _score_from_tt(score, ply):
+    if score >= WIN_SCORE - MATE_PLIES:
+        return score - ply
+    if score <= MATE_PLIES - WIN_SCORE:
+        return score + ply
+    return score
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class Searcher:
+    def __init__(self, game, time_budget=DEFAULT_TIME_BUDGET, tt=None, tt_size=200000,
+                 max_candidates=12, max_depth=20):
+        # game must use a run-index engine ('index' or 'renju'): evaluation reads it
+        self.game = game
+        self.engine = game.engine
+        self.size = game.size
+        self.time_budget = time_budget
+        self.tt = {} if tt is None else tt
+        self.tt_size = tt_size
+        self.max_candidates = max_candidates
+        self.max_depth = max_depth
+        self.zobrist = _get_zobrist(game.size)
+        self.hash = 0
+        for row, col, player in game.history:
+            self.hash ^= self.zobrist[row * self.size + col][player]
+        self.nodes = 0
+        self.deadline = 0
+
+    def search(self):
+        # Returns (row, col, depth reached, score); row/col are None if no move exists
+        self.nodes = 0
+        self.deadline = time.perf_counter() + self.time_budget
+        moves = self.candidates()
+        if not moves:
+            return None, None, 0, 0
+
+        best_move, best_score, depth_reached = moves[0], 0, 0
+        for depth in range(1, self.max_depth + 1):
+            try:
+                score, move = self._root(depth, moves)
+            except SearchTimeout:
+                break
+            if move is not None:
+                best_move, best_score, depth_reached = move, score, depth
+                # Search the previous best first on the next iteration
+                moves = [move] + [m for m in moves if m != move]
+            if abs(best_score) >= WIN_SCORE - self.max_depth:
+                break
+        return best_move[0], best_move[1], depth_reached, best_score
+
+    def _root(self, depth, moves):
+        alpha = -INF
+        best_move = None
+        for move in moves:
+            score = self._try_move(move, depth, alpha, INF, 1)
+            if score is None:
+                continue
+            if score > alpha or best_move is None:
+                alpha = score
+                best_move = move
+        return alpha, best_move
+
+    def _try_move(self, move, depth, alpha, beta, ply):
+        # Score of `move` for the side making it, or None if it is illegal
+        game = self.game
+        row, col = move
+        player = game.current_turn
+        success, _ = game.place_stone(row, col)
+        if not success:
+            return None
+        key = self.zobrist[row * self.size + col][player]
+        self.hash ^= key
+        try:
+            if game.winner is not None:
+                return WIN_SCORE - ply
+            return -self._negamax(depth - 1, -beta, -alpha, ply + 1)
+        finally:
+            game.undo_move()
+            self.hash ^= key
+
+    def _negamax(self, depth, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes & 1023 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        alpha_orig = alpha
+        tt_move = None
+        entry = self.tt.get(self.hash)
+        if entry is not None:
+            tt_depth, tt_score, tt_flag, tt_move = entry
+            tt_score = _score_from_tt(tt_score, ply)
+            if tt_depth >= depth:
+                if tt_flag == EXACT:
+                    return tt_score
+                if tt_flag == LOWER:
+                    alpha = max(alpha, tt_score)
+                elif tt_flag == UPPER:
+                    beta = min(beta, tt_score)
+                if alpha >= beta:
+                    return tt_score
+
+        if depth <= 0:
+            return self.evaluate()
+
+        best_score = -INF
+        best_move = None
+        for move in self.candidates(tt_move):
+            score = self._try_move(move, depth, alpha, beta, ply)
+            if score is None:
+                continue
+            if score > best_score:
+                best_score = score
+                best_move = move
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+
+        if best_move is None:
+            return 0  # No legal move: draw
+
+        if len(self.tt) >= self.tt_size:
+            self.tt.clear()
+        if best_score <= alpha_orig:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.tt[self.hash] = (depth, _score_to_tt(best_score, ply), flag, best_move)
+        return best_score
+
+    def candidates(self, first=None):
+        # Empty cells within two of a stone, best-looking first
+        game = self.game
+        size = self.size
+        cells = self.engine.cells
+        if not game.history:
+            return [(size // 2, size // 2)]
+
+        seen = set()
+        for row, col, _ in game.history:
+            for r in range(max(0, row - 2), min(size, row + 3)):
+                base = r * size
+                for c in range(max(0, col - 2), min(size, col + 3)):
+                    if cells[base + c] == 0:
+                        seen.add(base + c)
+
+        scored = sorted(seen, key=self._move_priority, reverse=True)[:self.max_candidates]
+        moves = [divmod(pos, size) for pos in scored]
+        if first is not None and first in moves:
+            moves.remove(first)
+            moves.insert(0, first)
+        return moves
+
+    def _move_priority(self, pos):
+        # Longest adjacent runs (either colour) through the cell, cubed so one
+        # strong line beats several weak ones
+        engine = self.engine
+        cells = engine.cells
+        total = 0
+        for k in range(len(DIRECTIONS)):
+            run_len = engine.run_len[k]
+            q_back = engine.prv[k][pos]
+            q_fwd = engine.nxt[k][pos]
+            back = cells[q_back] if q_back >= 0 else 0
+            fwd = cells[q_fwd] if q_fwd >= 0 else 0
+            for player in (1, 2):
+                length = 0
+                if back == player:
+                    length += run_len[q_back]
+                if fwd == player:
+                    length += run_len[q_fwd]
+                total += length ** 3
+        return total
+
+    def evaluate(self):
+        # Static score for the side to move: sum of run values, own minus opponent's
+        engine = self.engine
+        cells = engine.cells
+        size = self.size
+        scores = {1: 0, 2: 0}
+        for row, col, player in self.game.history:
+            pos = row * size + col
+            for k, (dr, dc) in enumerate(DIRECTIONS):
+                if engine.run_head[k][pos] != 0:
+                    continue  # Count each run once, from its first stone
+                length = engine.run_len[k][pos]
+                if length >= 5:
+                    scores[player] += WIN_SCORE
+                    continue
+                open_ends = 0
+                q = engine.prv[k][pos]
+                if q >= 0 and cells[q] == 0:
+                    open_ends += 1
+                er, ec = row + length * dr, col + length * dc
+                if 0 <= er < size and 0 <= ec < size and cells[er * size + ec] == 0:
+                    open_ends += 1
+                scores[player] += RUN_SCORES.get((length, open_ends), 0)
+
+        me = self.game.current_turn
+        return scores[me] - scores[3 - me]
+
+
+# Per-process transposition tables, kept between searches in a worker. One
+# per board size: the Zobrist keys of different sizes are not independent.
+_worker_tts = {}
+
+def search_move(history, time_budget=DEFAULT_TIME_BUDGET, size=15):
+    # Process-pool entry point: rebuild the position from its move list and search.
+    # Returns (row, col, depth, nodes, seconds).
+    game = OmokGame(size)
+    board = [[0] * size for _ in range(size)]
+    for row, col, player in history:
+        board[row][col] = player
+    current_turn = 3 - history[-1][2] if history else 1
+    game.load(board, history, None, current_turn)
+
+    start = time.perf_counter()
+    searcher = Searcher(game, time_budget, tt=_worker_tts.setdefault(size, {}))
+    row, col, depth, _ = searcher.search()
+    return row, col, depth, searcher.nodes, time.perf_counter() - start
+
+
+def fallback_move(game):
+    # Move played when no search result comes back: the legal cell nearest
+    # the last stone (the centre on an empty board), or (None, None)
+    rows, cols = game.legal_moves().nonzero()
+    if not len(rows):
+        return None, None
+    row, col = game.history[-1][:2] if game.history else (game.size // 2, game.size // 2)
+    return min(zip(rows.tolist(), cols.tolist()), key=lambda cell: (max(abs(cell[0] - row), abs(cell[1] - col)), cell))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    # Shared by every room; forkserver avoids forking a threaded Streamlit process
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            workers = max(1, min(4, (os.cpu_count() or 2) - 1))
+            _pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        return _pool
+
+def request_move(history, time_budget=DEFAULT_TIME_BUDGET, size=15):
+    # Returns a Future resolving to search_move's result
+    global _pool
+    pool = get_pool()
+    try:
+        return pool.submit(search_move, list(history), time_budget, size)
+    except concurrent.futures.process.BrokenProcessPool:
+        # A worker died; start a fresh pool once
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        return get_pool().submit(search_move, list(history), time_budget, size)
@@ -0,0 +1,169 @@
+import numpy as np
+
+# Precomputed Renju line-pattern tables.
+#
+# A line pattern is the 11 cells centred on a move along one direction, read
+# as a base-3 number (cell i has weight 3**i): 0 empty, 1 own stone, 2
+# opponent stone or off the board. The centre (i = 5) is the move itself.
+# LINE_KIND gives what the pattern makes for the owner of the centre stone and
+# LINE_FOURS how many fours it holds (X.XXX.X is two fours in one line).
+#
+# +-5 cells is as far as any of it can look: a five through the centre lies
+# within +-4, and telling it from an overline takes the cell past each end.
+# So the tables agree with reading the whole line. An open three is a three
+# that one move turns into a straight four; whether that move would itself be
+# forbidden is not checked.
+
+WINDOW = 11
+CENTER = 5
+WEIGHTS = [3 ** i for i in range(WINDOW)]
+SIDE_WEIGHTS = [(i - CENTER, WEIGHTS[i]) for i in range(WINDOW) if i != CENTER]  # (offset, weight)
+PATTERN_COUNT = 3 ** WINDOW
+
+# Window digit of each cell value (0 empty, 1 Black, 2 White, 3 off the
+# board) with player 1 or 2 as the owner, at [player - 1][value]
+OFF_BOARD = 3
+DIGITS = ((0, 1, 2, 2), (0, 2, 1, 2))
+
+# The same as floats, flat at [4 * (player - 1) + value], so window_codes'
+# weighted sum is one BLAS product (codes stay far below 2**53)
+_FLAT_DIGITS = np.array(DIGITS, dtype=np.float64).ravel()
+_FLOAT_WEIGHTS = np.array(WEIGHTS, dtype=np.float64)
+
+NONE, THREE, FOUR, OPEN_FOUR, FIVE, OVERLINE = range(6)
+KIND_NAMES = ['none', 'open three', 'four', 'open four', 'five', 'overline']
+
+
+def window_codes(windows, players):
+    # Codes of the windows of cell values along the last axis (WINDOW cells,
+    # centre at CENTER) with players as the owner: 1 or 2, or an int array
+    # broadcasting against windows[..., 0]
+    offsets = 4 * (np.asarray(players, dtype=np.intp) - 1)
+    digits = np.take(_FLAT_DIGITS, windows + offsets[..., None])
+    return (digits @ _FLOAT_WEIGHTS).astype(np.intp)
+
+
+def _run_length(cells, i):
+    # Own stones in the contiguous run through cell i
+    length = 1
+    j = i - 1
+    while j >= 0 and cells[j] == 1:
+        length += 1
+        j -= 1
+    j = i + 1
+    while j < WINDOW and cells[j] == 1:
+        length += 1
+        j += 1
+    return length
+
+def _five_points(cells):
+    # Empty cells that would turn the centre's line into exactly five
+    points = []
+    for e in range(WINDOW):
+        if cells[e] != 0:
+            continue
+        cells[e] = 1
+        if _run_length(cells, CENTER) == 5:
+            points.append(e)
+        cells[e] = 0
+    return points
+
+def _four_kind(cells, points):
+    # (kind, fours) for a line with at least one five point
+    if len(points) == 2 and points[1] - points[0] == 5:
+        return OPEN_FOUR, 1  # .XXXX. is a single (straight) four
+    return FOUR, len(points)
+
+def classify(cells):
+    # (kind, fours) for the owner of the centre stone; cells is a list of WINDOW digits
+    run = _run_length(cells, CENTER)
+    if run >= 6:
+        return OVERLINE, 0
+    if run == 5:
+        return FIVE, 0
+
+    points = _five_points(cells)
+    if points:
+        return _four_kind(cells, points)
+
+    # Open three: one more stone makes a straight four through the centre
+    if sum(1 for v in cells if v == 1) >= 3:
+        for e in range(WINDOW):
+            if cells[e] != 0:
+                continue
+            cells[e] = 1
+            if _run_length(cells, CENTER) < 5:
+                points = _five_points(cells)
+                if points and _four_kind(cells, points)[0] == OPEN_FOUR:
+                    cells[e] = 0
+                    return THREE, 0
+            cells[e] = 0
+    return NONE, 0
+
+def _runs(own):
+    # Length of the own-stone run through the centre of each row of `own`
+    forward = np.cumprod(own[:, CENTER + 1:], axis=1).sum(axis=1)
+    backward = np.cumprod(own[:, CENTER - 1::-1], axis=1).sum(axis=1)
+    return 1 + forward + backward
+
+def _five_masks(own, empty):
+    # [pattern, e]: placing on empty cell e makes exactly five through the centre
+    points = np.zeros(own.shape, dtype=bool)
+    for e in range(WINDOW):
+        if e == CENTER:
+            continue
+        placed = own.copy()
+        placed[:, e] = True
+        points[:, e] = empty[:, e] & (_runs(placed) == 5)
+    return points
+
+def _open_fours(points):
+    # classify's OPEN_FOUR test on five-point masks: exactly two, 5 apart
+    count = points.sum(axis=1)
+    first = points.argmax(axis=1)
+    last = WINDOW - 1 - points[:, ::-1].argmax(axis=1)
+    return (count == 2) & (last - first == 5)
+
+def build_tables():
+    # classify for every pattern with an own centre stone, a column at a time
+    codes = np.arange(PATTERN_COUNT)
+    cells = (codes[:, None] // np.array(WEIGHTS)[None, :]) % 3
+    codes = codes[cells[:, CENTER] == 1]
+    cells = cells[cells[:, CENTER] == 1]
+    own = cells == 1
+    empty = cells == 0
+
+    run = _runs(own)
+    points = _five_masks(own, empty)
+    four_count = points.sum(axis=1)
+    open_four = _open_fours(points)
+
+    three = np.zeros(len(codes), dtype=bool)
+    candidates = (run < 5) & (four_count == 0) & (own.sum(axis=1) >= 3)
+    for e in range(WINDOW):
+        if e == CENTER:
+            continue
+        todo = candidates & empty[:, e] & ~three
+        placed = own[todo].copy()
+        placed[:, e] = True
+        still_empty = empty[todo].copy()
+        still_empty[:, e] = False
+        made = (_runs(placed) < 5) & _open_fours(_five_masks(placed, still_empty))
+        three[np.flatnonzero(todo)[made]] = True
+
+    kind = np.full(len(codes), NONE, dtype=np.int8)
+    kind[three] = THREE
+    kind[four_count > 0] = FOUR
+    kind[open_four] = OPEN_FOUR
+    kind[run == 5] = FIVE
+    kind[run >= 6] = OVERLINE
+    fours = np.where(kind == FOUR, four_count, np.where(kind == OPEN_FOUR, 1, 0))
+
+    kinds = np.zeros(PATTERN_COUNT, dtype=np.int8)
+    line_fours = np.zeros(PATTERN_COUNT, dtype=np.int8)
+    kinds[codes] = kind
+    line_fours[codes] = fours
+    return kinds, line_fours
+
+# About 0.3 s, once per process; classify is the same rules one pattern at a time
+LINE_KIND, LINE_FOURS = build_tables()
@@ -0,0 +1,121 @@
+import numpy as np
+from game_logic import DENSE_MAX_SIZE, sparse_viewport
+
+# Review of a played game: any position by move number, and every position
+# in order.
+#
+# The board after every `every` moves is kept as a keyframe; the moves are
+# the deltas between them. seek(n) starts from the keyframe before n, the one
+# after it or the position last sought, whichever is nearest, so it writes at
+# most `every` stones (every / 2 from a keyframe) plus one keyframe copy.
+# Dense games are kept whole; sparse ones (larger than DENSE_MAX_SIZE or
+# unbounded) over the rectangle their stones cover.
+
+DEFAULT_EVERY = 16
+
+
+class Replay:
+    def __init__(self, history, size=15, every=DEFAULT_EVERY):
+        self.size = size
+        self.every = every
+        self.moves = [tuple(move) for move in history]
+
+        if size is not None and size <= DENSE_MAX_SIZE:
+            top, left, rows, cols = 0, 0, size, size
+            self._bounds = None
+        else:
+            top, left, rows, cols = self._extent()
+        self.origin = (top, left)
+        self.shape = (rows, cols)
+        self._cells = [(row - top) * cols + (col - left) for row, col, _ in self.moves]
+        self._players = [player for _, _, player in self.moves]
+
+        # keyframes[i]: the board after i * every moves
+        count = len(self.moves) // every + 1
+        self.keyframes = np.zeros((count, rows, cols), dtype=np.int8)
+        board = np.zeros(rows * cols, dtype=np.int8)
+        for n, (cell, player) in enumerate(zip(self._cells, self._players), 1):
+            board[cell] = player
+            if n % every == 0:
+                self.keyframes[n // every] = board.reshape(rows, cols)
+
+        self._board = self.keyframes[0].copy()
+        self._flat = self._board.reshape(-1)
+        self._view = self._board.view()
+        self._view.setflags(write=False)
+        self.cursor = 0  # Move number self._board shows
+
+    def _extent(self):
+        # Rectangle covering every stone; also records the stones' bounds
+        # after each move for sparse viewports
+        self._bounds = [None]
+        bounds = None
+        for row, col, _ in self.moves:
+            if bounds is None:
+                bounds = (row, col, row, col)
+            else:
+                bounds = (min(bounds[0], row), min(bounds[1], col), max(bounds[2], row), max(bounds[3], col))
+            self._bounds.append(bounds)
+        if bounds is None:
+            return 0, 0, 1, 1
+        top, left, bottom, right = bounds
+        return top, left, bottom - top + 1, right - left + 1
+
+    def __len__(self):
+        # Positions, from the empty board to the last move
+        return len(self.moves) + 1
+
+    def seek(self, n):
+        # The board after n moves, as a read-only array covering self.shape
+        # from self.origin. It is the replay's own buffer: the next seek
+        # changes it, so copy it to keep it.
+        if not 0 <= n <= len(self.moves):
+            raise IndexError("move number out of range")
+        every = self.every
+        # Stone writes from each start; a keyframe also costs a copy
+        before = n // every * every
+        after = before + every
+        start, cost = self.cursor, abs(n - self.cursor)
+        if n - before + 1 < cost:
+            start, cost = before, n - before + 1
+        if after <= len(self.moves) and after - n + 1 < cost:
+            start = after
+        if start != self.cursor:
+            self._board[...] = self.keyframes[start // every]
+
+        flat = self._flat
+        cells = self._cells
+        for i in range(start, n):
+            flat[cells[i]] = self._players[i]
+        for i in range(start - 1, n - 1, -1):
+            flat[cells[i]] = 0
+        self.cursor = n
+        return self._view
+
+    def positions(self, start=0, stop=None):
+        # Yields (n, board) for n = start..stop (the last move by default),
+        # advancing the one shared board a stone at a time, as in seek()
+        stop = len(self.moves) if stop is None else stop
+        for n in range(start, stop + 1):
+            yield n, self.seek(n)
+
+    def viewport(self, n):
+        # (top, left, side) of the square to draw for position n, chosen as
+        # a live game of the same size would choose it
+        if self._bounds is None:
+            return 0, 0, self.size
+        last = self.moves[n - 1] if n else None
+        return sparse_viewport(self.size, self._bounds[n], last)
+
+    def window(self, n, top, left, side):
+        # Copy of a side x side square of position n; cells outside the
+        # stored rectangle are empty
+        board = self.seek(n)
+        out = np.zeros((side, side), dtype=np.int8)
+        r0, c0 = top - self.origin[0], left - self.origin[1]
+        rows, cols = self.shape
+        src_r = slice(max(r0, 0), min(r0 + side, rows))
+        src_c = slice(max(c0, 0), min(c0 + side, cols))
+        if src_r.start < src_r.stop and src_c.start < src_c.stop:
+            out[src_r.start - r0:src_r.stop - r0, src_c.start - c0:src_c.stop - c0] = board[src_r, src_c]
+        return out
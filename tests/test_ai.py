@@ -0,0 +1,63 @@
+import concurrent.futures
+
+import game_server
+import omok_ai
+from game_logic import OmokGame
+from game_server import GameServer
+from omok_ai import AI_PLAYER_NAME, WIN_SCORE, Searcher
+
+
+def failed_future():
+    future = concurrent.futures.Future()
+    future.set_exception(RuntimeError("worker died"))
+    return future
+
+
+def test_failed_search_is_retried_then_falls_back(monkeypatch):
+    requests = []
+    def request_move(history, time_budget, size):
+        requests.append(len(history))
+        return failed_future()
+    monkeypatch.setattr(game_server, "request_move", request_move)
+
+    server = GameServer()
+    room = server.get_room(server.create_room("vs computer", "alice"))
+    room.add_ai()
+    room.toggle_ready(1)
+    room.place_stone(7, 7)
+
+    assert requests == [1] * (1 + game_server.AI_RETRIES)
+    history = list(room.game.history)
+    assert len(history) == 2 and history[1][2] == 2
+    assert max(abs(history[1][0] - 7), abs(history[1][1] - 7)) == 1  # Next to the last stone
+    assert room.players[2] == AI_PLAYER_NAME
+
+
+def test_fallback_move():
+    game = OmokGame(15)
+    assert omok_ai.fallback_move(game) == (7, 7)
+    game.place_stone(0, 0)
+    assert omok_ai.fallback_move(game) == (0, 1)
+
+
+def test_win_scores_in_the_table_are_relative():
+    # White to move against an open four: after any White move Black wins at
+    # once. Those positions are two plies from the root, but a table entry
+    # must score them as a win next move, so it holds wherever they recur
+    game = OmokGame(15, engine='index')
+    for col in range(4):
+        game.place_stone(7, 4 + col)
+        if col < 3:
+            game.place_stone(0, 3 + col * 2)
+    tt = {}
+    _, _, depth, score = Searcher(game, time_budget=5, tt=tt, max_depth=2).search()
+    assert depth == 2 and score == -(WIN_SCORE - 2)
+    wins = [entry for entry in tt.values() if entry[0] == 1]
+    assert wins and all(entry[1] == WIN_SCORE for entry in wins)
+
+
+def test_tables_per_board_size(monkeypatch):
+    monkeypatch.setattr(omok_ai, "_worker_tts", {})
+    omok_ai.search_move([(7, 7, 1)], time_budget=0.05, size=15)
+    omok_ai.search_move([(9, 9, 1)], time_budget=0.05, size=19)
+    assert set(omok_ai._worker_tts) == {15, 19}
@@ -0,0 +1,58 @@
+from game_clock import TimeControl, time_left
+from game_server import GameServer
+
+
+def timed_room(server, control, black="alice", white="bob"):
+    room = server.get_room(server.create_room("timed", black, time_control=control))
+    room.join(white)
+    room.toggle_ready(1)
+    room.toggle_ready(2)
+    return room
+
+
+def test_timeout_sets_the_winner():
+    server = GameServer()
+    room = timed_room(server, TimeControl(10))
+    deadline = room.clock.deadline()
+    assert server.clocks.tick(deadline - 1) == 0
+    assert room.game.winner is None
+    assert server.clocks.tick(deadline + 0.01) == 1
+    assert room.game.winner == 2 and room.clock.flagged == 1
+    assert room.clock.turn is None  # Stopped with the game
+    assert room.place_stone(7, 7)[0] is False
+
+
+def test_move_hands_the_clock_over():
+    server = GameServer()
+    room = timed_room(server, TimeControl(10, increment=2))
+    started = room.clock.started
+    room.place_stone(7, 7)
+    state = room.snapshot().clock
+    assert state.turn == 2
+    main, _, _ = time_left(state, 1)
+    assert 10 < main <= 12 - (state.started - started) + 1e-6  # Increment added
+    assert server.clocks.tick(room.clock.deadline() + 0.01) == 1
+    assert room.game.winner == 1 and room.clock.flagged == 2
+
+
+def test_timed_room_restored_from_journal(tmp_path):
+    path = str(tmp_path / "omok.journal")
+    server = GameServer(journal_path=path)
+    control = TimeControl(300, byoyomi=30, periods=3)
+    room = timed_room(server, control)
+    room.place_stone(7, 7)
+    room.place_stone(8, 8)
+    flagged = timed_room(server, TimeControl(5), "carol", "dave").id
+    server.get_room(flagged).time_out(1)
+    server.close()
+
+    server = GameServer(journal_path=path)
+    try:
+        restored = server.get_room(room.id)
+        assert restored.clock is not None and restored.clock.control == control
+        assert restored.clock.turn == 1 and len(restored.game.history) == 2
+        assert server.clocks.next_deadline() is not None  # Running again
+        lost = server.get_room(flagged)
+        assert lost.game.winner == 2 and lost.clock.flagged == 1
+    finally:
+        server.close()
@@ -0,0 +1,62 @@
+import os
+import stat
+
+import pytest
+
+from cluster import KEY_FILE, ClusterServer, RoomNotFound
+
+
+@pytest.fixture
+def workers(tmp_path, monkeypatch):
+    # Two workers in one process, sharing a cluster directory
+    monkeypatch.delenv("OMOK_CLUSTER_KEY", raising=False)
+    servers = [ClusterServer(str(tmp_path), worker_id) for worker_id in ("w0", "w1")]
+    yield servers
+    for server in servers:
+        server.close()
+
+
+def test_key_file_is_private(tmp_path, workers):
+    path = tmp_path / KEY_FILE
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert workers[0].authkey == workers[1].authkey
+    os.chmod(path, 0o644)
+    with pytest.raises(PermissionError):
+        ClusterServer(str(tmp_path), "w2")
+
+
+def test_list_rooms_pages_across_workers(workers):
+    first, second = workers
+    for i in range(5):
+        first.create_room(f"w0-{i}", f"w0-p{i}")
+    for i in range(7):
+        second.create_room(f"w1-{i}", f"w1-p{i}")
+    names = []
+    for page in range(4):
+        rooms, total = first.list_rooms(page=page, page_size=4)
+        assert total == 12
+        names += [summary.name for summary in rooms]
+    assert names == [f"w0-{i}" for i in range(5)] + [f"w1-{i}" for i in range(7)]
+
+
+def test_vanished_room_is_not_found(workers):
+    first, second = workers
+    room_id = second.create_room("gone", "ghost")
+    room = first.get_room(room_id)
+    assert room.snapshot().name == "gone"
+    second.leave_room(room_id, "ghost")  # Its last player leaves: the room is closed
+    with pytest.raises(RoomNotFound):
+        room.snapshot()
+    with pytest.raises(RoomNotFound):
+        room.place_stone(7, 7)
+    assert first.get_room(room_id) is None
+
+
+def test_version_tracks_each_worker(workers):
+    first, second = workers
+    version = first.version
+    assert [worker for worker, _ in version] == ["w0", "w1"]
+    second.create_room("there", "remote")
+    changed = first.wait_for_change(version, timeout=2)
+    assert dict(changed)["w1"] > dict(version)["w1"]
+    assert dict(changed)["w0"] == dict(version)["w0"]
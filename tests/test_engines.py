@@ -0,0 +1,102 @@
+import random
+
+import numpy as np
+import pytest
+
+from game_logic import OmokGame
+
+# The classic-rule engines behind OmokGame answer every question the same way
+CLASSIC = ['array', 'bitboard', 'index']
+SIZE = 15
+
+
+def random_cell(rng, game):
+    # Mostly next to an earlier stone, so lines and threes actually form
+    if game.history and rng.random() < 0.8:
+        row, col, _ = rng.choice(list(game.history))
+        return (min(SIZE - 1, max(0, row + rng.randint(-2, 2))),
+                min(SIZE - 1, max(0, col + rng.randint(-2, 2))))
+    return rng.randrange(SIZE), rng.randrange(SIZE)
+
+
+def empty_cells(game):
+    return [(int(r), int(c)) for r, c in zip(*(game.board == 0).nonzero())]
+
+
+def assert_same(games):
+    first = games[0]
+    reasons = [[first.engine.forbidden_reason(r, c) for r, c in empty_cells(first)]]
+    for game in games[1:]:
+        assert (game.board == first.board).all()
+        assert game.winner == first.winner
+        assert game.current_turn == first.current_turn
+        assert list(game.history) == list(first.history)
+        assert (game.engine.forbidden_mask() == first.engine.forbidden_mask()).all()
+        assert (game.forbidden_moves() == first.forbidden_moves()).all()
+        assert (game.legal_moves() == first.legal_moves()).all()
+        reasons.append([game.engine.forbidden_reason(r, c) for r, c in empty_cells(game)])
+    assert all(r == reasons[0] for r in reasons)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_engines_agree(seed):
+    rng = random.Random(seed)
+    games = [OmokGame(SIZE, engine=engine) for engine in CLASSIC]
+    first = games[0]
+    for step in range(300):
+        if first.winner is not None and rng.random() < 0.5:
+            for game in games:
+                game.reset()
+        elif first.history and rng.random() < 0.15:
+            assert len({game.undo_move() for game in games}) == 1
+        else:
+            row, col = random_cell(rng, first)
+            if first.board[row, col] == 0:
+                assert len({game.check_forbidden_33(row, col) for game in games}) == 1
+            assert len({game.place_stone(row, col) for game in games}) == 1
+        if step % 10 == 0 or first.winner is not None:
+            assert_same(games)
+    assert_same(games)
+
+
+def test_engines_agree_after_load():
+    rng = random.Random(0)
+    source = OmokGame(SIZE, engine='array')
+    while source.winner is None and len(source.history) < 60:
+        source.place_stone(*random_cell(rng, source))
+    games = []
+    for engine in CLASSIC:
+        game = OmokGame(SIZE, engine=engine)
+        game.load(source.board.copy(), list(source.history), source.winner, source.current_turn)
+        games.append(game)
+    assert_same(games)
+    assert np.array_equal(games[0].board, source.board)
+
+
+@pytest.mark.parametrize('engine', ['array', 'bitboard', 'index', 'renju'])
+def test_load_then_play(engine):
+    # A loaded game rebuilds its engine on first use: moves and undos right
+    # after load() must leave it as if every move had been played
+    rng = random.Random(1)
+    source = OmokGame(SIZE, engine=engine)
+    while len(source.history) < 40:
+        source.place_stone(*random_cell(rng, source))
+        if source.winner is not None:
+            source.undo_move()
+    history = list(source.history)
+    for cut in (10, 25):
+        played = OmokGame(SIZE, engine=engine)
+        for row, col, _ in history[:cut]:
+            played.place_stone(row, col)
+        loaded = OmokGame(SIZE, engine=engine)
+        loaded.load(played.board.copy(), history[:cut], None, played.current_turn)
+        loaded.undo_move()
+        played.undo_move()
+        for row, col, _ in history[cut - 1:]:
+            assert loaded.place_stone(row, col) == played.place_stone(row, col)
+        assert_same([played, loaded])
+        if engine in ('index', 'renju'):
+            assert loaded.engine.run_len == played.engine.run_len
+            assert loaded.engine.run_head == played.engine.run_head
+        if engine == 'renju':
+            assert loaded.engine.codes == played.engine.codes
@@ -0,0 +1,117 @@
+import random
+
+import pytest
+
+from game_clock import TimeControl
+from game_server import GameServer
+
+SNAPSHOT_EVERY = 8
+
+
+def room_state(room):
+    game = room.game
+    return (dict(room.players), list(room.spectators), dict(room.ready_state), room.pending_request,
+            list(game.history), game.winner, game.current_turn, game.board.tolist())
+
+
+def restored(path, room_id):
+    server = GameServer(journal_path=path)
+    try:
+        return room_state(server.get_room(room_id))
+    finally:
+        server.close()
+
+
+def open_room(path):
+    server = GameServer(journal_path=path)
+    server.journal.snapshot_every = SNAPSHOT_EVERY
+    room_id = server.create_room("room", "alice")
+    room = server.get_room(room_id)
+    room.join("bob")
+    return server, room
+
+
+def pad(room, count):
+    # `count` journaled events that leave the room as it was
+    for _ in range(count):
+        room.toggle_ready(1)
+    if count % 2:
+        room.toggle_ready(1)
+
+
+# Every offset lands the snapshot on the action under test once
+
+@pytest.mark.parametrize("padding", range(SNAPSHOT_EVERY + 1))
+def test_swap_survives_snapshot(tmp_path, padding):
+    path = str(tmp_path / "omok.journal")
+    server, room = open_room(path)
+    pad(room, padding)
+    room.swap_players()
+    live = room_state(room)
+    server.close()
+    assert live[0] == {1: "bob", 2: "alice"}
+    assert restored(path, room.id) == live
+
+
+@pytest.mark.parametrize("padding", range(SNAPSHOT_EVERY + 1))
+def test_requested_swap_survives_snapshot(tmp_path, padding):
+    path = str(tmp_path / "omok.journal")
+    server, room = open_room(path)
+    pad(room, padding)
+    room.make_request("alice", "SWAP")
+    room.resolve_request(True)
+    live = room_state(room)
+    server.close()
+    assert live[0] == {1: "bob", 2: "alice"}
+    assert restored(path, room.id) == live
+
+
+@pytest.mark.parametrize("padding", range(SNAPSHOT_EVERY + 1))
+def test_undo_survives_snapshot(tmp_path, padding):
+    path = str(tmp_path / "omok.journal")
+    server, room = open_room(path)
+    room.toggle_ready(1)
+    room.toggle_ready(2)
+    room.place_stone(7, 7)
+    room.place_stone(7, 8)
+    pad(room, padding)
+    room.make_request("bob", "UNDO")
+    room.resolve_request(True)
+    live = room_state(room)
+    server.close()
+    assert live[4] == [(7, 7, 1)]
+    assert restored(path, room.id) == live
+
+
+def test_resolve_bumps_version_once(tmp_path):
+    server, room = open_room(str(tmp_path / "omok.journal"))
+    room.place_stone(7, 7)
+    room.make_request("alice", "UNDO")
+    version = room.version
+    room.resolve_request(True)
+    assert room.version == version + 1
+    server.close()
+
+
+@pytest.mark.parametrize("moves", [SNAPSHOT_EVERY - 4, 3 * SNAPSHOT_EVERY])
+def test_restore_replays_from_last_snapshot(tmp_path, moves):
+    # Events before a snapshot are skipped on restore; the time control,
+    # which snapshots do not hold, must still come back
+    path = str(tmp_path / "omok.journal")
+    server, room = open_room(path)
+    room.set_time_control(TimeControl(300, byoyomi=30, periods=3))
+    room.toggle_ready(1)
+    room.toggle_ready(2)
+    rng = random.Random(moves)
+    while len(room.game.history) < moves and room.game.winner is None:
+        room.place_stone(rng.randrange(15), rng.randrange(15))
+    live = room_state(room)
+    server.close()
+
+    server = GameServer(journal_path=path)
+    try:
+        again = server.get_room(room.id)
+        assert room_state(again) == live
+        assert again.clock.control == TimeControl(300, byoyomi=30, periods=3)
+    finally:
+        server.close()
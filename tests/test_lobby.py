@@ -0,0 +1,68 @@
+from game_server import GameServer
+
+
+def seated_room(server, black, white):
+    room = server.get_room(server.create_room(f"{black} vs {white}", black))
+    room.join(white)
+    room.toggle_ready(1)
+    room.toggle_ready(2)
+    return room
+
+
+def test_moves_leave_the_lobby_version_alone():
+    server = GameServer()
+    room = seated_room(server, "alice", "bob")
+    version = server.version
+    room.place_stone(7, 7)
+    room.place_stone(7, 8)
+    assert server.version == version
+    assert server.wait_for_change(version, timeout=0) == version
+
+
+def test_summary_changes_bump_the_lobby_version():
+    server = GameServer()
+    room = seated_room(server, "alice", "bob")
+    version = server.version
+    room.join("carol")  # A spectator shows in the summary
+    assert server.version > version
+    version = server.version
+    for col in range(5):
+        room.place_stone(7, col)
+        if col < 4:
+            room.place_stone(8, col)
+    assert server.list_rooms()[0][0].status == 'finished'
+    assert server.version > version
+
+
+def test_pages_and_status_counts():
+    server = GameServer()
+    open_ids = [server.create_room(f"open {i}", f"host{i}") for i in range(5)]
+    playing = [seated_room(server, f"b{i}", f"w{i}") for i in range(3)]
+    assert server.count_rooms() == 8
+    assert server.count_rooms('open') == 5 and server.count_rooms('playing') == 3
+    assert server.count_rooms('finished') == 0
+
+    pages = [server.list_rooms(page=page, page_size=3) for page in range(4)]
+    assert [total for _, total in pages] == [8] * 4
+    assert [len(rooms) for rooms, _ in pages] == [3, 3, 2, 0]
+    listed = [summary.id for rooms, _ in pages for summary in rooms]
+    assert listed == open_ids + [room.id for room in playing]  # Creation order
+
+    rooms, total = server.list_rooms('open', page=1, page_size=3)
+    assert total == 5 and [summary.id for summary in rooms] == open_ids[3:]
+
+    # A room moves between the status lists as its game goes on
+    room = playing[0]
+    for col in range(5):
+        room.place_stone(7, col)
+        if col < 4:
+            room.place_stone(8, col)
+    assert server.count_rooms('playing') == 2 and server.count_rooms('finished') == 1
+    assert [summary.id for summary in server.list_rooms('finished')[0]] == [room.id]
+    server.get_room(open_ids[0]).join("guest")
+    assert server.count_rooms('open') == 4 and server.count_rooms('playing') == 3
+    assert [summary.id for summary in server.list_rooms('playing')[0]][-1] == open_ids[0]
+
+    server.leave_room(open_ids[1], "host1")  # Empty: removed
+    assert server.count_rooms() == 7 and server.count_rooms('open') == 3
+    assert open_ids[1] not in [summary.id for summary in server.list_rooms(page_size=10)[0]]
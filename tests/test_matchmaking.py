@@ -0,0 +1,79 @@
+import random
+
+from game_server import GameServer
+from matchmaking import MatchQueue
+
+
+def queue_pair(server, black, white, now=0.0):
+    # A queue holding `black` (rated lower) and `white`, close enough to pair
+    queue = MatchQueue(server)
+    queue.enqueue(black, 1500, now=now)
+    queue.enqueue(white, 1550, now=now)
+    return queue
+
+
+def test_pair_is_seated():
+    server = GameServer()
+    queue = queue_pair(server, "alice", "bob")
+    assert queue.tick(now=1.0) == [("alice", "bob")]
+    room_id = queue.status("alice", now=1.0).room_id
+    assert room_id is not None and queue.status("bob", now=1.0).room_id == room_id
+    assert server.get_room(room_id).players == {1: "alice", 2: "bob"}
+    assert queue.failure("alice") is None
+
+
+def test_black_in_a_room_requeues_white():
+    server = GameServer()
+    elsewhere = server.create_room("elsewhere", "alice")
+    queue = queue_pair(server, "alice", "bob")
+    queue.tick(now=5.0)
+
+    assert server.find_player("alice") == (elsewhere, 1)
+    assert server.find_player("bob") is None
+    assert queue.status("alice", now=5.0) is None
+    assert "already in a room" in queue.failure("alice")
+    assert queue.failure("alice") is None  # Reported once
+    assert "still searching" in queue.failure("bob")
+    status = queue.status("bob", now=5.0)
+    assert status.room_id is None and status.waited == 5.0  # Waiting time kept
+    assert queue.stats['failed'] == 1
+
+
+def test_white_in_a_room_requeues_black():
+    server = GameServer()
+    elsewhere = server.create_room("elsewhere", "bob")
+    queue = queue_pair(server, "alice", "bob")
+    rooms = server.count_rooms()
+    queue.tick(now=1.0)
+
+    assert server.count_rooms() == rooms  # The half-seated room is gone
+    assert server.find_player("alice") is None
+    assert server.find_player("bob") == (elsewhere, 1)
+    assert "already in room 'elsewhere'" in queue.failure("bob")
+    assert queue.status("alice", now=1.0).room_id is None
+
+    # Alice is matched with the next player who comes along
+    queue.enqueue("carol", 1520, now=2.0)
+    queue.tick(now=2.0)
+    room_id = queue.status("alice", now=2.0).room_id
+    assert server.get_room(room_id).players == {1: "alice", 2: "carol"}
+
+
+def test_order_stays_sorted_under_churn():
+    rng = random.Random(0)
+    queue = MatchQueue(server=None, window=20, widen=0, max_window=20)
+    names = [f"p{i}" for i in range(300)]
+    for step in range(3000):
+        name = rng.choice(names)
+        if name in queue.tickets and rng.random() < 0.5:
+            queue.cancel(name)
+        elif name not in queue.tickets:
+            queue.enqueue(name, rng.randrange(1000, 2000), now=step)
+        if step % 50 == 0:
+            for lower, higher in queue.pair(now=step):
+                assert queue.tickets.keys().isdisjoint((lower, higher))
+        keys = list(queue.order)
+        assert keys == sorted(ticket[0] for ticket in queue.tickets.values())
+        assert len(queue.order) == len(keys)
+        for left, right in zip(keys, keys[1:]):
+            assert queue.order.after(left) == right and queue.order.before(right) == left
@@ -0,0 +1,54 @@
+from game_server import GameServer
+
+
+def test_find_player_follows_joins_and_leaves():
+    server = GameServer()
+    room_id = server.create_room("room", "alice")
+    assert server.find_player("alice") == (room_id, 1)
+    assert server.find_player("bob") is None
+
+    assert server.join_room(room_id, "bob")[0]
+    assert server.join_room(room_id, "carol")[0]
+    assert server.find_player("bob") == (room_id, 2)
+    assert server.find_player("carol") == (room_id, 0)
+
+    server.leave_room(room_id, "carol")
+    assert server.find_player("carol") is None
+    server.leave_room(room_id, "alice")
+    assert server.find_player("alice") is None
+    assert server.find_player("bob") == (room_id, 2)
+
+
+def test_one_room_per_player():
+    server = GameServer()
+    first = server.create_room("first", "alice")
+    second = server.create_room("second", "bob")
+    assert server.create_room("another", "alice") is None
+    joined, message = server.join_room(second, "alice")
+    assert not joined and "first" in message
+    assert server.find_player("alice") == (first, 1)
+    assert server.join_room(first, "alice")[0]  # Reconnecting to one's own room is fine
+    assert server.find_player("alice") == (first, 1)
+
+
+def test_room_removal_clears_its_players():
+    server = GameServer()
+    room_id = server.create_room("room", "alice")
+    server.join_room(room_id, "bob")
+    server.join_room(room_id, "carol")
+    server.remove_room(room_id)
+    for name in ("alice", "bob", "carol"):
+        assert server.find_player(name) is None
+    assert server.create_room("again", "alice") is not None
+
+
+def test_reaped_seat_leaves_the_index():
+    server = GameServer(seat_ttl=10)
+    room_id = server.create_room("room", "alice")
+    server.join_room(room_id, "bob")
+    room = server.get_room(room_id)
+    room.heartbeats["alice"] = 0.0
+    room.heartbeats["bob"] = 100.0
+    server.reap(now=105.0)
+    assert server.find_player("alice") is None
+    assert server.find_player("bob") == (room_id, 2)
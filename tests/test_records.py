@@ -0,0 +1,77 @@
+import os
+
+from game_clock import TimeControl
+from game_records import MAGIC, RecordWriter, encode_record, read_records
+from game_server import GameServer
+
+
+def finished_room(server):
+    room = server.get_room(server.create_room("archived", "alice"))
+    room.join("bob")
+    room.toggle_ready(1)
+    room.toggle_ready(2)
+    for col in range(5):
+        room.place_stone(7, col)
+        if col < 4:
+            room.place_stone(8, col)
+    return room
+
+
+def test_archived_game_is_on_disk_before_close(tmp_path):
+    path = str(tmp_path / "omok.games")
+    server = GameServer(archive_path=path)
+    assert open(path, 'rb').read() == MAGIC
+    room = finished_room(server)
+    room.reset_game()
+    records = list(read_records(path))  # Without closing the server
+    assert len(records) == 1
+    assert (records[0].black, records[0].white, records[0].winner, records[0].result) == ("alice", "bob", 1, 'five')
+    server.close()
+
+
+def test_writer_reader_round_trip(tmp_path):
+    path = str(tmp_path / "games")
+    records = [
+        (15, "alice", "bob", 1, 'five', [(7, 7), (8, 8), (7, 8)]),
+        (19, "carol", "dave", None, 'unfinished', [(18, 18), (0, 0)]),  # Two bytes a cell
+        (None, "erin", "frank", 2, 'timeout', [(-300, 5000), (4, -4)]),  # Unbounded board
+        (15, "gina", "hal", 1, 'forfeit', []),
+    ]
+    with RecordWriter(path) as writer:
+        for size, black, white, winner, result, moves in records[:2]:
+            writer.write(encode_record(size, black, white, winner, result, moves, ended=1000))
+    with RecordWriter(path) as writer:  # Appends to the same archive
+        for size, black, white, winner, result, moves in records[2:]:
+            writer.write(encode_record(size, black, white, winner, result, moves, ended=1000))
+    read = list(read_records(path))
+    assert [(r.size, r.black, r.white, r.winner, r.result, [tuple(m) for m in r.moves]) for r in read] == records
+    assert all(r.ended == 1000 for r in read)
+
+
+def test_timed_out_game_is_archived_as_timeout(tmp_path):
+    path = str(tmp_path / "omok.games")
+    server = GameServer(archive_path=path)
+    room = server.get_room(server.create_room("timed", "alice", time_control=TimeControl(10)))
+    room.join("bob")
+    room.toggle_ready(1)
+    room.toggle_ready(2)
+    room.place_stone(7, 7)
+    server.clocks.tick(room.clock.deadline() + 0.01)
+    assert room.clock.flagged == 2
+    room.reset_game()
+    record, = read_records(path)
+    assert (record.winner, record.result, record.moves) == (1, 'timeout', [(7, 7)])
+    server.close()
+
+
+def test_torn_record_is_cut_off(tmp_path):
+    path = str(tmp_path / "games")
+    with RecordWriter(path) as writer:
+        writer.write(encode_record(15, "a", "b", 1, 'five', [(7, 7)]))
+        writer.write(encode_record(15, "c", "d", 2, 'five', [(1, 1), (2, 2)]))
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 3)  # A crash mid-write
+    assert [r.black for r in read_records(path)] == ["a"]
+    with RecordWriter(path) as writer:
+        writer.write(encode_record(15, "e", "f", None, 'unfinished', []))
+    assert [r.black for r in read_records(path)] == ["a", "e"]
@@ -0,0 +1,209 @@
+import random
+
+import numpy as np
+import pytest
+
+import renju
+from batch_game import BatchGame, random_selfplay
+from game_logic import DIRECTIONS, OmokGame, SparseGame
+
+SIZE = 15
+
+
+# Reference: the Renju definitions applied to the whole line through a cell,
+# cells off the board counting as White's
+
+def line_through(board, row, col, dr, dc):
+    # Cells of the full line through (row, col), with a blocked cell past
+    # each end; _index gives where (row, col) is in it
+    while 0 <= row - dr < SIZE and 0 <= col - dc < SIZE:
+        row, col = row - dr, col - dc
+    line = [2]
+    while 0 <= row < SIZE and 0 <= col < SIZE:
+        line.append(int(board[row, col]))
+        row, col = row + dr, col + dc
+    return line + [2]
+
+
+def run_length(line, i):
+    lo = hi = i
+    while line[lo - 1] == 1:
+        lo -= 1
+    while line[hi + 1] == 1:
+        hi += 1
+    return hi - lo + 1
+
+
+def five_points(line, i):
+    points = []
+    for e, v in enumerate(line):
+        if v == 0:
+            line[e] = 1
+            if run_length(line, i) == 5:
+                points.append(e)
+            line[e] = 0
+    return points
+
+
+def line_kind(line, i):
+    # (kind, fours) for Black's stone at line[i]
+    run = run_length(line, i)
+    if run >= 6:
+        return renju.OVERLINE, 0
+    if run == 5:
+        return renju.FIVE, 0
+    points = five_points(line, i)
+    if len(points) == 2 and points[1] - points[0] == 5:
+        return renju.OPEN_FOUR, 1
+    if points:
+        return renju.FOUR, len(points)
+    for e, v in enumerate(line):
+        if v == 0:
+            line[e] = 1
+            points = five_points(line, i) if run_length(line, i) < 5 else []
+            line[e] = 0
+            if len(points) == 2 and points[1] - points[0] == 5:
+                return renju.THREE, 0
+    return renju.NONE, 0
+
+
+def reference_reason(board, row, col):
+    # Why Black may not play the empty cell (row, col), or None
+    board = board.copy()
+    board[row, col] = 1
+    kinds, fours = [], 0
+    for dr, dc in DIRECTIONS:
+        kind, count = line_kind(line_through(board, row, col, dr, dc), _index(row, col, dr, dc))
+        kinds.append(kind)
+        fours += count
+    if renju.FIVE in kinds:
+        return None
+    if renju.OVERLINE in kinds:
+        return 'overline'
+    if fours >= 2:
+        return '4-4'
+    if kinds.count(renju.THREE) >= 2:
+        return '3-3'
+    return None
+
+
+def _index(row, col, dr, dc):
+    # Position of (row, col) in line_through's list
+    steps = 0
+    while 0 <= row - dr < SIZE and 0 <= col - dc < SIZE:
+        row, col = row - dr, col - dc
+        steps += 1
+    return steps + 1
+
+
+def reference_wins(board, row, col, player):
+    # Whether `player` playing the empty cell (row, col) makes five
+    board = board.copy()
+    board[row, col] = player
+    if player == 2:
+        board = np.where(board == 0, 0, 3 - board)  # White's stones as 1
+    lengths = [run_length(line_through(board, row, col, dr, dc), _index(row, col, dr, dc))
+               for dr, dc in DIRECTIONS]
+    return 5 in lengths or (player == 2 and max(lengths) > 5)
+
+
+def random_position(rng):
+    # A board dense enough in Black stones to make long-range patterns common
+    board = np.zeros((SIZE, SIZE), dtype=np.int8)
+    black = rng.uniform(0.15, 0.35)
+    white = rng.uniform(0.05, 0.2)
+    for row in range(SIZE):
+        for col in range(SIZE):
+            x = rng.random()
+            board[row, col] = 1 if x < black else 2 if x < black + white else 0
+    return board
+
+
+def stones(board):
+    return [(int(r), int(c), int(board[r, c])) for r, c in zip(*board.nonzero())]
+
+
+POSITIONS = [random_position(random.Random(seed)) for seed in range(12)]
+
+
+@pytest.mark.parametrize('board', POSITIONS)
+def test_forbidden_matches_full_line(board):
+    game = OmokGame(SIZE)
+    game.load(board, stones(board), None, 1)
+    sparse = SparseGame(SIZE)
+    sparse.load(None, stones(board), None, 1)
+    batch = BatchGame(1, SIZE)
+    batch.boards[0] = board
+
+    empty = [(int(r), int(c)) for r, c in zip(*(board == 0).nonzero())]
+    expected = [reference_reason(board, r, c) for r, c in empty]
+    assert [game.engine.forbidden_reason(r, c) for r, c in empty] == expected
+    assert [sparse.forbidden_reason(r, c) for r, c in empty] == expected
+
+    mask = np.zeros((SIZE, SIZE), dtype=bool)
+    for (r, c), reason in zip(empty, expected):
+        mask[r, c] = reason is not None
+    assert (game.engine.forbidden_mask() == mask).all()
+    cells = np.array([r * SIZE + c for r, c in empty])
+    assert (batch.forbidden(np.zeros(len(cells), dtype=np.intp), cells) == mask[board == 0]).all()
+
+
+@pytest.mark.parametrize('board', POSITIONS)
+@pytest.mark.parametrize('player', [1, 2])
+def test_wins_match_full_line(board, player):
+    empty = [(int(r), int(c)) for r, c in zip(*(board == 0).nonzero())]
+    expected = [reference_wins(board, r, c, player) for r, c in empty]
+
+    got = []
+    batch_got = []
+    batch = BatchGame(1, SIZE)
+    batch.boards[0] = board
+    for r, c in empty:
+        game = OmokGame(SIZE)
+        game.load(board, stones(board) + [(r, c, player)], None, player)
+        got.append(game.check_winner(r, c))
+        _, wins = batch._judge(np.zeros(1, dtype=np.intp), np.array([r * SIZE + c]),
+                               np.array([player], dtype=np.int8))
+        batch_got.append(bool(wins[0]))
+    assert got == expected
+    assert batch_got == expected
+
+
+def test_tables_match_classify():
+    rng = random.Random(0)
+    for _ in range(20000):
+        cells = [rng.choice((0, 0, 1, 1, 2)) for _ in range(renju.WINDOW)]
+        cells[renju.CENTER] = 1
+        code = sum(v * w for v, w in zip(cells, renju.WEIGHTS))
+        assert (renju.LINE_KIND[code], renju.LINE_FOURS[code]) == renju.classify(cells)
+
+
+def test_stone_past_the_old_window():
+    # Across: X . . _ X X . . X around the empty cell _ at (7, 5). Each
+    # four it could grow into has one five point only, the other end making
+    # six with a stone five cells away, so it is no three and the vertical
+    # three alone is not 3-3
+    board = np.zeros((SIZE, SIZE), dtype=np.int8)
+    for col in (2, 6, 7, 10):
+        board[7, col] = 1
+    for row in (5, 6):
+        board[row, 5] = 1
+    assert reference_reason(board, 7, 5) is None
+    game = OmokGame(SIZE)
+    game.load(board, stones(board), None, 1)
+    assert game.engine.forbidden_reason(7, 5) is None
+    assert not game.engine.forbidden_mask()[7, 5]
+
+
+@pytest.mark.parametrize('engine', ['renju', 'index'])
+def test_selfplay_matches_check_winner(engine):
+    batch = random_selfplay(40, SIZE, engine=engine, seed=7)
+    for i in range(batch.n):
+        game = OmokGame(SIZE, engine=engine)
+        moves = batch.history(i)
+        for k, (row, col, player) in enumerate(moves):
+            ok, _ = game.place_stone(row, col)
+            assert ok
+            assert game.check_winner(row, col) == (k == len(moves) - 1 and batch.winner[i] != 0)
+        assert (game.winner or 0) == batch.winner[i]
+        assert (game.board == batch.boards[i]).all()
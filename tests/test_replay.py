@@ -0,0 +1,52 @@
+import random
+
+import numpy as np
+import pytest
+
+from game_logic import OmokGame
+from replay import Replay
+
+EVERY = 8
+
+
+def played_game(seed, moves=45, size=15):
+    rng = random.Random(seed)
+    game = OmokGame(size)
+    while len(game.history) < moves and game.winner is None:
+        game.place_stone(rng.randrange(size), rng.randrange(size))
+    return game
+
+
+def boards(game):
+    # The board after every move count, by playing the game again
+    replayed = OmokGame(game.size)
+    out = [replayed.board.copy()]
+    for row, col, _ in game.history:
+        replayed.place_stone(row, col)
+        out.append(replayed.board.copy())
+    return out
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_seek_at_keyframe_boundaries(seed):
+    game = played_game(seed)
+    expected = boards(game)
+    replay = Replay(game.history, size=game.size, every=EVERY)
+    last = len(game.history)
+    boundaries = sorted({n for k in range(0, last + EVERY, EVERY) for n in (k - 1, k, k + 1) if 0 <= n <= last})
+    # Forwards, backwards, then jumping about so every start is used
+    order = boundaries + boundaries[::-1] + random.Random(seed).sample(boundaries, len(boundaries))
+    for n in order:
+        assert np.array_equal(replay.seek(n), expected[n]), n
+    assert len(replay) == last + 1
+    with pytest.raises(IndexError):
+        replay.seek(last + 1)
+
+
+def test_positions_match_every_move():
+    game = played_game(7)
+    expected = boards(game)
+    replay = Replay(game.history, size=game.size, every=EVERY)
+    for n, board in replay.positions():
+        assert np.array_equal(board, expected[n])
+    assert not replay.seek(3).flags.writeable
@@ -0,0 +1,48 @@
+from game_server import GameServer
+
+
+def seated_room(server):
+    room = server.get_room(server.create_room("game", "alice"))
+    room.join("bob")
+    room.toggle_ready(1)
+    room.toggle_ready(2)
+    return room
+
+
+def test_player_moves_only_on_their_turn():
+    room = seated_room(GameServer())
+    assert room.place_stone(7, 7, player="bob") == (False, "Not your turn")
+    assert room.place_stone(7, 7, player="carol")[0] is False
+    assert room.place_stone(7, 7, player="alice")[0] is True
+    assert room.place_stone(7, 8, player="alice") == (False, "Not your turn")
+    assert room.place_stone(7, 8, player="bob")[0] is True
+    assert len(room.game.history) == 2
+
+
+def test_no_player_move_while_a_request_is_pending():
+    room = seated_room(GameServer())
+    room.place_stone(7, 7, player="alice")
+    room.make_request("alice", 'UNDO')
+    assert room.place_stone(7, 8, player="bob")[0] is False
+    room.resolve_request(False)
+    assert room.place_stone(7, 8, player="bob")[0] is True
+
+
+def test_room_cap_keeps_games_in_progress():
+    server = GameServer(max_rooms=2)
+    first = seated_room(server)
+    first.place_stone(7, 7)
+    second = server.get_room(server.create_room("waiting", "carol"))
+    assert server.create_room("third", "dave") is None
+    assert server.find_player("alice") == (first.id, 1)
+    assert server.find_player("carol") == (second.id, 1)
+    assert server.count_rooms() == 2
+
+    # A finished game can make way
+    for col in range(4):
+        first.place_stone(8, col)
+        first.place_stone(7, 8 + col)
+    assert server.get_room(first.id).game.winner is not None
+    third = server.create_room("third", "dave")
+    assert third is not None and server.get_room(first.id) is None
+    assert server.find_player("carol") == (second.id, 1)